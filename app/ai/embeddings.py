@@ -1,31 +1,214 @@
 # app/ai/embeddings.py
 
 import io
-from functools import lru_cache
-from typing import List
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
 
 import numpy as np
 from PIL import Image
-import torch
-import open_clip
+
+from app.core.config import BASE_DIR, settings
+from app.core.metrics import histogram
+from app.core.observability import current_stats
+
+# torch / open_clip импортируются только при первой загрузке модели: импорт
+# стоит секунды и сотни МБ RSS, а большинству воркеров API модель не нужна
+# вовсе (эмбеддинги считает app/jobs).
+
+logger = logging.getLogger(__name__)
 
 
 # --- Model loader (cached) ----------------------------------------------------
 
-@lru_cache(maxsize=1)
-def _get_clip():
-    # NOTE: ViT-B-32 is a good MVP baseline: decent quality, reasonable speed.
-    model_name = "ViT-B-32"
-    pretrained = "openai"
+# embeddings stored before the model became configurable
+LEGACY_MODEL_VERSION = "ViT-B-32/openai"
+
+
+def model_version() -> str:
+    """Identifier stored in `Item.embedding_model` next to each vector."""
+    return f"{settings.CLIP_MODEL}/{settings.CLIP_PRETRAINED}"
+
+
+_clip = None
+_clip_lock = threading.Lock()
+# not_loaded | loading | ready | failed (для /health/ready)
+_state = "not_loaded"
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+INFERENCE_SECONDS = histogram(
+    "embed_inference_seconds", "CLIP forward pass per batch", ("backend",),
+)
+BATCH_SIZE = histogram(
+    "embed_batch_size", "Images per CLIP forward pass", ("backend",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class _Clip:
+    """Loaded image encoder: open_clip preprocess + a backend-specific forward."""
+
+    def __init__(self, backend: str, preprocess, encode) -> None:
+        self.backend = backend
+        self.preprocess = preprocess
+        # encode(batch: torch.Tensor [n, 3, H, W]) -> np.ndarray [n, d]
+        self._encode = encode
+
+    def encode(self, batch) -> np.ndarray:
+        started = time.perf_counter()
+        feat = np.asarray(self._encode(batch), dtype=np.float32)
+        elapsed = time.perf_counter() - started
+        INFERENCE_SECONDS.observe(elapsed, backend=self.backend)
+        stats = current_stats()
+        if stats is not None:
+            stats.add_span("inference", elapsed)
+        BATCH_SIZE.observe(len(feat), backend=self.backend)
+        # normalize for cosine
+        return feat / (np.linalg.norm(feat, axis=-1, keepdims=True) + 1e-12)
+
+
+def model_state() -> str:
+    return _state
+
+
+def _configure_threads(torch) -> None:
+    if settings.EMBED_THREADS > 0:
+        torch.set_num_threads(settings.EMBED_THREADS)
+    if settings.EMBED_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(settings.EMBED_INTEROP_THREADS)
+        except RuntimeError:
+            # можно выставить только до первой параллельной операции torch
+            logger.warning("EMBED_INTEROP_THREADS ignored: torch already initialised")
+
+
+def onnx_path() -> Path:
+    if settings.EMBED_ONNX_PATH:
+        return Path(settings.EMBED_ONNX_PATH)
+    name = f"{settings.CLIP_MODEL}-{settings.CLIP_PRETRAINED}.onnx".replace("/", "_")
+    return BASE_DIR / "models" / name
+
+
+def _export_onnx(model, torch, path: Path) -> None:
+    """Export the visual tower once; the file is reused on later starts."""
+
+    class _Visual(torch.nn.Module):
+        def __init__(self, clip_model) -> None:
+            super().__init__()
+            self.clip_model = clip_model
+
+        def forward(self, pixel_values):
+            return self.clip_model.encode_image(pixel_values)
+
+    size = getattr(model.visual, "image_size", 224)
+    h, w = size if isinstance(size, (tuple, list)) else (size, size)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".onnx.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            _Visual(model).eval(),
+            torch.zeros(1, 3, h, w),
+            str(tmp),
+            input_names=["pixel_values"],
+            output_names=["embedding"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=17,
+        )
+    tmp.replace(path)
+    logger.info("exported CLIP visual encoder to %s", path)
+
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+def _load_clip(backend: str) -> _Clip:
+    import torch
+    import open_clip
+
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+    _configure_threads(torch)
+
+    # NOTE: ViT-B-32 is a good MVP baseline: decent quality, reasonable speed.
     model, _, preprocess = open_clip.create_model_and_transforms(
-        model_name, pretrained=pretrained
+        settings.CLIP_MODEL, pretrained=settings.CLIP_PRETRAINED
     )
     model.eval()
-    model.to(device)
 
-    return model, preprocess, device
+    if backend == "torch":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model.to(device)
+
+        def encode(x):
+            with torch.no_grad():
+                return model.encode_image(x.to(device)).float().cpu().numpy()
+
+    elif backend == "torch-int8":
+        # int8-веса только у nn.Linear (MLP-блоки ViT — основная часть FLOPs),
+        # активации квантуются на лету; только CPU
+        qmodel = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        def encode(x):
+            with torch.no_grad():
+                return qmodel.encode_image(x).float().numpy()
+
+    else:
+        try:
+            import onnxruntime as ort
+        except ImportError as e:  # optional dependency
+            raise RuntimeError("EMBED_BACKEND=onnx requires `pip install onnxruntime onnx`") from e
+
+        path = onnx_path()
+        if not path.exists():
+            _export_onnx(model, torch, path)
+        del model
+
+        opts = ort.SessionOptions()
+        if settings.EMBED_THREADS > 0:
+            opts.intra_op_num_threads = settings.EMBED_THREADS
+        if settings.EMBED_INTEROP_THREADS > 0:
+            opts.inter_op_num_threads = settings.EMBED_INTEROP_THREADS
+        session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+
+        def encode(x):
+            return session.run(None, {"pixel_values": x.numpy()})[0]
+
+    return _Clip(backend, preprocess, encode)
+
+
+def _get_clip() -> _Clip:
+    global _clip, _state
+    if _clip is not None:
+        return _clip
+
+    # первый вызов может прийти одновременно из нескольких потоков threadpool
+    with _clip_lock:
+        if _clip is not None:
+            return _clip
+        _state = "loading"
+        try:
+            _clip = _load_clip(settings.EMBED_BACKEND)
+        except Exception:
+            _state = "failed"
+            raise
+        _state = "ready"
+        logger.info("CLIP %s loaded (backend=%s)", model_version(), settings.EMBED_BACKEND)
+        return _clip
+
+
+def warmup() -> float:
+    """Load the model and run one dummy forward pass. Returns seconds spent.
+
+    Первый forward после загрузки заметно медленнее (аллокации, JIT-пути
+    oneDNN/cuDNN), поэтому прогоняем его до первого настоящего запроса.
+    """
+    started = time.perf_counter()
+    _embed_image(Image.new("RGB", (224, 224), (127, 127, 127)))
+    elapsed = time.perf_counter() - started
+    logger.info("CLIP %s warmed up in %.2fs", model_version(), elapsed)
+    return elapsed
 
 
 # --- Public API ---------------------------------------------------------------
@@ -35,17 +218,47 @@ def embed_image_bytes(data: bytes) -> List[float]:
     if not data:
         return []
 
-    model, preprocess, device = _get_clip()
+    return _embed_image(Image.open(io.BytesIO(data)))
 
-    img = Image.open(io.BytesIO(data)).convert("RGB")
-    x = preprocess(img).unsqueeze(0).to(device)
 
-    with torch.no_grad():
-        feat = model.encode_image(x)
-        feat = feat / feat.norm(dim=-1, keepdim=True)  # normalize for cosine
-        vec = feat.squeeze(0).detach().cpu().float().numpy()
+def embed_image_file(path: Union[str, Path]) -> List[float]:
+    """Same as `embed_image_bytes`, but decodes straight from a file on disk."""
+    with Image.open(path) as img:
+        return _embed_image(img)
+
+
+def embed_image_files(paths: Sequence[Union[str, Path]]) -> List[Optional[List[float]]]:
+    """Batch version of `embed_image_file`: one forward pass for all paths.
+
+    Unreadable images yield None at their position instead of failing the batch.
+    """
+    clip = _get_clip()
+    import torch  # уже загружен _get_clip()
+
+    out: List[Optional[List[float]]] = [None] * len(paths)
+    tensors, positions = [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                tensors.append(clip.preprocess(img.convert("RGB")))
+        except (OSError, ValueError):
+            continue
+        positions.append(i)
+
+    if not tensors:
+        return out
+
+    vecs = clip.encode(torch.stack(tensors))
+    for i, vec in zip(positions, vecs):
+        out[i] = vec.tolist()
+    return out
+
+
+def _embed_image(img: Image.Image) -> List[float]:
+    clip = _get_clip()
 
-    return vec.tolist()
+    x = clip.preprocess(img.convert("RGB")).unsqueeze(0)
+    return clip.encode(x)[0].tolist()
 
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
@@ -0,0 +1,241 @@
+# app/ai/reembed.py
+"""Recompute `Item.embedding` with the configured CLIP model (CLIP_MODEL/CLIP_PRETRAINED).
+
+    python -m app.ai.reembed                 # items whose embedding is missing or from another model
+    python -m app.ai.reembed --all           # every item with an image
+    python -m app.ai.reembed --restart       # ignore the checkpoint file
+
+Items are read in id order in chunks (keyset, WHERE id > last_id), images are
+embedded in batches of --batch-size, results written with one executemany
+UPDATE per chunk. После каждого чанка в --checkpoint пишется последний id,
+поэтому прерванный прогон продолжается с того же места.
+
+Пока миграция идёт, поиск видит только уже пересчитанные item
+(сравниваются только векторы с одинаковым embedding_model).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import bindparam, or_, select, update
+
+from app.ai import vector_store
+from app.ai.embeddings import embed_image_files, model_version
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.media_blob import MediaBlob
+from app.media.storage import get_storage
+
+logger = logging.getLogger("reembed")
+
+DEFAULT_CHECKPOINT = Path(settings.MEDIA_DIR).parent / "reembed.checkpoint.json"
+
+items_table = Item.__table__
+
+# WHERE id = :b_id AND image_url = :b_url — если картинку заменили во время
+# прогона, строка не обновится (новую картинку посчитает job embed_item)
+_update_stmt = (
+    update(items_table)
+    .where(items_table.c.id == bindparam("b_id"), items_table.c.image_url == bindparam("b_url"))
+    .values(
+        embedding=bindparam("b_embedding"),
+        embedding_model=bindparam("b_model"),
+        embedding_status=bindparam("b_status"),
+    )
+)
+
+
+def _load_checkpoint(path: Path, version: str) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if data.get("model") != version:
+        logger.warning("checkpoint %s is for model %s, starting over", path, data.get("model"))
+        return {}
+    return data
+
+
+def _save_checkpoint(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    os.replace(tmp, path)  # атомарно: прерывание не оставит битый файл
+
+
+def _legacy_path(image_url: Optional[str]) -> Optional[Path]:
+    """Pre-blob uploads: /media/<name> under MEDIA_DIR."""
+    if not image_url or not image_url.startswith("/media/"):
+        return None
+    path = Path(settings.MEDIA_DIR) / image_url[len("/media/"):]
+    return path if path.is_file() else None
+
+
+async def _fetch_chunk(after_id: int, size: int, version: str, everything: bool):
+    async with SessionLocal() as db:
+        q = (
+            select(Item.id, Item.image_url, Item.image_sha256, MediaBlob.key)
+            .outerjoin(MediaBlob, MediaBlob.sha256 == Item.image_sha256)
+            .where(Item.id > after_id, Item.image_url.is_not(None))
+            .order_by(Item.id)
+            .limit(size)
+        )
+        if not everything:
+            q = q.where(
+                or_(
+                    Item.embedding.is_(None),
+                    Item.embedding_model.is_(None),
+                    Item.embedding_model != version,
+                )
+            )
+        return (await db.execute(q)).all()
+
+
+async def _embed_chunk(rows, batch_size: int) -> dict:
+    """item_id -> embedding (None if the image could not be read)."""
+    storage = get_storage()
+    results: dict = {}
+
+    # одинаковый sha256 у нескольких item — считаем один раз
+    by_source: dict = {}
+    for item_id, image_url, sha256, key in rows:
+        source = ("blob", key) if key else ("legacy", image_url)
+        by_source.setdefault(source, []).append(item_id)
+
+    sources = list(by_source)
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        async with AsyncExitStack() as stack:
+            paths, usable = [], []
+            for kind, ref in batch:
+                if kind == "blob":
+                    try:
+                        path = await stack.enter_async_context(storage.local_path(ref))
+                    except Exception:
+                        logger.warning("cannot fetch blob %s", ref)
+                        continue
+                else:
+                    path = _legacy_path(ref)
+                    if path is None:
+                        continue
+                paths.append(path)
+                usable.append((kind, ref))
+
+            vectors = await asyncio.to_thread(embed_image_files, paths) if paths else []
+
+        embedded = dict(zip(usable, vectors))
+        for source in batch:
+            vec = embedded.get(source)
+            for item_id in by_source[source]:
+                results[item_id] = vec
+    return results
+
+
+async def reembed(
+    batch_size: int,
+    chunk_size: int,
+    checkpoint: Path,
+    everything: bool = False,
+    restart: bool = False,
+    limit: Optional[int] = None,
+) -> dict:
+    version = model_version()
+    state = {} if restart else _load_checkpoint(checkpoint, version)
+    state = {
+        "model": version,
+        "all": everything,
+        "last_id": state.get("last_id", 0),
+        "done": state.get("done", 0),
+        "failed": state.get("failed", []),
+    }
+    if state["last_id"]:
+        logger.info("resuming after item #%s (%s done)", state["last_id"], state["done"])
+
+    started = time.perf_counter()
+    processed = 0
+    while limit is None or processed < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - processed)
+        rows = await _fetch_chunk(state["last_id"], size, version, everything)
+        if not rows:
+            break
+
+        vectors = await _embed_chunk(rows, batch_size)
+        params, failed = [], []
+        for item_id, image_url, _sha, _key in rows:
+            vec = vectors.get(item_id)
+            if vec is None:
+                # строку не трогаем: файл мог пропасть временно, старый вектор
+                # хотя бы не потеряется; id остаётся в checkpoint["failed"]
+                failed.append(item_id)
+                continue
+            params.append({
+                "b_id": item_id,
+                "b_url": image_url,
+                "b_embedding": vec,
+                "b_model": version,
+                "b_status": "READY",
+            })
+
+        if params:
+            async with SessionLocal() as db:
+                await db.execute(_update_stmt, params)
+                await db.commit()
+
+        processed += len(rows)
+        state["last_id"] = rows[-1][0]
+        state["done"] += len(rows) - len(failed)
+        state["failed"].extend(failed)
+        _save_checkpoint(checkpoint, state)
+
+        rate = processed / max(time.perf_counter() - started, 1e-9)
+        logger.info("item #%s: %s done, %s failed (%.1f items/s)",
+                    state["last_id"], state["done"], len(state["failed"]), rate)
+
+    return state
+
+
+async def _run(args) -> dict:
+    from app.db.init_db import init_db
+
+    await init_db()  # embedding_model и т.п. на старой базе
+    state = await reembed(
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        checkpoint=args.checkpoint,
+        everything=args.everything,
+        restart=args.restart,
+        limit=args.limit,
+    )
+    # один rebuild в конце вместо upsert на каждый батч
+    if vector_store.enabled():
+        state["vector_store"] = await vector_store.rebuild_from_db()
+    return state
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.ai.reembed", description=__doc__.split("\n")[0])
+    parser.add_argument("--batch-size", type=int, default=settings.EMBED_BATCH_SIZE,
+                        help="images per model forward pass")
+    parser.add_argument("--chunk-size", type=int, default=500, help="items fetched/updated per round")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--all", dest="everything", action="store_true",
+                        help="re-embed items already on the current model too")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="stop after N items")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logger.info("re-embedding with %s", model_version())
+    state = asyncio.run(_run(args))
+    print(json.dumps({k: v for k, v in state.items() if k != "failed"} | {"failed": len(state["failed"])}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# app/ai/search_cache.py
+"""Process-local cache of vector-search results (similar-by-image, deduplicate).
+
+Ключ — LSH-подпись нормированного вектора запроса (знаки проекций на
+SEARCH_CACHE_LSH_BITS случайных гиперплоскостей, seed фиксирован — подпись
+одинакова во всех воркерах) плюс параметры: модель, исключённый владелец и
+id, top_k, min_similarity, окно по created_at. Одна и та же фотография (или
+почти та же — шаблон студенческого, одинаковые ключ-карты) попадает в одну
+корзину; совпадение проверяется по косинусу с сохранённым вектором
+(>= SEARCH_CACHE_MIN_COSINE), так что коллизия подписей не отдаёт чужой результат.
+
+Инвалидация — generation mmap-индекса (vector_store.Header.generation): он
+растёт на каждом upsert (готовый эмбеддинг, reopen), delete/forget (удаление,
+закрытие, expiry) и rebuild, причём общий для всех процессов. Запись с другим
+generation — промах. Храним только (similarity, item_id): item'ы читаются из
+БД на каждый запрос, поэтому правки title/описания кэш не устаревают.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+
+_SEED = 0x5EA4C4
+_planes: Dict[Tuple[int, int], np.ndarray] = {}
+
+entries_gauge = metrics.gauge("search_cache_entries", "Entries in the search result cache")
+
+
+class Entry(NamedTuple):
+    generation: int
+    query: np.ndarray
+    hits: List[Tuple[float, int]]
+
+
+def enabled() -> bool:
+    return settings.SEARCH_CACHE_SIZE > 0
+
+
+def normalize(query) -> np.ndarray:
+    q = np.asarray(query, dtype=np.float32)
+    return q / (np.linalg.norm(q) + 1e-12)
+
+
+def signature(q: np.ndarray, bits: Optional[int] = None) -> bytes:
+    """Sign-random-projection LSH: близкие по косинусу векторы дают одинаковые биты."""
+    bits = bits or settings.SEARCH_CACHE_LSH_BITS
+    planes = _planes.get((q.shape[0], bits))
+    if planes is None:
+        rng = np.random.default_rng(_SEED)
+        planes = _planes[(q.shape[0], bits)] = rng.standard_normal((bits, q.shape[0])).astype(np.float32)
+    return np.packbits(planes @ q >= 0).tobytes()
+
+
+class SearchCache:
+    """Bounded LRU: key -> Entry; stale generations are purged per model."""
+
+    def __init__(self, max_entries: int, min_cosine: float) -> None:
+        self.max_entries = max_entries
+        self.min_cosine = min_cosine
+        self._entries: "OrderedDict[tuple, Entry]" = OrderedDict()
+        # model -> последний увиденный generation
+        self._generations: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _observe(self, model: str, generation: int) -> None:
+        if self._generations.get(model) == generation:
+            return
+        self._generations[model] = generation
+        for key in [k for k, e in self._entries.items() if k[0] == model and e.generation != generation]:
+            del self._entries[key]
+
+    def get(self, key: tuple, generation: int, query: np.ndarray) -> Optional[List[Tuple[float, int]]]:
+        """Cached hits for `key`, or None. key[0] — модель."""
+        self._observe(key[0], generation)
+        entry = self._entries.get(key)
+        if entry is None or entry.generation != generation:
+            return None
+        if float(entry.query @ query) < self.min_cosine:
+            return None
+        self._entries.move_to_end(key)
+        return entry.hits
+
+    def put(self, key: tuple, generation: int, query: np.ndarray, hits: List[Tuple[float, int]]) -> None:
+        self._observe(key[0], generation)
+        self._entries[key] = Entry(generation, query, list(hits))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+
+
+cache = SearchCache(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_MIN_COSINE)
+
+
+def make_key(model: str, query: np.ndarray, *params: Hashable) -> tuple:
+    return (model, signature(query), *params)
+
+
+@metrics.register_collector
+def _collect() -> None:
+    entries_gauge.set(len(cache))
@@ -0,0 +1,499 @@
+# app/ai/vector_store.py
+"""Embedding matrix in memory-mapped files, shared by all worker processes.
+
+Источник правды — Item.embedding в БД; здесь производный индекс для скана
+в search.py. Каждый uvicorn-воркер мапит файлы только на чтение, страницы
+лежат в page cache ОС один раз на машину (а не копия матрицы на процесс).
+
+Раскладка в <DATA_DIR>/vectors/<model>/ (векторы разных моделей несравнимы):
+  header.i64          — [magic, seq, epoch, count, capacity, dim, tombstones, 0]
+  vectors.<epoch>.f32 — float32 [capacity, dim], нормированные
+  ids.<epoch>.i64     — item_id строки; -item_id = tombstone
+  owners.<epoch>.i64  — owner_id (фильтр "не свои" без похода в БД)
+
+Писатель один в каждый момент (flock на файле `lock` + threading.Lock):
+дописывает строку, затем публикует count. Заголовок обновляется по схеме
+seqlock: seq нечётный во время записи, generation = seq // 2. Читатель
+видит дописанные строки и tombstone'ы сразу (общий page cache), а
+перемапливает файлы только при смене epoch (rebuild / compaction) или
+capacity (рост файла).
+"""
+
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+try:  # POSIX; на Windows писатели сериализуются только внутри процесса
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x4C46_5645_4331_0001  # "LFVEC1" + format version
+MIN_CAPACITY = 1024
+# compaction, когда tombstone'ов больше этой доли строк
+COMPACT_RATIO = 0.5
+
+_DTYPES = {"vectors": np.float32, "ids": np.int64, "owners": np.int64}
+_EXT = {"vectors": "f32", "ids": "i64", "owners": "i64"}
+_HEADER_LEN = 8
+
+
+class Header(NamedTuple):
+    seq: int
+    epoch: int
+    count: int
+    capacity: int
+    dim: int
+    tombstones: int
+
+    @property
+    def generation(self) -> int:
+        return self.seq // 2
+
+
+class VectorView(NamedTuple):
+    """Zero-copy numpy views over the first `count` rows of the live epoch."""
+
+    generation: int
+    vectors: np.ndarray
+    ids: np.ndarray
+    owners: np.ndarray
+
+    def top_k(
+        self,
+        query: Sequence[float],
+        k: int,
+        min_similarity: float = -1.0,
+        exclude_owner: Optional[int] = None,
+        exclude_ids: Sequence[int] = (),
+    ) -> List[Tuple[float, int]]:
+        """[(cosine, item_id)] best first; tombstones and excluded rows skipped."""
+        if k <= 0 or not len(self.ids):
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) + 1e-12)
+        sims = self.vectors @ q
+
+        mask = (self.ids > 0) & (sims >= min_similarity)
+        if exclude_owner is not None:
+            mask &= self.owners != exclude_owner
+        if len(exclude_ids):
+            mask &= ~np.isin(self.ids, np.asarray(list(exclude_ids), dtype=np.int64))
+        rows = np.flatnonzero(mask)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-sims[rows], k - 1)[:k]]
+        # по убыванию сходства, при равенстве — больший id (как heapq.nlargest в search.py)
+        rows = rows[np.lexsort((-self.ids[rows], -sims[rows]))]
+        return [(float(sims[r]), int(self.ids[r])) for r in rows]
+
+
+    def score(self, query: Sequence[float], item_ids: Sequence[int]) -> List[Tuple[float, int]]:
+        """[(cosine, item_id)] for those of `item_ids` present in the view, best first."""
+        if not len(item_ids) or not len(self.ids):
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) + 1e-12)
+        rows = np.flatnonzero(np.isin(self.ids, np.asarray(list(item_ids), dtype=np.int64)))
+        sims = self.vectors[rows] @ q
+        order = np.lexsort((-self.ids[rows], -sims))
+        return [(float(sims[i]), int(self.ids[rows[i]])) for i in order]
+
+
+class VectorStore:
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self._thread_lock = threading.Lock()
+        self._header_map: Optional[np.memmap] = None
+        # (epoch, capacity, dim) -> открытые memmap'ы читателя
+        self._mapped: Optional[tuple] = None
+        self._map_lock = threading.Lock()
+
+    # --- files --------------------------------------------------------------
+
+    def _path(self, name: str, epoch: int) -> Path:
+        return self.root / f"{name}.{epoch}.{_EXT[name]}"
+
+    @property
+    def _header_path(self) -> Path:
+        return self.root / "header.i64"
+
+    def _read_header(self, locked: bool = False) -> Optional[Header]:
+        """Consistent header snapshot (seqlock read), None if the store does not exist.
+
+        locked=True — вызывающий держит блокировку писателя: нечётный seq
+        тогда значит, что прошлый писатель упал посреди публикации, ждать некого.
+        """
+        if self._header_map is None:
+            try:
+                self._header_map = np.memmap(self._header_path, dtype=np.int64, mode="r", shape=(_HEADER_LEN,))
+            except (FileNotFoundError, ValueError):
+                return None  # ещё не создан / писатель как раз создаёт файл
+        h = self._header_map
+        for _ in range(100_000):
+            seq = int(h[1])
+            if seq % 2 and not locked:
+                continue  # писатель посередине обновления
+            values = [int(v) for v in h[:_HEADER_LEN]]
+            if int(h[1]) == seq:
+                break
+        else:
+            logger.warning("vector store %s: header stays locked, ignoring the store", self.root)
+            return None
+        if values[0] != MAGIC:
+            return None
+        return Header(seq, values[2], values[3], values[4], values[5], values[6])
+
+    # --- readers ------------------------------------------------------------
+
+    def header(self) -> Optional[Header]:
+        return self._read_header()
+
+    def view(self) -> Optional[VectorView]:
+        """Current rows, or None if the store has not been built yet."""
+        h = self._read_header()
+        if h is None:
+            return None
+        key = (h.epoch, h.capacity, h.dim)
+        mapped = self._mapped
+        if mapped is None or mapped[0] != key:
+            with self._map_lock:
+                mapped = self._mapped
+                if mapped is None or mapped[0] != key:
+                    maps = {
+                        name: np.memmap(
+                            self._path(name, h.epoch), dtype=dtype, mode="r",
+                            shape=(h.capacity, h.dim) if name == "vectors" else (h.capacity,),
+                        )
+                        for name, dtype in _DTYPES.items()
+                    }
+                    mapped = self._mapped = (key, maps)
+        maps = mapped[1]
+        n = h.count
+        return VectorView(h.generation, maps["vectors"][:n], maps["ids"][:n], maps["owners"][:n])
+
+    # --- writer -------------------------------------------------------------
+
+    @contextmanager
+    def _writer(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.root / "lock", "a+b") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _publish(self, prev: Optional[Header], **fields: int) -> None:
+        seq = prev.seq - prev.seq % 2 if prev is not None else 0
+        cur = prev._asdict() if prev is not None else dict(seq=0, epoch=0, count=0, capacity=0, dim=0, tombstones=0)
+        cur.update(fields)
+        values = np.array(
+            [MAGIC, seq + 2, cur["epoch"], cur["count"], cur["capacity"], cur["dim"], cur["tombstones"], 0],
+            dtype=np.int64,
+        )
+        fd = os.open(self._header_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < values.nbytes:
+                os.ftruncate(fd, values.nbytes)
+            os.pwrite(fd, np.int64(seq + 1).tobytes(), 8)   # seq нечётный: читатели ждут
+            os.pwrite(fd, values[2:].tobytes(), 16)
+            os.pwrite(fd, values[:2].tobytes(), 0)          # magic + seq чётный: опубликовано
+        finally:
+            os.close(fd)
+
+    def _create(self, dim: int) -> Header:
+        for name, dtype in _DTYPES.items():
+            width = dim if name == "vectors" else 1
+            with open(self._path(name, 1), "wb") as f:
+                f.truncate(MIN_CAPACITY * width * np.dtype(dtype).itemsize)
+        self._publish(None, epoch=1, count=0, capacity=MIN_CAPACITY, dim=dim, tombstones=0)
+        return self._read_header(locked=True)
+
+    def _tombstone(self, h: Header, item_ids: Sequence[int]) -> int:
+        if not h.count or not len(item_ids):
+            return 0
+        ids = np.memmap(self._path("ids", h.epoch), dtype=np.int64, mode="r+", shape=(h.capacity,))
+        rows = np.flatnonzero(np.isin(ids[:h.count], np.asarray(item_ids, dtype=np.int64)))
+        if len(rows):
+            ids[rows] = -ids[rows]
+            ids.flush()
+        del ids
+        return len(rows)
+
+    def _grow(self, h: Header, needed: int) -> int:
+        capacity = h.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity != h.capacity:
+            for name, dtype in _DTYPES.items():
+                width = h.dim if name == "vectors" else 1
+                with open(self._path(name, h.epoch), "r+b") as f:
+                    f.truncate(capacity * width * np.dtype(dtype).itemsize)
+        return capacity
+
+    def upsert_many(self, rows: Sequence[Tuple[int, int, Sequence[float]]]) -> None:
+        """[(item_id, owner_id, vector)]: old rows of these items become tombstones."""
+        if not rows:
+            return
+        vectors = np.asarray([r[2] for r in rows], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        ids = np.asarray([r[0] for r in rows], dtype=np.int64)
+        owners = np.asarray([r[1] for r in rows], dtype=np.int64)
+
+        with self._writer():
+            h = self._read_header(locked=True) or self._create(vectors.shape[1])
+            if vectors.shape[1] != h.dim:
+                raise ValueError(f"vector dim {vectors.shape[1]} != store dim {h.dim}")
+            dead = self._tombstone(h, ids)
+            capacity = self._grow(h, h.count + len(rows))
+            for name, data in (("vectors", vectors), ("ids", ids), ("owners", owners)):
+                row_bytes = data[0].nbytes if data.ndim > 1 else data.itemsize
+                fd = os.open(self._path(name, h.epoch), os.O_WRONLY)
+                try:
+                    os.pwrite(fd, data.tobytes(), h.count * row_bytes)
+                finally:
+                    os.close(fd)
+            self._publish(h, count=h.count + len(rows), capacity=capacity, tombstones=h.tombstones + dead)
+            self._maybe_compact()
+
+    def upsert(self, item_id: int, owner_id: int, vector: Sequence[float]) -> None:
+        self.upsert_many([(item_id, owner_id, vector)])
+
+    def delete(self, item_ids: Sequence[int]) -> None:
+        with self._writer():
+            h = self._read_header(locked=True)
+            if h is None:
+                return
+            dead = self._tombstone(h, item_ids)
+            if dead:
+                self._publish(h, tombstones=h.tombstones + dead)
+                self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        h = self._read_header(locked=True)
+        if h is None or h.count < MIN_CAPACITY or h.tombstones <= h.count * COMPACT_RATIO:
+            return
+        view = self.view()
+        live = np.flatnonzero(view.ids > 0)
+        builder = Builder(self, h.dim)
+        builder.add(view.ids[live], view.owners[live], view.vectors[live])
+        builder._commit_locked()
+        logger.info("vector store %s compacted: %d -> %d rows", self.root.name, h.count, len(live))
+
+    def builder(self, dim: int) -> "Builder":
+        return Builder(self, dim)
+
+
+class Builder:
+    """Writes a fresh epoch next to the live one; `commit()` swaps it in atomically.
+
+    Для rebuild из БД: строки добавляются пачками (add вызывается из
+    threadpool между await'ами чтения), читатели до commit видят старый epoch.
+    """
+
+    def __init__(self, store: VectorStore, dim: int) -> None:
+        store.root.mkdir(parents=True, exist_ok=True)
+        self.store = store
+        self.dim = dim
+        self.count = 0
+        token = uuid.uuid4().hex[:8]
+        self._tmp = {name: store.root / f"{name}.tmp-{token}" for name in _DTYPES}
+        self._files = {name: open(path, "wb") for name, path in self._tmp.items()}
+
+    def add(self, ids, owners, vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        self._files["vectors"].write(vectors.tobytes())
+        self._files["ids"].write(np.asarray(ids, dtype=np.int64).tobytes())
+        self._files["owners"].write(np.asarray(owners, dtype=np.int64).tobytes())
+        self.count += len(vectors)
+
+    def abort(self) -> None:
+        for f in self._files.values():
+            f.close()
+        for path in self._tmp.values():
+            path.unlink(missing_ok=True)
+
+    def commit(self, only_if_missing: bool = False) -> bool:
+        """Publish the new epoch. only_if_missing: keep an existing store (first start)."""
+        with self.store._writer():
+            if only_if_missing and self.store._read_header(locked=True) is not None:
+                self.abort()
+                return False
+            self._commit_locked()
+        return True
+
+    def _commit_locked(self) -> None:
+        capacity = max(MIN_CAPACITY, self.count)
+        for name, f in self._files.items():
+            width = self.dim if name == "vectors" else 1
+            f.truncate(capacity * width * np.dtype(_DTYPES[name]).itemsize)
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        store = self.store
+        h = store._read_header(locked=True)
+        epoch = (h.epoch if h is not None else 0) + 1
+        for name, path in self._tmp.items():
+            os.replace(path, store._path(name, epoch))
+        store._publish(h, epoch=epoch, count=self.count, capacity=capacity, dim=self.dim, tombstones=0)
+
+        if h is not None:
+            # старые отображения у читателей остаются валидными (POSIX), файлы
+            # исчезнут после их remap'а
+            for name in _DTYPES:
+                try:
+                    store._path(name, h.epoch).unlink(missing_ok=True)
+                except OSError:  # pragma: no cover - Windows держит открытый mapping
+                    pass
+
+
+# --- per-model singletons --------------------------------------------------------
+
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.VECTOR_STORE_ENABLED
+
+
+def store_root(model: str) -> Path:
+    return Path(settings.DATA_DIR) / "vectors" / model.replace("/", "__")
+
+
+def get_store(model: Optional[str] = None) -> VectorStore:
+    from app.ai.embeddings import model_version
+
+    model = model or model_version()
+    with _stores_lock:
+        store = _stores.get(model)
+        if store is None:
+            store = _stores[model] = VectorStore(store_root(model))
+        return store
+
+
+def current_view(model: Optional[str] = None) -> Optional[VectorView]:
+    """View for search, or None => caller falls back to scanning Item.embedding."""
+    if not enabled():
+        return None
+    try:
+        return get_store(model).view()
+    except (OSError, ValueError):
+        logger.exception("vector store unavailable, falling back to DB scan")
+        return None
+
+
+# --- sync with the DB (async callers) --------------------------------------------
+
+async def index_items(rows: Sequence[Tuple[int, int, Sequence[float]]], model: Optional[str] = None) -> None:
+    """Append/replace vectors after the DB commit. Ошибка индекса не валит вызывающего:
+    поиск всё равно перепроверяет найденные item'ы по БД.
+    """
+    if not enabled() or not rows:
+        return
+    from starlette.concurrency import run_in_threadpool
+
+    try:
+        await run_in_threadpool(get_store(model).upsert_many, rows)
+    except (OSError, ValueError):
+        logger.exception("vector store upsert failed")
+
+
+async def forget_items(item_ids: Sequence[int], model: Optional[str] = None) -> None:
+    if not enabled() or not item_ids:
+        return
+    from starlette.concurrency import run_in_threadpool
+
+    try:
+        await run_in_threadpool(get_store(model).delete, list(item_ids))
+    except OSError:
+        logger.exception("vector store delete failed")
+
+
+async def rebuild_from_db(only_if_missing: bool = False, model: Optional[str] = None, chunk: int = 2000) -> int:
+    """Stream READY embeddings of `model` (non-CLOSED items) from the DB into a new epoch.
+
+    Изменения, пришедшие во время rebuild, могут не попасть в новый epoch —
+    поиск перепроверяет статус по БД, а повторный rebuild всё исправит.
+    """
+    from sqlalchemy import select
+    from starlette.concurrency import run_in_threadpool
+
+    from app.ai.embeddings import model_version
+    from app.db.database import SessionLocal
+    from app.db.models.item import Item
+
+    model = model or model_version()
+    store = get_store(model)
+    if only_if_missing and store.header() is not None:
+        return 0
+
+    builder: Optional[Builder] = None
+    last_id = 0
+    try:
+        async with SessionLocal() as db:
+            while True:
+                rows = (await db.execute(
+                    select(Item.id, Item.owner_id, Item.embedding)
+                    .where(
+                        Item.id > last_id,
+                        Item.embedding.is_not(None),
+                        Item.embedding_status == "READY",
+                        Item.embedding_model == model,
+                        # закрытые item поиск не показывает — не держим их в матрице
+                        Item.status != "CLOSED",
+                    )
+                    .order_by(Item.id)
+                    .limit(chunk)
+                )).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                rows = [r for r in rows if r[2]]
+                if not rows:
+                    continue
+                if builder is None:
+                    builder = store.builder(len(rows[0][2]))
+                await run_in_threadpool(
+                    builder.add, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                )
+        if builder is None:
+            return 0
+        if not await run_in_threadpool(builder.commit, only_if_missing):
+            return 0
+        return builder.count
+    except BaseException:
+        if builder is not None:
+            builder.abort()
+        raise
+
+
+def main(argv=None) -> None:
+    """python -m app.ai.vector_store [--model M]: rebuild the store from the DB."""
+    import argparse
+    import asyncio
+
+    ap = argparse.ArgumentParser(description=main.__doc__)
+    ap.add_argument("--model", default=None, help="default: current CLIP_MODEL/CLIP_PRETRAINED")
+    args = ap.parse_args(argv)
+
+    count = asyncio.run(rebuild_from_db(model=args.model))
+    print(f"vector store rebuilt: {count} vectors -> {get_store(args.model).root}")
+
+
+if __name__ == "__main__":
+    main()
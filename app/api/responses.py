@@ -0,0 +1,54 @@
+# app/api/responses.py
+"""JSON responses serialized by pydantic-core, bypassing FastAPI's response_model pass.
+
+Когда эндпоинт возвращает модели/ORM-объекты, FastAPI делает model_dump,
+валидирует результат заново против response_model, собирает python-dict'ы
+и только потом кодирует JSON. Для больших списков это основная стоимость
+ответа. Здесь данные проверяются не более одного раза и сразу пишутся в
+JSON-байты (TypeAdapter.dump_json). Вывод тот же, что и у FastAPI:
+response_model на декораторе остаётся для OpenAPI.
+"""
+
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.core.observability import span
+
+
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def _response(body: bytes, status_code: int, headers: Optional[Mapping[str, str]]) -> Response:
+    # заголовки, выставленные на инжектированном `response: Response`, при
+    # возврате своего Response теряются — поэтому передаются явно
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def typed_json(
+    tp: Any,
+    data: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """`data` is already an instance of `tp` (e.g. list of pydantic models): dump only."""
+    with span("serialization"):
+        body = adapter(tp).dump_json(data)
+    return _response(body, status_code, headers)
+
+
+def orm_json(
+    tp: Any,
+    data: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """ORM rows: one from_attributes validation, then straight to JSON bytes."""
+    ta = adapter(tp)
+    with span("serialization"):
+        body = ta.dump_json(ta.validate_python(data, from_attributes=True))
+    return _response(body, status_code, headers)
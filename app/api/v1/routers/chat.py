@@ -3,17 +3,24 @@
 from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy import or_, select, case
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.api.responses import typed_json
 from app.auth.deps import get_current_user
 from app.db.database import get_db
 from app.db.models.user import User
 from app.db.models.item import Item
 from app.db.models.chat_thread import ChatThread
 from app.db.models.chat_message import ChatMessage
+from app.db.models.thread_inbox import ThreadInbox
+from app.media.variant_urls import thumb_url
+from app.realtime.presence import presence
+from app.services import chat_archive, item_status, thread_inbox
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -31,10 +38,13 @@ class ThreadOut(BaseModel):
     item_title: Optional[str] = None
     item_status: Optional[str] = None
     item_image_url: Optional[str] = None
+    item_thumb_url: Optional[str] = None
 
     last_message_at: Optional[str] = None
     last_message_text: Optional[str] = None
 
+    peer_online: Optional[bool] = None
+
 
 class MessageOut(BaseModel):
     id: int
@@ -88,11 +98,28 @@ async def create_or_get_thread(
             ChatThread.user_high_id == hi,
         )
     )
+    if not existing:
+        # тред уже в архиве (item давно закрыт) — отдаём его, второй не заводим
+        archived = await chat_archive.find(db, payload.item_id, lo, hi)
+        if archived:
+            return ThreadOut(
+                id=archived.thread_id,
+                item_id=archived.item_id,
+                peer_id=archived.user_high_id if archived.user_low_id == me.id else archived.user_low_id,
+                item_title=item.title,
+                item_status=_status_value(item.status),
+                item_image_url=item.image_url,
+                item_thumb_url=thumb_url(item.image_variants),
+                last_message_at=archived.last_message_at.isoformat() if archived.last_message_at else None,
+                last_message_text=archived.last_message_text,
+            )
+
     if existing:
         # backfill: если чат уже есть, но статус ещё OPEN — переведём в IN_PROGRESS
-        if _status_value(item.status) == "OPEN":
-            item.status = "IN_PROGRESS"
-            await db.commit()
+        if _status_value(item.status) == item_status.OPEN:
+            if await item_status.transition(db, item.id, item_status.IN_PROGRESS, (item_status.OPEN,)):
+                await db.commit()
+                await item_status.after_commit(item_status.IN_PROGRESS, [item.id])
 
         return ThreadOut(
             id=existing.id,
@@ -101,6 +128,7 @@ async def create_or_get_thread(
             item_title=item.title,
             item_status=_status_value(item.status),
             item_image_url=item.image_url,
+            item_thumb_url=thumb_url(item.image_variants),
             last_message_at=existing.last_message_at.isoformat() if existing.last_message_at else None,
             last_message_text=existing.last_message_text,
         )
@@ -109,7 +137,7 @@ async def create_or_get_thread(
     any_thread_id = await db.scalar(
         select(ChatThread.id).where(ChatThread.item_id == payload.item_id).limit(1)
     )
-    if any_thread_id:
+    if any_thread_id or await chat_archive.find(db, payload.item_id):
         raise HTTPException(status_code=409, detail="Chat already created for this item")
 
     # 3) Создаём первый thread и переводим item в IN_PROGRESS
@@ -122,13 +150,17 @@ async def create_or_get_thread(
         last_message_text=None,
     )
     db.add(thread)
+    await db.flush()
 
-    if _status_value(item.status) == "OPEN":
-        item.status = "IN_PROGRESS"
+    # условный UPDATE: параллельное закрытие/смена статуса не перетирается
+    status_changed = _status_value(item.status) == item_status.OPEN and await item_status.transition(
+        db, item.id, item_status.IN_PROGRESS, (item_status.OPEN,),
+    )
+    await thread_inbox.add_thread(db, thread, item)
 
     await db.commit()
-    await db.refresh(thread)
-    await db.refresh(item)
+    if status_changed:
+        await item_status.after_commit(item_status.IN_PROGRESS, [item.id])
 
     return ThreadOut(
         id=thread.id,
@@ -137,42 +169,73 @@ async def create_or_get_thread(
         item_title=item.title,
         item_status=_status_value(item.status),
         item_image_url=item.image_url,
+        item_thumb_url=thumb_url(item.image_variants),
         last_message_at=None,
         last_message_text=None,
     )
 
 
+def _inbox_out(row: ThreadInbox, peer_online: Optional[bool] = None) -> ThreadOut:
+    return ThreadOut(
+        id=row.thread_id,
+        item_id=row.item_id,
+        peer_id=row.peer_id,
+        item_title=row.item_title,
+        item_status=row.item_status,
+        item_image_url=row.item_image_url,
+        item_thumb_url=row.item_thumb_url,
+        last_message_at=row.last_message_at.isoformat() if row.last_message_at else None,
+        last_message_text=row.last_message_text,
+        peer_online=peer_online,
+    )
+
+
+# размер страницы, если пришёл только cursor
+THREADS_PAGE_SIZE = 100
+
+
 @router.get("/threads", response_model=List[ThreadOut])
 async def list_threads(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="page size; without it and `cursor` — all threads"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     db: AsyncSession = Depends(get_db),
     me: User = Depends(get_current_user),
 ):
-    q = (
-        select(ChatThread, Item.title, Item.status, Item.image_url)
-        .join(Item, Item.id == ChatThread.item_id)
-        .where(or_(ChatThread.user_low_id == me.id, ChatThread.user_high_id == me.id))
-        .order_by(
-            case((Item.status == "CLOSED", 1), else_=0).asc(),  # CLOSED вниз
-            ChatThread.last_message_at.desc().nullslast(),
-            ChatThread.created_at.desc(),
-        )
+    """Threads of the current user: active first, then by last activity.
+
+    Читается из thread_inbox одним range scan. Пагинация — по желанию: без
+    `limit` и `cursor` отдаются все треды (как раньше), с `limit` —
+    страница, следующая — по курсору из заголовка `X-Next-Cursor`.
+    """
+    if limit is None and cursor is not None:
+        limit = THREADS_PAGE_SIZE
+    try:
+        rows, next_cursor = await thread_inbox.list_page(db, me.id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    online = presence.online_many({r.peer_id for r in rows})
+    return typed_json(
+        List[ThreadOut],
+        [_inbox_out(r, online[r.peer_id]) for r in rows],
+        headers={"X-Next-Cursor": next_cursor} if next_cursor else None,
     )
 
-    rows = (await db.execute(q)).all()
-
-    return [
-        ThreadOut(
-            id=t.id,
-            item_id=t.item_id,
-            peer_id=_peer_for_me(t, me.id),
-            item_title=title,
-            item_status=_status_value(status_),
-            item_image_url=image_url,
-            last_message_at=t.last_message_at.isoformat() if t.last_message_at else None,
-            last_message_text=t.last_message_text,
-        )
-        for (t, title, status_, image_url) in rows
-    ]
+
+@router.get("/presence")
+async def get_presence(
+    user_ids: str = Query(..., description="Comma-separated user ids"),
+    me: User = Depends(get_current_user),
+):
+    try:
+        ids = {int(x) for x in user_ids.split(",") if x.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user_ids")
+
+    if len(ids) > 500:
+        raise HTTPException(status_code=400, detail="Too many user_ids")
+
+    return {str(uid): online for uid, online in presence.online_many(ids).items()}
 
 
 @router.post("/threads/{thread_id}/close", response_model=ThreadOut)
@@ -181,32 +244,41 @@ async def close_thread(
     db: AsyncSession = Depends(get_db),
     me: User = Depends(get_current_user),
 ):
-    thread = await db.scalar(select(ChatThread).where(ChatThread.id == thread_id))
-    if not thread:
+    # тред и item одним запросом; эмбеддинг для ответа не нужен
+    row = (await db.execute(
+        select(ChatThread, Item)
+        .outerjoin(Item, Item.id == ChatThread.item_id)
+        .options(defer(Item.embedding))
+        .where(ChatThread.id == thread_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Thread not found")
+    thread, item = row
 
     if me.id not in (thread.user_low_id, thread.user_high_id):
         raise HTTPException(status_code=403, detail="Not your thread")
 
-    item = await db.scalar(select(Item).where(Item.id == thread.item_id))
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    # ✅ 1) ставим подтверждение от текущего юзера
-    if me.id == thread.user_low_id:
-        thread.close_low_confirmed = True
-    else:
-        thread.close_high_confirmed = True
-
+    # ✅ 1) ставим подтверждение от текущего юзера; RETURNING отдаёт оба флага
+    # уже с учётом параллельного подтверждения второй стороны
+    confirmed = "close_low_confirmed" if me.id == thread.user_low_id else "close_high_confirmed"
+    low, high = (await db.execute(
+        update(ChatThread)
+        .where(ChatThread.id == thread.id)
+        .values({confirmed: True})
+        .returning(ChatThread.close_low_confirmed, ChatThread.close_high_confirmed)
+        .execution_options(synchronize_session=False)
+    )).one()
+    set_committed_value(thread, "close_low_confirmed", low)
+    set_committed_value(thread, "close_high_confirmed", high)
+
+    # ✅ 2) CLOSED только если подтвердили оба — в той же транзакции
+    closed = low and high and await item_status.transition(db, item.id, item_status.CLOSED)
     await db.commit()
-    await db.refresh(thread)
-
-    # ✅ 2) CLOSED только если подтвердили оба
-    if thread.close_low_confirmed and thread.close_high_confirmed:
-        if _status_value(item.status) != "CLOSED":
-            item.status = "CLOSED"
-            await db.commit()
-            await db.refresh(item)
+    if closed:
+        await item_status.after_commit(item_status.CLOSED, [item.id])
 
     return ThreadOut(
         id=thread.id,
@@ -215,6 +287,7 @@ async def close_thread(
         item_title=item.title,
         item_status=_status_value(item.status),
         item_image_url=item.image_url,
+        item_thumb_url=thumb_url(item.image_variants),
         last_message_at=thread.last_message_at.isoformat() if thread.last_message_at else None,
         last_message_text=thread.last_message_text,
     )
@@ -230,7 +303,14 @@ async def list_messages(
 ):
     thread = await db.scalar(select(ChatThread).where(ChatThread.id == thread_id))
     if not thread:
-        raise HTTPException(status_code=404, detail="Thread not found")
+        # тред закрытого item мог уехать в архив — история читается оттуда
+        archived = await chat_archive.get(db, thread_id)
+        if not archived:
+            raise HTTPException(status_code=404, detail="Thread not found")
+        if me.id not in (archived.user_low_id, archived.user_high_id):
+            raise HTTPException(status_code=403, detail="Not your thread")
+        msgs = chat_archive.unpack(archived)[:min(limit, 200)]
+        return typed_json(List[MessageOut], [MessageOut(**m) for m in msgs])
 
     if me.id not in (thread.user_low_id, thread.user_high_id):
         raise HTTPException(status_code=403, detail="Not your thread")
@@ -243,7 +323,7 @@ async def list_messages(
     )
     msgs = (await db.scalars(q)).all()
 
-    return [
+    return typed_json(List[MessageOut], [
         MessageOut(
             id=m.id,
             thread_id=m.thread_id,
@@ -253,4 +333,4 @@ async def list_messages(
             client_id=m.client_id,
         )
         for m in msgs
-    ]
+    ])
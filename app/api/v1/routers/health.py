@@ -1,10 +1,48 @@
+from typing import Dict
+
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from app.ai.embeddings import model_state
+from app.db.database import SessionLocal
 
 router = APIRouter(
     prefix="/health",
     tags=["health"],
 )
 
+# name -> готово ли. Заполняется на старте (app/main.py); пока проверка
+# зарегистрирована со значением False, /health/ready отвечает 503.
+_checks: Dict[str, bool] = {}
+
+
+def set_ready(name: str, ok: bool) -> None:
+    _checks[name] = ok
+
+
 @router.get("")
 def health():
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+
+@router.get("/live")
+def live():
+    """Liveness: процесс отвечает. Ничего тяжёлого не трогает."""
+    return {"ok": True}
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: startup finished, DB reachable, model warmed up (if EMBED_WARMUP)."""
+    checks = dict(_checks)
+    try:
+        async with SessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+        checks["db_ping"] = True
+    except Exception:
+        checks["db_ping"] = False
+
+    ok = bool(checks.get("startup")) and all(checks.values())
+    body = {"ready": ok, "checks": checks, "model": model_state()}
+    return JSONResponse(body, status_code=200 if ok else 503)
@@ -1,21 +1,48 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response, status, Depends, Request
+from datetime import datetime
+from typing import List, Optional
 from pathlib import Path
-import uuid
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.schemas.items import Item as ItemSchema, ItemCreate, ItemUpdate
+from app.api.responses import orm_json
+from app.core.metrics import cache_result
+from app.core.timeago import naive_utc
+from app.schemas.items import (
+    Item as ItemSchema,
+    ItemBatchIn,
+    ItemBatchOut,
+    ItemChangesOut,
+    ItemCreate,
+    ItemMatchOut,
+    ItemUpdate,
+)
 from app.auth.deps import get_current_user
 from app.db.models.user import User
 from app.db.models.item import Item
 from app.db.database import get_db
-from app.core.config import settings
-from app.ai.embeddings import embed_image_bytes
+from app.ai import vector_store
+from app.ai.embeddings import model_version
+from app.media.uploads import UPLOAD_OPENAPI, receive_upload
+from app.media.phash import image_phash, phash_index
+from app.media.storage import get_storage
+from app.jobs import queue as job_queue
+from app.jobs.handlers import (
+    EMBEDDING_PENDING,
+    EMBEDDING_READY,
+    enqueue_build_variants,
+    enqueue_embed_item,
+    enqueue_match_item,
+)
+from app.services import chat_archive, item_changes, item_status, matching, media_blobs, thread_inbox
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+# GET /items:batch — ids в query string, длиннее — POST
+BATCH_MAX_IDS = 500
+
 
 async def _get_item_or_404(db: AsyncSession, item_id: int) -> Item:
     res = await db.execute(select(Item).where(Item.id == item_id))
@@ -31,9 +58,75 @@ def _ensure_owner(item: Item, user_id: int) -> None:
 
 
 @router.get("/", response_model=List[ItemSchema])
-async def list_items(db: AsyncSession = Depends(get_db)) -> List[Item]:
-    res = await db.execute(select(Item).order_by(Item.id.desc()))
-    return list(res.scalars().all())
+async def list_items(
+    created_after: Optional[datetime] = Query(None, description="UTC, e.g. items of the last 3 days"),
+    created_before: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # seq читается до списка: изменения между ними клиент получит повторно, но не потеряет
+    seq = await item_changes.latest_seq(db)
+    q = select(Item).order_by(Item.id.desc())
+    if created_after is not None:
+        q = q.where(Item.created_at >= naive_utc(created_after))
+    if created_before is not None:
+        q = q.where(Item.created_at < naive_utc(created_before))
+    res = await db.execute(q)
+    # весь список: одна валидация и сразу JSON (см. app/api/responses.py)
+    return orm_json(List[ItemSchema], res.scalars().all(), headers={"X-Changes-Seq": str(seq)})
+
+
+async def _batch(db: AsyncSession, ids: List[int]):
+    ids = list(dict.fromkeys(ids))  # порядок запроса, без повторов
+    # один IN-запрос и только колонки сводки (без embedding и описаний)
+    rows = await db.execute(
+        select(Item.id, Item.title, Item.type, Item.status, Item.image_url, Item.image_variants)
+        .where(Item.id.in_(ids))
+    )
+    by_id = {r.id: r for r in rows}
+    return orm_json(ItemBatchOut, {
+        "items": [by_id[i] for i in ids if i in by_id],
+        "missing": [i for i in ids if i not in by_id],
+    })
+
+
+@router.get(":batch", response_model=ItemBatchOut)
+async def get_items_batch(
+    ids: str = Query(..., description="Comma-separated item ids, up to 500"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Summaries of many items in one request, instead of GET /items/{id} per item."""
+    try:
+        parsed = [int(x) for x in ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ids")
+    if not parsed:
+        raise HTTPException(status_code=400, detail="Invalid ids")
+    if len(parsed) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail="Too many ids")
+    return await _batch(db, parsed)
+
+
+@router.post(":batch", response_model=ItemBatchOut)
+async def post_items_batch(payload: ItemBatchIn, db: AsyncSession = Depends(get_db)):
+    """Same as GET /items:batch for id lists that do not fit in a URL."""
+    return await _batch(db, payload.ids)
+
+
+@router.get("/changes", response_model=ItemChangesOut)
+async def list_item_changes(
+    since: int = Query(..., ge=0, description="seq from X-Changes-Seq or the previous delta"),
+    limit: int = Query(500, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Items created/changed/deleted after `since`, instead of re-fetching GET /items/.
+
+    410 — история до `since` уже сжата: перечитать GET /items/ и начать с его X-Changes-Seq.
+    """
+    try:
+        seq, changed, deleted, more = await item_changes.changes_since(db, since, limit)
+    except item_changes.HistoryCompacted:
+        raise HTTPException(status_code=410, detail="Change history compacted, refetch /items/")
+    return orm_json(ItemChangesOut, {"seq": seq, "items": changed, "deleted": deleted, "more": more})
 
 
 @router.get("/{item_id}", response_model=ItemSchema)
@@ -41,58 +134,129 @@ async def get_item(item_id: int, db: AsyncSession = Depends(get_db)) -> Item:
     return await _get_item_or_404(db, item_id)
 
 
+@router.get("/{item_id}/matches", response_model=List[ItemMatchOut])
+async def list_item_matches(
+    item_id: int,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Automatic lost↔found candidates for the caller's item, best first."""
+    item = await _get_item_or_404(db, item_id)
+    _ensure_owner(item, user.id)
+    rows = await matching.for_item(db, item)
+    return orm_json(List[ItemMatchOut], [
+        {
+            "item": other,
+            "score": m.score,
+            "similarity": m.similarity,
+            "location_score": m.location_score,
+            "created_at": m.created_at,
+        }
+        for m, other in rows
+    ])
+
+
 @router.post("/", response_model=ItemSchema, status_code=status.HTTP_201_CREATED)
 async def create_item(
     payload: ItemCreate,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> Item:
-    data = payload.model_dump()
+    data = payload.model_dump(exclude={"timeAgo"})
     new_item = Item(**data, owner_id=user.id, status="OPEN")
     db.add(new_item)
+    await db.flush()
+    item_changes.record(db, new_item.id)
     await db.commit()
     await db.refresh(new_item)
+    item_changes.notify()
     return new_item
 
 
-@router.post("/{item_id}/image", response_model=ItemSchema)
+@router.post(
+    "/{item_id}/image",
+    response_model=ItemSchema,
+    openapi_extra=UPLOAD_OPENAPI,
+)
 async def attach_image_to_item(
     item_id: int,
-    file: UploadFile = File(...),
+    request: Request,
+    response: Response,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> Item:
     """Attach an image to an existing item (MVP).
 
-    - Saves image into MEDIA_DIR
-    - Stores public `image_url` (served via StaticFiles)
-    - Extracts and stores `embedding` for similarity search
-
-    In production this upload should go to MinIO/S3 and `image_url` should be a
-    presigned/public URL.
+    - Streams the upload to a temp file (MAX_UPLOAD_BYTES cap)
+    - Stores it content-addressed (sha256) in the media storage; identical
+      uploads share one blob, the previous image of the item is released
+    - Stores public `image_url` (StaticFiles for local storage, S3/MinIO URL otherwise)
+    - Computes a perceptual hash; near-identical images of other items are
+      reported in the `X-Near-Duplicates` header (comma-separated ids)
+    - Reuses the `embedding` when the exact same file is already embedded for
+      another item; otherwise queues an `embed_item` job and returns with
+      `embedding_status=PENDING` (search skips the item until READY)
+    - Queues a `build_variants` job for resized WebP/JPEG variants
+      (filled into `image_variants` later)
     """
     item = await _get_item_or_404(db, item_id)
     _ensure_owner(item, user.id)
 
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Empty file")
+    async with receive_upload(request) as upload:
+        ext = (Path(upload.filename).suffix or ".jpg").lower()
+        safe_ext = ext if len(ext) <= 10 else ".jpg"
+        image_hash = await run_in_threadpool(image_phash, upload.path)
+
+        blob = await media_blobs.acquire(db, upload, safe_ext)
+
+    # тот же файл уже у другого item — CLIP второй раз не гоняем
+    embedding = await db.scalar(
+        select(Item.embedding)
+        .where(
+            Item.image_sha256 == blob.sha256,
+            Item.embedding_status == EMBEDDING_READY,
+            Item.embedding_model == model_version(),
+            Item.embedding.is_not(None),
+        )
+        .limit(1)
+    )
+    cache_result("embedding_by_sha256", embedding is not None)
+
+    near = await phash_index.search(db, image_hash, exclude=[item.id])
+    garbage = await media_blobs.release(db, item.image_sha256)
 
-    # Save under uploads/items/<item_id>/<uuid>.<ext>
-    ext = (Path(file.filename).suffix or ".jpg").lower()
-    safe_ext = ext if len(ext) <= 10 else ".jpg"
-    rel_dir = Path("items") / str(item_id)
-    abs_dir = Path(settings.MEDIA_DIR) / rel_dir
-    abs_dir.mkdir(parents=True, exist_ok=True)
-    filename = f"{uuid.uuid4().hex}{safe_ext}"
-    abs_path = abs_dir / filename
-    abs_path.write_bytes(data)
+    item.image_sha256 = blob.sha256
+    item.image_url = get_storage().url(blob.key)
+    item.image_variants = blob.variants
+    item.phash = image_hash
+    item.embedding = embedding
+    item.embedding_status = EMBEDDING_READY if embedding is not None else EMBEDDING_PENDING
+    item.embedding_model = model_version() if embedding is not None else None
+    await thread_inbox.on_item_changed(db, item)
+    item_changes.record(db, item.id)
 
-    item.image_url = f"/media/{rel_dir.as_posix()}/{filename}"
-    item.embedding = embed_image_bytes(data)
+    # CLIP и ресайз — в фоне (app/jobs), job коммитится вместе с item
+    if embedding is None:
+        await enqueue_embed_item(db, item.id, blob.sha256)
+    else:
+        await enqueue_match_item(db, item.id)
+    if not blob.variants:
+        await enqueue_build_variants(db, item.id, blob.sha256)
 
     await db.commit()
     await db.refresh(item)
+    await media_blobs.collect(garbage)
+    phash_index.add(item.id, image_hash)
+    # старый вектор (прежняя картинка) уходит сразу, новый — после embed_item
+    if embedding is not None:
+        await vector_store.index_items([(item.id, item.owner_id, embedding)])
+    else:
+        await vector_store.forget_items([item.id])
+    job_queue.notify()
+    item_changes.notify()
+
+    if near:
+        response.headers["X-Near-Duplicates"] = ",".join(str(i) for _, i in near[:20])
     return item
 
 
@@ -108,12 +272,57 @@ async def update_item(
 
     data = payload.model_dump(exclude_unset=True)
     data.pop("owner_id", None)
+    data.pop("timeAgo", None)
+
+    # статус — только через state machine: условный UPDATE, без lost update
+    # при параллельном закрытии треда / expiry
+    target = data.pop("status", None)
+    previous = item.status
+    status_changed = False
+    if target is not None and target != item.status:
+        if target not in item_status.OWNER_TARGETS:
+            raise HTTPException(status_code=422, detail=f"Status {target} is set by opening a chat thread")
+        try:
+            item_status.check(item.status, target)
+        except item_status.InvalidTransition as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        status_changed = await item_status.transition(db, item.id, target, (previous,))
+        if not status_changed:
+            raise HTTPException(status_code=409, detail="Item status changed concurrently, refetch it")
+
+    garbage: list[str] = []
+    # клиент подставил другую картинку — blob и варианты старой больше не наши
+    if "image_url" in data and data["image_url"] != item.image_url:
+        garbage = await media_blobs.release(db, item.image_sha256)
+        item.image_sha256 = None
+        item.image_variants = None
+        item.phash = None
+        phash_index.discard(item.id)
 
     for k, v in data.items():
         setattr(item, k, v)
+    # смену статуса transition уже записал
+    if data and not status_changed:
+        item_changes.record(db, item.id)
+
+    if data.keys() & {"title", "image_url"}:
+        await thread_inbox.on_item_changed(db, item)
+    # пары зависят от типа/категории/места; закрытый item уходит из них в job
+    if status_changed or data.keys() & {"category", "roomId", "floorLabel", "image_url"}:
+        if item.embedding_status == EMBEDDING_READY or item.status != "OPEN":
+            await enqueue_match_item(db, item.id)
 
     await db.commit()
     await db.refresh(item)
+    await media_blobs.collect(garbage)
+    # закрытые item в поиске не участвуют: убираем из индекса / возвращаем при переоткрытии
+    if status_changed:
+        await item_status.after_commit(item.status, [item.id])
+        reopened = previous == item_status.CLOSED and item.status != item_status.CLOSED
+        if reopened and item.embedding_status == EMBEDDING_READY and item.embedding is not None:
+            await vector_store.index_items([(item.id, item.owner_id, item.embedding)], item.embedding_model)
+    job_queue.notify()
+    item_changes.notify()
     return item
 
 
@@ -126,6 +335,15 @@ async def delete_item(
     item = await _get_item_or_404(db, item_id)
     _ensure_owner(item, user.id)
 
+    await thread_inbox.remove_item(db, item.id)
+    await matching.remove_item(db, item.id)
+    await chat_archive.remove_item(db, item.id)
+    item_changes.record(db, item.id, item_changes.DELETE)
+    garbage = await media_blobs.release(db, item.image_sha256)
     await db.delete(item)
     await db.commit()
+    await media_blobs.collect(garbage)
+    phash_index.discard(item_id)
+    await vector_store.forget_items([item_id])
+    item_changes.notify()
     return
@@ -1,29 +1,25 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
 from pathlib import Path
-import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import settings
+from app.db.database import get_db
+from app.media.storage import get_storage
+from app.media.uploads import UPLOAD_OPENAPI, receive_upload
+from app.services import media_blobs
 
 router = APIRouter(
     prefix="/media",
     tags=["media"],
 )
-@router.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Empty file")
+@router.post("/upload", openapi_extra=UPLOAD_OPENAPI)
+async def upload_image(request: Request, db: AsyncSession = Depends(get_db)):
+    # Content-addressed blob (same bytes -> same URL). Standalone uploads are
+    # referenced by URL only, so they keep their reference forever (never GC'd).
+    async with receive_upload(request) as upload:
+        ext = Path(upload.filename).suffix.lower() or ".jpg"
+        safe_ext = ext if ext in {".jpg", ".jpeg", ".png", ".webp"} else ".jpg"
+        blob = await media_blobs.acquire(db, upload, safe_ext)
+    await db.commit()
 
-    ext = Path(file.filename or "").suffix.lower() or ".jpg"
-    safe_ext = ext if ext in {".jpg", ".jpeg", ".png", ".webp"} else ".jpg"
-
-    # Stored under MEDIA_DIR/misc/... and served via app.mount('/media', ...)
-    rel_dir = Path("misc")
-    abs_dir = Path(settings.MEDIA_DIR) / rel_dir
-    abs_dir.mkdir(parents=True, exist_ok=True)
-
-    name = f"{uuid.uuid4().hex}{safe_ext}"
-    (abs_dir / name).write_bytes(data)
-
-    return JSONResponse({"filename": file.filename, "url": f"/media/{rel_dir.as_posix()}/{name}"})
+    return JSONResponse({"filename": upload.filename, "url": get_storage().url(blob.key)})
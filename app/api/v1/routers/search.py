@@ -1,12 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, Depends, Query, HTTPException
-from typing import List
+import heapq
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Dict, Iterable, List, Literal, Optional, Sequence, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from starlette.concurrency import run_in_threadpool
 
-from app.ai.embeddings import embed_image_bytes, cosine_similarity
+from app.ai import search_cache, vector_store
+from app.ai.embeddings import embed_image_file, cosine_similarity, model_version
+from app.api.responses import typed_json
+from app.core.metrics import cache_result
+from app.core.observability import span
+from app.core.timeago import naive_utc
+from app.jobs.handlers import EMBEDDING_READY
 from app.db.database import get_db
 from app.db.models.item import Item
+from app.media.phash import HASH_BITS, phash_index
+from app.media.uploads import UPLOAD_OPENAPI, receive_upload
 from app.schemas.items import (
     SimilarItemMatch,
     SimilarByImageResponse,
@@ -20,58 +32,162 @@ from app.auth.deps import get_current_user
 from app.db.models.user import User
 
 
+# запас кандидатов из mmap-индекса: часть может оказаться устаревшей по БД
+STORE_SLACK = 8
+# закрытые item в поиске не участвуют (и не лежат в индексе, см. expire_items)
+CLOSED = "CLOSED"
+
+
+def _search_filters(created_after: Optional[datetime], created_before: Optional[datetime]) -> list:
+    clauses = [Item.status != CLOSED]
+    if created_after is not None:
+        clauses.append(Item.created_at >= naive_utc(created_after))
+    if created_before is not None:
+        clauses.append(Item.created_at < naive_utc(created_before))
+    return clauses
+
+
+async def _load_hits(
+    db: AsyncSession, hits: List[Tuple[float, int]], model: str, filters: Sequence,
+) -> Dict[int, Item]:
+    rows = await db.scalars(
+        select(Item)
+        .options(defer(Item.embedding))  # вектор уже посчитан, JSON не разбираем
+        .where(
+            Item.id.in_([item_id for _, item_id in hits]),
+            Item.embedding_status == EMBEDDING_READY,
+            Item.embedding_model == model,
+            *filters,
+        )
+    )
+    return {it.id: it for it in rows}
+
+
+async def _store_top(
+    db: AsyncSession,
+    view: vector_store.VectorView,
+    query: List[float],
+    top_k: int,
+    min_similarity: float,
+    model: str,
+    exclude_owner: Optional[int],
+    exclude_ids: Iterable[int] = (),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> List[Tuple[float, Item]]:
+    """Top-k via the shared mmap matrix; hits re-checked against the DB (status, model, filters).
+
+    Если узкое окно по времени отсеяло почти всё, k увеличивается, пока
+    не наберётся top_k или не кончатся кандидаты выше порога.
+    Ранжирование кэшируется (search_cache) до смены generation индекса;
+    при попадании similarity считается заново по текущему запросу (только для
+    закэшированных id) и порог применяется снова. Item'ы всё равно читаются
+    из БД, и если какой-то уже не проходит — пересчёт.
+    """
+    exclude_ids = sorted(set(exclude_ids))
+    filters = _search_filters(created_after, created_before)
+
+    key = None
+    if search_cache.enabled():
+        q = search_cache.normalize(query)
+        window = tuple(naive_utc(dt) if dt is not None else None for dt in (created_after, created_before))
+        key = search_cache.make_key(
+            model, q, exclude_owner, tuple(exclude_ids), top_k, min_similarity, window,
+        )
+        cached = search_cache.cache.get(key, view.generation, q)
+        if cached is not None:
+            # запрос лишь близок к закэшированному: сходство — по текущему запросу
+            rescored = view.score(q, [item_id for _, item_id in cached])
+            hits = [(sim, item_id) for sim, item_id in rescored if sim >= min_similarity]
+            by_id = await _load_hits(db, hits, model, filters) if hits else {}
+            if len(rescored) == len(cached) and len(by_id) == len(hits):
+                cache_result("search_results", True)
+                return [(sim, by_id[item_id]) for sim, item_id in hits]
+            search_cache.cache.discard(key)
+        cache_result("search_results", False)
+
+    k = top_k + STORE_SLACK
+    while True:
+        with span("similarity"):
+            hits = view.top_k(query, k, min_similarity, exclude_owner, exclude_ids)
+        by_id = await _load_hits(db, hits, model, filters) if hits else {}
+        top = [(sim, by_id[item_id]) for sim, item_id in hits if item_id in by_id][:top_k]
+        if len(top) >= top_k or len(hits) < k:
+            break
+        k *= 4
+    if key is not None:
+        search_cache.cache.put(key, view.generation, q, [(sim, it.id) for sim, it in top])
+    return top
+
+
 router = APIRouter(
     prefix="/search",
     tags=["search"],
 )
 
 
-@router.post("/similar-by-image", response_model=SimilarByImageResponse)
+@router.post("/similar-by-image", response_model=SimilarByImageResponse, openapi_extra=UPLOAD_OPENAPI)
 async def similar_by_image(
-    file: UploadFile = File(...),
+    request: Request,
     top_k: int = Query(5, ge=1, le=50),
     min_similarity: float = Query(0.0, ge=0.0, le=1.0),
+    created_after: Optional[datetime] = Query(None, description="only items created at/after (UTC)"),
+    created_before: Optional[datetime] = Query(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),  # ✅ auth required
 ):
     """Find top-K similar items by uploaded image.
 
     - Requires authentication (future chat flow needs an account anyway).
-    - Excludes user's own items (owner_id != current_user.id).
+    - Excludes user's own items (owner_id != current_user.id) and CLOSED items.
+    - `created_after` / `created_before` limit the search to a time window.
     - Uses deterministic lightweight embeddings (can be replaced with CLIP later).
     """
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Empty file")
+    # query image is only needed for the embedding; temp file is removed afterwards
+    async with receive_upload(request) as upload:
+        query_vec = await run_in_threadpool(embed_image_file, upload.path)
 
-    query_vec = embed_image_bytes(data)
+    version = model_version()
+    filters = _search_filters(created_after, created_before)
+    view = vector_store.current_view(version)
+    if view is not None:
+        top = await _store_top(
+            db, view, query_vec, top_k, min_similarity, version, current_user.id,
+            created_after=created_after, created_before=created_before,
+        )
+        matches = [SimilarItemMatch(item=ItemSchema.model_validate(it), similarity=sim) for sim, it in top]
+        return typed_json(SimilarByImageResponse, SimilarByImageResponse(matches=matches))
 
+    # индекс ещё не построен / выключен: скан Item.embedding
     # ✅ Exclude user's own items
     res = await db.execute(
         select(Item).where(
             Item.embedding.is_not(None),
+            Item.embedding_status == EMBEDDING_READY,
+            # векторы разных CLIP-моделей несравнимы (см. app/ai/reembed.py)
+            Item.embedding_model == version,
             Item.owner_id != current_user.id,
+            *filters,
         )
     )
     items = list(res.scalars().all())
 
-    matches: List[SimilarItemMatch] = []
-    for it in items:
-        if not it.embedding:
-            continue
+    # top-k по голым числам; ItemSchema строим только для попавших в ответ
+    scored = []
+    with span("similarity"):
+        for it in items:
+            if not it.embedding:
+                continue
 
-        sim = cosine_similarity(query_vec, it.embedding)
-        if sim >= min_similarity:
-            matches.append(
-                SimilarItemMatch(
-                    item=ItemSchema.model_validate(it),
-                    similarity=sim,
-                )
-            )
+            sim = cosine_similarity(query_vec, it.embedding)
+            if sim >= min_similarity:
+                scored.append((sim, it.id, it))
 
-    matches.sort(key=lambda x: x.similarity, reverse=True)
-    matches = matches[:top_k]
-    return SimilarByImageResponse(matches=matches)
+    matches = [
+        SimilarItemMatch(item=ItemSchema.model_validate(it), similarity=sim)
+        for sim, _, it in heapq.nlargest(top_k, scored, key=lambda x: (x[0], x[1]))
+    ]
+    return typed_json(SimilarByImageResponse, SimilarByImageResponse(matches=matches))
 
 
 @router.post("/deduplicate", response_model=DeduplicateResponse)
@@ -79,44 +195,94 @@ async def deduplicate(
     item_id: int,
     top_k: int = Query(10, ge=1, le=50),
     min_similarity: float = Query(0.85, ge=0.0, le=1.0),
+    mode: Literal["auto", "phash", "embedding"] = Query("auto"),
+    created_after: Optional[datetime] = Query(None, description="only items created at/after (UTC)"),
+    created_before: Optional[datetime] = Query(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),  # ✅ auth required
 ):
-    """Find possible duplicates for an existing item by its stored embedding.
+    """Find possible duplicates for an existing item.
 
     - Requires authentication.
-    - Excludes user's own items from duplicates list.
+    - Excludes user's own items and CLOSED items from duplicates list;
+      `created_after` / `created_before` limit it to a time window.
+    - `phash`: only near-identical images via the perceptual-hash BK-tree (no
+      embedding scan); `embedding`: only the CLIP cosine scan; `auto`: pHash hits
+      first, then the embedding scan for the rest.
+    - 404 if the item does not exist, 409 if it lacks the signal the mode needs.
     """
     res = await db.execute(select(Item).where(Item.id == item_id))
     base = res.scalar_one_or_none()
 
-    if not base or not base.embedding:
-        raise HTTPException(status_code=404, detail="Item not found or has no embedding")
+    if not base:
+        raise HTTPException(status_code=404, detail="Item not found")
 
-    # ✅ Exclude user's own items
-    res = await db.execute(
-        select(Item).where(
-            Item.embedding.is_not(None),
-            Item.id != item_id,
-            Item.owner_id != current_user.id,
-        )
-    )
-    others = list(res.scalars().all())
+    use_phash = mode != "embedding" and bool(base.phash)
+    use_embedding = mode != "phash" and bool(base.embedding)
+    # item есть, но нужного сигнала ещё нет (нет картинки / эмбеддинг не готов)
+    if not (use_phash or use_embedding):
+        detail = {
+            "phash": "Item has no image hash (no image attached)",
+            "embedding": "Item has no embedding yet (no image or embedding not ready)",
+            "auto": "Item has neither an image hash nor an embedding",
+        }[mode]
+        raise HTTPException(status_code=409, detail=detail)
 
     dupes: List[SimilarItemMatch] = []
-    for it in others:
-        if not it.embedding:
-            continue
-
-        sim = cosine_similarity(base.embedding, it.embedding)
-        if sim >= min_similarity:
-            dupes.append(
-                SimilarItemMatch(
+    seen = {item_id}
+    filters = _search_filters(created_after, created_before)
+
+    if use_phash:
+        hits = await phash_index.search(db, base.phash, exclude=seen)
+        if hits:
+            dist_by_id = {i: d for d, i in hits}
+            rows = (await db.scalars(
+                select(Item).where(Item.id.in_(dist_by_id), Item.owner_id != current_user.id, *filters)
+            )).all()
+            for it in rows:
+                d = dist_by_id[it.id]
+                seen.add(it.id)
+                dupes.append(SimilarItemMatch(
                     item=ItemSchema.model_validate(it),
-                    similarity=sim,
-                )
+                    similarity=1.0 - d / HASH_BITS,
+                    near_duplicate=True,
+                    hamming_distance=d,
+                ))
+
+    view = vector_store.current_view(base.embedding_model) if use_embedding and base.embedding_model else None
+    if use_embedding and len(dupes) < top_k and view is not None:
+        top = await _store_top(
+            db, view, base.embedding, top_k - len(dupes), min_similarity,
+            base.embedding_model, current_user.id, seen, created_after, created_before,
+        )
+        dupes.extend(SimilarItemMatch(item=ItemSchema.model_validate(it), similarity=sim) for sim, it in top)
+    elif use_embedding and len(dupes) < top_k:
+        # ✅ Exclude user's own items
+        res = await db.execute(
+            select(Item).where(
+                Item.embedding.is_not(None),
+                Item.embedding_status == EMBEDDING_READY,
+                Item.embedding_model == base.embedding_model,
+                Item.id.not_in(seen),
+                Item.owner_id != current_user.id,
+                *filters,
             )
+        )
+        scored = []
+        with span("similarity"):
+            for it in res.scalars().all():
+                if not it.embedding:
+                    continue
+
+                sim = cosine_similarity(base.embedding, it.embedding)
+                if sim >= min_similarity:
+                    scored.append((sim, it.id, it))
+
+        # pHash-совпадения уже в dupes и всегда выше, добираем только остаток
+        for sim, _, it in heapq.nlargest(top_k - len(dupes), scored, key=lambda x: (x[0], x[1])):
+            dupes.append(SimilarItemMatch(item=ItemSchema.model_validate(it), similarity=sim))
 
-    dupes.sort(key=lambda x: x.similarity, reverse=True)
+    # near-duplicates по pHash всегда выше совпадений только по смыслу
+    dupes.sort(key=lambda x: (x.near_duplicate, x.similarity), reverse=True)
     dupes = dupes[:top_k]
-    return DeduplicateResponse(possible_duplicates=dupes)
+    return typed_json(DeduplicateResponse, DeduplicateResponse(possible_duplicates=dupes))
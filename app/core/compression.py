@@ -0,0 +1,200 @@
+# app/core/compression.py
+
+import zlib
+from typing import Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # optional dependency: `pip install brotli`
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# уже сжатое: повторное сжатие тратит CPU и ничего не даёт
+DEFAULT_EXCLUDED_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-brotli",
+    "application/octet-stream",
+    "text/event-stream",  # SSE должен уходить кусками без буферизации
+)
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int) -> None:
+        # wbits=31 => gzip-заголовок; zlib напрямую дешевле, чем gzip.GzipFile
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self, quality: int) -> None:
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+def _accepted(header: str) -> dict:
+    """Accept-Encoding -> {coding: q}."""
+    out = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[coding.strip().lower()] = q
+    return out
+
+
+class CompressionMiddleware:
+    """gzip / brotli for responses of at least `minimum_size` bytes.
+
+    В отличие от starlette GZipMiddleware: brotli (если установлен и клиент
+    его принимает), пропуск уже сжатых типов (картинки из /media и т.п.),
+    уровень сжатия настраивается. Стриминговые ответы буферизуются только
+    до порога, дальше сжимаются по кускам.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        excluded_types: Iterable[str] = DEFAULT_EXCLUDED_TYPES,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_types = tuple(excluded_types)
+
+    def _choose(self, scope: Scope):
+        if scope["method"] == "HEAD":
+            return None
+        accepted = _accepted(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return lambda: _Brotli(self.brotli_quality)
+        if accepted.get("gzip", 0) > 0:
+            return lambda: _Gzip(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        factory = self._choose(scope)
+        if factory is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _Responder(self, factory)(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, mw: CompressionMiddleware, factory) -> None:
+        self.mw = mw
+        self.factory = factory
+        self.send: Optional[Send] = None
+        self.start: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+        self.buffer: list = []
+        self.buffered = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.mw.app(scope, receive, self.on_send)
+
+    def _skip(self, start: Message) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return True
+        headers = Headers(raw=start["headers"])
+        if "content-encoding" in headers:
+            return True
+        content_type = headers.get("content-type", "").lower()
+        return content_type.startswith(self.mw.excluded_types)
+
+    def _start_compressed(self) -> Tuple[bytes, MutableHeaders]:
+        self.compressor = self.factory()
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.compressor.encoding
+        headers.add_vary_header("Accept-Encoding")
+        body = b"".join(self.buffer)
+        self.buffer = []
+        return body, headers
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = self._skip(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer.append(body)
+            self.buffered += len(body)
+
+            if self.buffered < self.mw.minimum_size:
+                if more_body:
+                    return
+                # маленький ответ целиком — отдаём как есть
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": b"".join(self.buffer)})
+                return
+
+            body, headers = self._start_compressed()
+            if not more_body:
+                data = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(data))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": data})
+                return
+
+            # стрим: длина заранее неизвестна
+            del headers["Content-Length"]
+            await self.send(self.start)
+
+        data = self.compressor.compress(body)
+        data += self.compressor.flush() if more_body else self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -26,6 +26,164 @@ class Settings(BaseSettings):
     DATABASE_URL: str = f"sqlite+aiosqlite:///{DB_PATH.as_posix()}"
 
     MEDIA_DIR: str = str(BASE_DIR / "uploads")
+    # производные данные (индексы), можно удалить — пересоберутся из БД
+    DATA_DIR: str = str(BASE_DIR / "data")
+    # "local" (MEDIA_DIR + /media mount) или "s3" (S3/MinIO, нужен boto3)
+    MEDIA_BACKEND: str = "local"
+    S3_ENDPOINT_URL: str = ""
+    S3_BUCKET: str = "lostfound-media"
+    S3_REGION: str = ""
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_PUBLIC_BASE_URL: str = ""
+
+    # раздача /media: static (через Python) | x-accel (nginx) | x-sendfile (Apache/lighttpd)
+    MEDIA_SERVE_MODE: str = "static"
+    MEDIA_ACCEL_PREFIX: str = "/_media"
+    MEDIA_LEGACY_MAX_AGE: int = 3600
+
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+
+    # превью для списков/карточек (ширины в px)
+    IMAGE_VARIANT_WIDTHS: List[int] = [64, 320, 960]
+    IMAGE_VARIANT_WORKERS: int = 2
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_JPEG_QUALITY: int = 82
+
+    # pHash: порог Хэмминга (из 64 бит) для "почти одинаковых" картинок
+    PHASH_MAX_DISTANCE: int = 6
+    # как часто индекс дочитывает чужие изменения из item_changes (дельта, не перестройка)
+    PHASH_INDEX_TTL_SECONDS: float = 60.0
+
+    # === Observability ===
+    # Prometheus text format на GET /metrics (без авторизации — закрыть на прокси)
+    METRICS_ENABLED: bool = True
+    # SQL в stdout (SQLAlchemy echo) — только для отладки, на нагрузке это основной шум и CPU
+    DB_ECHO: bool = False
+    # JSON-логи app.slow_query / app.slow_request; 0 = выключено
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_REQUEST_MS: float = 1000.0
+    # сэмплирующий профайлер (app/core/profiling.py): доля запросов и/или
+    # заголовок `X-Profile: <PROFILE_TOKEN>`; пустой token => заголовок игнорируется.
+    # Результат — folded stacks (flamegraph.pl, speedscope) в PROFILE_DIR
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_TOKEN: str = ""
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = str(BASE_DIR / "profiles")
+
+    # === HTTP compression (app/core/compression.py) ===
+    # gzip, или brotli если установлен `brotli` и клиент его принимает
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # === Embeddings (CLIP) ===
+    # смена модели делает старые Item.embedding несравнимыми: после неё
+    # запустить python -m app.ai.reembed
+    CLIP_MODEL: str = "ViT-B-32"
+    CLIP_PRETRAINED: str = "openai"
+    EMBED_BATCH_SIZE: int = 32
+    # загрузить модель и сделать пробный forward сразу после старта (в фоне;
+    # /health/ready = 503 до окончания). Иначе модель грузится на первом запросе.
+    EMBED_WARMUP: bool = False
+    # torch (fp32, GPU если есть) | torch-int8 (dynamic quantization, CPU)
+    # | onnx (onnxruntime, CPU; граф экспортируется при первом запуске)
+    EMBED_BACKEND: str = "torch"
+    # пустой путь => <BASE_DIR>/models/<CLIP_MODEL>-<CLIP_PRETRAINED>.onnx
+    EMBED_ONNX_PATH: str = ""
+    # 0 = по умолчанию библиотеки (обычно все ядра)
+    EMBED_THREADS: int = 0
+    EMBED_INTEROP_THREADS: int = 0
+    # mmap-матрица эмбеддингов в DATA_DIR/vectors (app/ai/vector_store.py), общая
+    # для всех воркеров; строится из БД при первом старте. Выключено => скан Item.embedding
+    VECTOR_STORE_ENABLED: bool = True
+    # кэш результатов similar-by-image / deduplicate (app/ai/search_cache.py):
+    # ключ — LSH-подпись вектора запроса + фильтры, сброс по generation индекса.
+    # 0 = выключено; MIN_COSINE — насколько близким должен быть запрос к закэшированному
+    SEARCH_CACHE_SIZE: int = 1024
+    SEARCH_CACHE_LSH_BITS: int = 32
+    SEARCH_CACHE_MIN_COSINE: float = 0.995
+
+    # === Lost↔found matching (app/services/matching.py) ===
+    # после готового эмбеддинга item сравнивается с OPEN item'ами противоположного
+    # type той же category; score = similarity + LOCATION_WEIGHT * (1 аудитория / 0.5 этаж)
+    MATCH_ENABLED: bool = True
+    MATCH_TOP_K: int = 5
+    MATCH_MIN_SIMILARITY: float = 0.75
+    MATCH_LOCATION_WEIGHT: float = 0.1
+    # периодический пересчёт/чистка пар; 0 = выключено
+    MATCH_SWEEP_SECONDS: float = 3600.0
+
+    # === Item expiry (app/services/item_expiry.py) ===
+    # OPEN item старше N дней закрывается автоматически (0 = никогда, по умолчанию).
+    # Политика продукта, включается оператором: закрытие убирает item из поиска
+    # и индекса, владельца никто не предупреждает
+    ITEM_EXPIRE_DAYS: float = 0.0
+    ITEM_EXPIRE_BATCH: int = 500
+    ITEM_EXPIRE_SWEEP_SECONDS: float = 3600.0
+
+    # === Chat archive (app/services/chat_archive.py) ===
+    # треды item'ов, закрытых дольше N дней, уезжают в сжатый архив
+    # (0 = не архивировать, по умолчанию). Включение — CHAT_ARCHIVE_AFTER_DAYS=30
+    # в .env; при первом старте init_db один раз пересобирает chat_threads
+    # (AUTOINCREMENT, см. init_db._autoincrement_chat_threads)
+    CHAT_ARCHIVE_AFTER_DAYS: float = 0.0
+    CHAT_ARCHIVE_BATCH: int = 200
+    CHAT_ARCHIVE_SWEEP_SECONDS: float = 3600.0
+    CHAT_ARCHIVE_ZLIB_LEVEL: int = 6
+
+    # === Item change log / items:feed (app/services/item_changes.py) ===
+    # дельты в комнату items:feed копятся окно и уходят одним emit'ом
+    ITEMS_FEED_COALESCE_MS: int = 500
+    # как часто процесс проверяет лог на изменения из других процессов (воркер, uvicorn)
+    ITEMS_FEED_POLL_SECONDS: float = 2.0
+    # записи об удалении старше этого выбрасываются (клиенту с более старым since — 410)
+    ITEM_CHANGES_RETENTION_DAYS: float = 7.0
+    ITEM_CHANGES_COMPACT_SECONDS: float = 3600.0
+
+    # === Background jobs (app/jobs) ===
+    # воркер внутри процесса API; в проде можно выключить и запускать
+    # отдельно: python -m app.jobs.worker
+    JOBS_RUN_IN_APP: bool = True
+    JOBS_CONCURRENCY: int = 2
+    JOBS_POLL_SECONDS: float = 2.0
+    JOBS_LEASE_SECONDS: int = 300
+    JOBS_MAX_ATTEMPTS: int = 5
+    # backoff: BASE * 2^(attempt-1), не больше MAX
+    JOBS_RETRY_BASE_SECONDS: float = 5.0
+    JOBS_RETRY_MAX_SECONDS: float = 600.0
+
+    # === Realtime ===
+    # presence/typing рассылаются не чаще одного раза в интервал на комнату
+    REALTIME_COALESCE_MS: int = 250
+    TYPING_TTL_SECONDS: float = 6.0
+
+    # token bucket на сокет: N событий/сек, всплеск до BURST
+    SIO_MESSAGE_RATE: float = 2.0
+    SIO_MESSAGE_BURST: int = 10
+    SIO_JOIN_RATE: float = 1.0
+    SIO_JOIN_BURST: int = 10
+    SIO_TYPING_RATE: float = 4.0
+    SIO_TYPING_BURST: int = 8
+    SIO_USER_RATE_FACTOR: float = 2.0
+
+    # исходящая очередь engine.io на соединение (в пакетах):
+    # выше DROP_AT теряем необязательные события, выше DISCONNECT_AT рвём соединение
+    SIO_OUTBOUND_DROP_AT: int = 100
+    SIO_OUTBOUND_DISCONNECT_AT: int = 1000
+
+    # сжатие ответов long-polling (engine.io) крупнее порога, в байтах.
+    # WebSocket сжимается per-message deflate на стороне uvicorn
+    # (--ws-per-message-deflate, включено по умолчанию)
+    SIO_HTTP_COMPRESSION: bool = True
+    SIO_COMPRESSION_THRESHOLD: int = 1024
+
+    # redis://... — общая шина Socket.IO между процессами (нужен пакет `redis`):
+    # уведомления из отдельного воркера/другого uvicorn-процесса доходят до
+    # всех сокетов. Пусто => emit видят только сокеты этого процесса
+    SIO_MESSAGE_QUEUE: str = ""
 
     class Config:
         env_file = str(BASE_DIR / ".env")
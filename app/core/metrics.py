@@ -0,0 +1,177 @@
+# app/core/metrics.py
+
+import logging
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=None) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        # key -> [count per bucket (не кумулятивно)..., +Inf bucket, sum];
+        # observe трогает одну ячейку, накопление — только при чтении
+        self._hist: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            h[idx] += 1
+            h[-1] += value
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._hist.items()]
+        for key, h in items:
+            labels = dict(zip(self.labelnames, key))
+            total = 0
+            for i, bound in enumerate(self.buckets):
+                total += h[i]
+                yield f"{self.name}_bucket", {**labels, "le": repr(bound)}, total
+            total += h[len(self.buckets)]
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, total
+            yield f"{self.name}_count", labels, total
+            yield f"{self.name}_sum", labels, h[-1]
+
+
+REGISTRY: Dict[str, _Metric] = {}
+
+
+def _register(cls, name: str, help: str, labelnames: Tuple[str, ...]):
+    metric = REGISTRY.get(name)
+    if metric is None:
+        metric = REGISTRY[name] = cls(name, help, labelnames)
+    return metric
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter, name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=None) -> Histogram:
+    metric = REGISTRY.get(name)
+    if metric is None:
+        metric = REGISTRY[name] = Histogram(name, help, labelnames, buckets)
+    return metric
+
+
+# Вызываются перед каждым render(): gauge'и, которые дешевле посчитать по
+# запросу /metrics, чем поддерживать на каждом событии (соединения, комнаты).
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> Callable[[], None]:
+    _COLLECTORS.append(fn)
+    return fn
+
+
+CACHE_REQUESTS = counter(
+    "cache_requests_total", "Lookups in in-process / content-addressed caches", ("cache", "result"),
+)
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    """hit ratio = rate(cache_requests_total{result="hit"}) / rate(cache_requests_total)."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    for collect in _COLLECTORS:
+        try:
+            collect()
+        except Exception:
+            logging.getLogger(__name__).exception("metrics collector failed")
+
+    lines: List[str] = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for sample, labels, value in metric.samples():
+            if labels:
+                body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                lines.append(f"{sample}{{{body}}} {_fmt(value)}")
+            else:
+                lines.append(f"{sample} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, list]:
+    """Plain dict of all metric samples (for debugging / health output)."""
+    return {
+        name: [{"labels": labels, "value": value} for _, labels, value in m.samples()]
+        for name, m in REGISTRY.items()
+    }
@@ -0,0 +1,242 @@
+# app/core/observability.py
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import counter, gauge, histogram
+
+HTTP_DURATION = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being processed", ("method",))
+HTTP_DB_QUERIES = histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+HTTP_DB_SECONDS = histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request", ("route",),
+)
+DB_QUERY_SECONDS = histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_ERRORS = counter("db_query_errors_total", "SQL statements that raised", ("op",))
+SLOW_QUERIES = counter("db_slow_queries_total", "SQL statements over the slow-query threshold", ("op",))
+SLOW_REQUESTS = counter("http_slow_requests_total", "HTTP requests over the slow-request threshold", ("route",))
+
+# структурированные логи: одна строка JSON на событие, удобно грепать / грузить в Loki
+slow_query_log = logging.getLogger("app.slow_query")
+slow_request_log = logging.getLogger("app.slow_request")
+
+
+class RequestStats:
+    """Per-request counters, reachable from anywhere via `current_stats()`.
+
+    Объект изменяемый: contextvar копируется в threadpool и в greenlet'ы
+    SQLAlchemy, но ссылка остаётся на тот же объект.
+    """
+
+    __slots__ = ("path", "db_queries", "db_seconds", "spans")
+
+    def __init__(self, path: str = "") -> None:
+        self.path = path
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        # name -> seconds (inference, serialization, ...); DB считается отдельно
+        self.spans: dict = {}
+
+    def add_span(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Attribute the block's wall time to `name` in the current request breakdown.
+
+    Вне HTTP-запроса (воркер, CLI) — no-op, кроме пары perf_counter.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_span(name, time.perf_counter() - started)
+
+
+# --- SQLAlchemy ------------------------------------------------------------------
+
+def _op(statement: str) -> str:
+    head = statement.lstrip()[:8].split(None, 1)
+    op = head[0].lower() if head else ""
+    return op if op in ("select", "insert", "update", "delete") else "other"
+
+
+_SHAPE_LIMIT = 20
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _shape(params: Any) -> Any:
+    """Parameter types only, never values (there are e-mails and message texts in there)."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        items = list(params.items())
+        shape = {k: type(v).__name__ for k, v in items[:_SHAPE_LIMIT]}
+        if len(items) > _SHAPE_LIMIT:
+            shape["..."] = len(items)
+        return shape
+    if isinstance(params, (list, tuple)):
+        shape = [type(v).__name__ for v in params[:_SHAPE_LIMIT]]
+        if len(params) > _SHAPE_LIMIT:
+            shape.append(f"...{len(params)}")
+        return shape
+    return type(params).__name__
+
+
+def params_shape(parameters: Any, executemany: bool) -> Any:
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "row": _shape(rows[0]) if rows else None}
+    return _shape(parameters)
+
+
+def _log_slow_query(statement: str, parameters: Any, executemany: bool, elapsed: float) -> None:
+    op = _op(statement)
+    SLOW_QUERIES.inc(op=op)
+    stats = _current.get()
+    slow_query_log.warning(json.dumps({
+        "event": "slow_query",
+        "duration_ms": _ms(elapsed),
+        "op": op,
+        "statement": " ".join(statement.split())[:2000],
+        "params": params_shape(parameters, executemany),
+        "path": stats.path if stats is not None else None,
+    }, ensure_ascii=False, default=str))
+
+
+def instrument_engine(engine, slow_query_ms: float = 0) -> None:
+    """Time every cursor execute; works for AsyncEngine (via sync_engine) too.
+
+    slow_query_ms > 0 => statements at least that slow go to the `app.slow_query` log.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    slow = slow_query_ms / 1000 if slow_query_ms > 0 else None
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["_query_started"].pop()
+        DB_QUERY_SECONDS.observe(elapsed, op=_op(statement))
+        if slow is not None and elapsed >= slow:
+            _log_slow_query(statement, parameters, executemany, elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(ctx):
+        started = ctx.connection.info.get("_query_started") if ctx.connection is not None else None
+        if started:
+            started.pop()
+        DB_ERRORS.inc(op=_op(ctx.statement or ""))
+
+
+# --- ASGI middleware -------------------------------------------------------------
+
+def route_label(scope: Scope) -> str:
+    """Route template (`/api/v1/items/{item_id}`), not the raw path: bounded cardinality."""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "<route>")
+    if scope.get("root_path"):
+        return scope["root_path"]  # Mount, например /media
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Latency histogram, in-flight gauge and per-request DB stats per route.
+
+    slow_request_ms > 0 => requests at least that slow go to the `app.slow_request`
+    log with a breakdown: db, spans (inference, serialization, ...) and the rest.
+    """
+
+    def __init__(self, app: ASGIApp, slow_request_ms: float = 0) -> None:
+        self.app = app
+        self.slow = slow_request_ms / 1000 if slow_request_ms > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats(scope["path"])
+        token = _current.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(method=method)
+            _current.reset(token)
+
+            route = route_label(scope)
+            HTTP_DURATION.observe(elapsed, method=method, route=route, status=status)
+            HTTP_DB_QUERIES.observe(stats.db_queries, route=route)
+            HTTP_DB_SECONDS.observe(stats.db_seconds, route=route)
+            if self.slow is not None and elapsed >= self.slow:
+                self._log_slow(method, route, scope, status, elapsed, stats)
+
+    @staticmethod
+    def _log_slow(method: str, route: str, scope: Scope, status: int, elapsed: float, stats: RequestStats) -> None:
+        SLOW_REQUESTS.inc(route=route)
+        spans = {name: _ms(seconds) for name, seconds in stats.spans.items()}
+        # спаны из threadpool могут идти параллельно с event loop — "other" тогда
+        # занижен, поэтому не уходит ниже нуля
+        accounted = stats.db_seconds + sum(stats.spans.values())
+        slow_request_log.warning(json.dumps({
+            "event": "slow_request",
+            "method": method,
+            "route": route,
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": _ms(elapsed),
+            "db_ms": _ms(stats.db_seconds),
+            "db_queries": stats.db_queries,
+            "spans_ms": spans,
+            "other_ms": _ms(max(elapsed - accounted, 0.0)),
+        }, ensure_ascii=False))
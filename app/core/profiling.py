@@ -0,0 +1,137 @@
+# app/core/profiling.py
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.observability import route_label
+
+logger = logging.getLogger("app.profiling")
+
+PROFILE_HEADER = "x-profile"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    # ';' — разделитель фреймов в folded-формате
+    return f"{module}.{code.co_name}:{frame.f_lineno}".replace(";", ":")
+
+
+class StackSampler:
+    """Statistical profiler: samples stacks of all threads every `interval` seconds.
+
+    Результат — "folded stacks" (frame;frame;frame count), формат
+    flamegraph.pl / speedscope / inferno. Сэмплируются все потоки, кроме
+    своего: event loop и threadpool (CLIP, Pillow) попадают вместе.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if tid not in names:
+                    thread = threading._active.get(tid)  # noqa: SLF001 - только имя для отчёта
+                    names[tid] = thread.name if thread is not None else str(tid)
+                stack.append(names[tid].replace(";", ":").replace(" ", "_"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def write_folded(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    """Opt-in sampling profiler for a fraction of requests or on demand.
+
+    Профилируется запрос, если сработал `sample_rate` или пришёл заголовок
+    `X-Profile: <header_token>` (пустой token => заголовок игнорируется).
+    Одновременно профилируется не больше одного запроса: сэмплер видит все
+    потоки, и параллельные профили только мешали бы друг другу.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        out_dir: str,
+        sample_rate: float = 0.0,
+        header_token: str = "",
+        interval_ms: float = 5.0,
+    ) -> None:
+        self.app = app
+        self.out_dir = Path(out_dir)
+        self.sample_rate = sample_rate
+        self.header_token = header_token
+        self.interval = interval_ms / 1000
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.header_token:
+            value = Headers(scope=scope).get(PROFILE_HEADER)
+            if value is not None and value == self.header_token:
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(self.interval).start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._save(scope, sampler, elapsed_ms)
+
+    def _save(self, scope: Scope, sampler: StackSampler, elapsed_ms: float) -> Optional[Path]:
+        route = route_label(scope).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{scope['method']}-{route}-{elapsed_ms:.0f}ms.folded"
+        path = self.out_dir / name
+        try:
+            sampler.write_folded(path)
+        except OSError:
+            logger.exception("cannot write profile %s", path)
+            return None
+        logger.info("profile %s %s: %.0f ms, %d samples -> %s",
+                    scope["method"], scope["path"], elapsed_ms, sampler.samples, path)
+        return path
@@ -0,0 +1,45 @@
+# app/core/timeago.py
+"""Relative time labels for the UI ("5 минут назад"), computed at render time."""
+
+from datetime import datetime
+from typing import Optional
+
+# (секунд в единице, формы для 1 / 2-4 / 5-20)
+_UNITS = (
+    (365 * 86400, ("год", "года", "лет")),
+    (30 * 86400, ("месяц", "месяца", "месяцев")),
+    (7 * 86400, ("неделю", "недели", "недель")),
+    (86400, ("день", "дня", "дней")),
+    (3600, ("час", "часа", "часов")),
+    (60, ("минуту", "минуты", "минут")),
+)
+
+
+def plural_ru(n: int, forms: tuple) -> str:
+    n = abs(n)
+    if n % 10 == 1 and n % 100 != 11:
+        return forms[0]
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return forms[1]
+    return forms[2]
+
+
+def naive_utc(dt: datetime) -> datetime:
+    """Timestamps are stored as naive UTC (datetime.utcnow); convert aware input."""
+    if dt.tzinfo is None:
+        return dt
+    return dt.replace(tzinfo=None) - dt.utcoffset()
+
+
+def time_ago(dt: Optional[datetime], now: Optional[datetime] = None) -> str:
+    if dt is None:
+        return ""
+    now = now or datetime.utcnow()
+    seconds = int((now - naive_utc(dt)).total_seconds())
+    if seconds < 60:
+        return "только что"
+    for size, forms in _UNITS:
+        if seconds >= size:
+            n = seconds // size
+            return f"{n} {plural_ru(n, forms)} назад"
+    return "только что"
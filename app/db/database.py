@@ -3,9 +3,12 @@ from sqlalchemy.orm import DeclarativeBase
 from typing import AsyncGenerator
 
 from app.core.config import settings
+from app.core.observability import instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.DB_ECHO)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+# db_query_duration_seconds + per-request DB stats + slow-query log
+instrument_engine(engine, slow_query_ms=settings.SLOW_QUERY_MS)
 
 class Base(DeclarativeBase):
     pass
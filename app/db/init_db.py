@@ -1,6 +1,126 @@
-from app.db.database import Base, engine
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.schema import CreateTable
+
+from app.core.config import settings
+from app.db.database import Base, SessionLocal, engine
 import app.db.models  # side-effect import: регистрирует модели в Base.metadata
+from app.db.models.chat_archive import ChatThreadArchive
+from app.db.models.chat_thread import ChatThread
+from app.db.models.item import Item
+from app.db.models.thread_inbox import ThreadInbox
+from app.ai.embeddings import LEGACY_MODEL_VERSION
+from app.services import thread_inbox
+
+
+def _add_missing_columns(conn) -> None:
+    """create_all не меняет существующие таблицы — докидываем новые колонки.
+
+    Работает только для nullable-колонок или колонок с server_default
+    (как в add_close_flags.py).
+    """
+    insp = inspect(conn)
+    ddl_compiler = conn.dialect.ddl_compiler(conn.dialect, None)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col.type.compile(conn.dialect)}'
+            # default рендерит диалект (строки в кавычках, text() как есть);
+            # NOT NULL только если колонка так объявлена и есть чем заполнить старые строки
+            default = ddl_compiler.get_column_default_string(col) if col.server_default is not None else None
+            if default is not None:
+                if not col.nullable:
+                    ddl += " NOT NULL"
+                ddl += f" DEFAULT {default}"
+            conn.execute(text(ddl))
+
+        existing_indexes = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(conn)
+
+
+def _autoincrement_chat_threads(conn) -> None:
+    """SQLite: chat_threads с AUTOINCREMENT, счётчик выше всех известных thread_id.
+
+    Без AUTOINCREMENT SQLite выдаёт max(id)+1, и id заархивированного
+    (удалённого из chat_threads) треда достался бы новому — а строки
+    thread_inbox и архив с этим id остаются. ALTER так не умеет: старую
+    таблицу пересобираем (новая -> копия -> drop -> rename, индексы заново).
+    Пересборка нужна только архиву: пока CHAT_ARCHIVE_AFTER_DAYS = 0 и архив
+    пуст, старая таблица не трогается. На PostgreSQL sequence и так не
+    переиспользует номера.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    table = ChatThread.__table__
+    ddl = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name})
+    archiving = settings.CHAT_ARCHIVE_AFTER_DAYS > 0 or conn.scalar(select(ChatThreadArchive.thread_id).limit(1))
+    if ddl and "AUTOINCREMENT" not in ddl.upper() and archiving:
+        tmp = f"{table.name}_autoinc"
+        create = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+        conn.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {tmp} ", 1)))
+        cols = ", ".join(f'"{c.name}"' for c in table.columns)
+        conn.execute(text(f"INSERT INTO {tmp} ({cols}) SELECT {cols} FROM {table.name}"))
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {tmp} RENAME TO {table.name}"))
+        for index in table.indexes:
+            index.create(conn)
+
+    floor = max(
+        conn.scalar(select(func.max(ChatThread.id))) or 0,
+        conn.scalar(select(func.max(ChatThreadArchive.thread_id))) or 0,
+        conn.scalar(select(func.max(ThreadInbox.thread_id))) or 0,
+    )
+    res = conn.execute(
+        text("UPDATE sqlite_sequence SET seq = :floor WHERE name = :name AND seq < :floor"),
+        {"floor": floor, "name": table.name},
+    )
+    if not res.rowcount and floor:
+        conn.execute(
+            text(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :floor "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+            ),
+            {"floor": floor, "name": table.name},
+        )
+
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_autoincrement_chat_threads)
+
+    # thread_inbox появился позже chat_threads — заполняем один раз
+    async with SessionLocal() as db:
+        await thread_inbox.backfill(db)
+
+        # embedding_status появился позже: посчитанные ранее эмбеддинги готовы
+        await db.execute(
+            update(Item)
+            .where(Item.embedding.is_not(None), Item.embedding_status.is_(None))
+            .values(embedding_status="READY")
+        )
+        # до CLIP_MODEL/CLIP_PRETRAINED модель была зашита в коде
+        await db.execute(
+            update(Item)
+            .where(Item.embedding.is_not(None), Item.embedding_model.is_(None))
+            .values(embedding_model=LEGACY_MODEL_VERSION)
+        )
+        # created_at/updated_at появились позже: настоящее время создания неизвестно
+        now = datetime.utcnow()
+        await db.execute(update(Item).where(Item.created_at.is_(None)).values(created_at=now))
+        await db.execute(update(Item).where(Item.updated_at.is_(None)).values(updated_at=now))
+        # closed_at появился позже: для уже закрытых берём последнее изменение
+        await db.execute(
+            update(Item)
+            .where(Item.status == "CLOSED", Item.closed_at.is_(None))
+            .values(closed_at=func.coalesce(Item.updated_at, now), updated_at=Item.updated_at)
+        )
+        await db.commit()
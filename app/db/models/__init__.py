@@ -3,3 +3,9 @@ from app.db.models.item import Item
 from app.db.models.refresh_token import RefreshToken
 from app.db.models.chat_thread import ChatThread
 from app.db.models.chat_message import ChatMessage
+from app.db.models.thread_inbox import ThreadInbox
+from app.db.models.media_blob import MediaBlob
+from app.db.models.job import Job
+from app.db.models.item_match import ItemMatch
+from app.db.models.item_change import ItemChange
+from app.db.models.chat_archive import ChatThreadArchive
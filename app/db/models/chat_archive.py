@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class ChatThreadArchive(Base):
+    """Closed thread moved out of chat_threads/chat_messages (app/services/chat_archive.py).
+
+    Одна строка на тред: поля треда + все сообщения одним сжатым блобом.
+    id совпадает с прежним chat_threads.id — строки thread_inbox и ссылки
+    клиентов продолжают работать, история читается по запросу.
+    """
+
+    __tablename__ = "chat_thread_archives"
+
+    thread_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # без FK: архив не должен мешать удалению item/пользователей
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    user_low_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    user_high_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_message_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_message_text: Mapped[str | None] = mapped_column(String, nullable=True)
+    close_low_confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    close_high_confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # формат блоба; при смене — новый код + чтение старого
+    codec: Mapped[str] = mapped_column(String, nullable=False, default="json+zlib")
+    messages: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
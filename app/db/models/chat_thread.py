@@ -28,6 +28,9 @@ class ChatThread(Base):
 
     __table_args__ = (
         UniqueConstraint("item_id", "user_low_id", "user_high_id", name="uq_thread_item_users"),
+        # id архивированных/удалённых тредов не выдаются снова: на них ссылаются
+        # thread_inbox, chat_thread_archives и клиенты (см. init_db)
+        {"sqlite_autoincrement": True},
     )
 
     messages = relationship("ChatMessage", back_populates="thread", cascade="all, delete-orphan")
@@ -1,4 +1,6 @@
-from sqlalchemy import Integer, String, ForeignKey
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Integer, String, ForeignKey
 from sqlalchemy.types import JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -17,14 +19,44 @@ class Item(Base):
     roomId: Mapped[str] = mapped_column(String, nullable=False)
     roomLabel: Mapped[str] = mapped_column(String, nullable=False)
     floorLabel: Mapped[str] = mapped_column(String, nullable=False)
-    timeAgo: Mapped[str] = mapped_column(String, nullable=False)
+    # legacy: строка от клиента; в ответах timeAgo считается из created_at
+    timeAgo: Mapped[str] = mapped_column(String, nullable=False, default="")
     description: Mapped[str] = mapped_column(String, nullable=False)
 
     # Optional media / AI fields (MVP)
     # `image_url` is a link to the stored image (local StaticFiles in dev; S3/MinIO in prod).
     image_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    # sha256 of the content-addressed blob behind image_url (see MediaBlob)
+    image_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    # 64-bit perceptual hash (hex) for near-duplicate detection, see app/media/phash.py
+    phash: Mapped[str | None] = mapped_column(String(16), nullable=True, index=True)
+    # resized WebP/JPEG copies: {"webp": [{"w", "h", "url"}, ...], "jpeg": [...]}
+    image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     # `embedding` is a list[float] stored as JSON for MVP (SQLite-compatible).
     embedding: Mapped[list[float] | None] = mapped_column(JSON, nullable=True)
+    # None (нет картинки) | PENDING (ждёт job embed_item) | READY | FAILED
+    embedding_status: Mapped[str | None] = mapped_column(String, nullable=True)
+    # "<CLIP_MODEL>/<CLIP_PRETRAINED>" that produced `embedding`; сравниваем только одинаковые
+    embedding_model: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
 
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
-    owner = relationship("User", back_populates="items")
\ No newline at end of file
+    owner = relationship("User", back_populates="items")
+
+    # nullable только ради ALTER TABLE на старых базах; init_db заполняет пустые
+    created_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, default=datetime.utcnow, index=True,
+    )
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow,
+    )
+    # когда item стал CLOSED (None — не закрыт); от него считается архивация чатов
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    # последний прогон matching.match_item; match_sweep берёт только item без
+    # прогона или изменённые после него (updated_at > matched_at)
+    matched_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+# кандидаты для сопоставления lost↔found (app/services/matching.py)
+Index("ix_items_match_candidates", Item.type, Item.category, Item.status)
+# expire sweep (OPEN старше ITEM_EXPIRE_DAYS) и списки "за последние N дней" по статусу
+Index("ix_items_status_created", Item.status, Item.created_at)
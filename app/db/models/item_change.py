@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class ItemChange(Base):
+    """Append-only log of item changes behind GET /items/changes and items:feed.
+
+    seq монотонно растёт (AUTOINCREMENT: номера удалённых при компакции
+    строк не переиспользуются), клиент хранит последний увиденный seq.
+    Строка — только факт "item изменился": состояние берётся из items на
+    момент чтения, поэтому несколько правок подряд схлопываются в одну дельту.
+    """
+
+    __tablename__ = "item_changes"
+
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # без FK: запись об удалении переживает сам item
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # upsert | delete | horizon (всё до этого seq сжато, см. item_changes.compact)
+    op: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+# компакция: "последняя запись по item" и "старые удаления"
+Index("ix_item_changes_item_seq", ItemChange.item_id, ItemChange.seq)
+Index("ix_item_changes_op_seq", ItemChange.op, ItemChange.seq)
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class ItemMatch(Base):
+    """Candidate lost↔found pair found by app/services/matching.py.
+
+    Одна строка на пару (lost, found) независимо от того, чей прогон её
+    нашёл; score = similarity + MATCH_LOCATION_WEIGHT * location_score.
+    """
+
+    __tablename__ = "item_matches"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    lost_item_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=False)
+    found_item_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=False)
+
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    similarity: Mapped[float] = mapped_column(Float, nullable=False)
+    # 1.0 — та же аудитория, 0.5 — тот же этаж, 0 — иначе
+    location_score: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    # владельцам отправлено match:new
+    notified_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("lost_item_id", "found_item_id", name="uq_item_match_pair"),
+    )
+
+
+# GET /items/{id}/matches с любой стороны пары: range scan по (item, score desc)
+Index("ix_item_matches_lost_score", ItemMatch.lost_item_id, ItemMatch.score.desc())
+Index("ix_item_matches_found_score", ItemMatch.found_item_id, ItemMatch.score.desc())
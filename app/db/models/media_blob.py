@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.types import JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class MediaBlob(Base):
+    """One stored file per distinct content (sha256), shared by all references."""
+
+    __tablename__ = "media_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # сколько items/загрузок ссылаются на blob; 0 -> blob можно удалять
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # варианты считаются один раз на содержимое и переиспользуются дубликатами
+    variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
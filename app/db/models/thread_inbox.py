@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class ThreadInbox(Base):
+    """Denormalized per-participant thread list (one row per user per thread).
+
+    Поддерживается при создании чата, новом сообщении и смене полей item,
+    поэтому list_threads — это range scan по (user_id, is_closed, sort_ts desc)
+    без JOIN и сортировки в памяти.
+    """
+
+    __tablename__ = "thread_inbox"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    # без FK: строка инбокса переживает перенос треда в архив
+    thread_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    peer_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    is_closed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # COALESCE(last_message_at, created_at)
+    sort_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    item_title: Mapped[str | None] = mapped_column(String, nullable=True)
+    item_status: Mapped[str | None] = mapped_column(String, nullable=True)
+    item_image_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    item_thumb_url: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    last_message_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_message_text: Mapped[str | None] = mapped_column(String, nullable=True)
+
+
+Index(
+    "ix_thread_inbox_user_sort",
+    ThreadInbox.user_id,
+    ThreadInbox.is_closed,
+    ThreadInbox.sort_ts.desc(),
+    ThreadInbox.thread_id.desc(),
+)
@@ -0,0 +1,224 @@
+# app/jobs/handlers.py
+
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.ai import vector_store
+from app.ai.embeddings import embed_image_file, model_version
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.media_blob import MediaBlob
+from app.jobs import queue
+from app.media.storage import get_storage
+from app.media.variants import apply_item_variants
+from app.services import chat_archive, item_changes, item_expiry, matching
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# kind -> coroutine(payload). Все обработчики идемпотентны: повтор после
+# падения воркера или ретрая не должен ломать данные.
+HANDLERS: Dict[str, Handler] = {}
+# kind -> coroutine(payload), вызывается когда попытки кончились
+ON_FAILURE: Dict[str, Handler] = {}
+# kind -> (interval в секундах, payload): воркер сам ставит такие job заново
+PERIODIC: Dict[str, Tuple[float, dict]] = {}
+
+EMBEDDING_PENDING = "PENDING"
+EMBEDDING_READY = "READY"
+EMBEDDING_FAILED = "FAILED"
+
+
+def handler(kind: str):
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def on_failure(kind: str):
+    def register(fn: Handler) -> Handler:
+        ON_FAILURE[kind] = fn
+        return fn
+    return register
+
+
+def periodic(kind: str, every: float, payload: dict | None = None):
+    """Register a handler the worker re-queues every `every` seconds (<= 0 — off)."""
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        if every > 0:
+            PERIODIC[kind] = (every, payload or {})
+        return fn
+    return register
+
+
+# --- Enqueue helpers -----------------------------------------------------------
+
+async def enqueue_embed_item(db: AsyncSession, item_id: int, sha256: str) -> None:
+    await queue.enqueue(
+        db, "embed_item", {"item_id": item_id, "sha256": sha256},
+        dedupe_key=f"embed_item:{item_id}:{sha256}",
+    )
+
+
+async def enqueue_build_variants(db: AsyncSession, item_id: int, sha256: str) -> None:
+    await queue.enqueue(
+        db, "build_variants", {"item_id": item_id, "sha256": sha256},
+        dedupe_key=f"build_variants:{item_id}:{sha256}",
+    )
+
+
+async def enqueue_match_item(db: AsyncSession, item_id: int) -> None:
+    if not settings.MATCH_ENABLED:
+        return
+    await queue.enqueue(db, "match_item", {"item_id": item_id}, dedupe_key=f"match_item:{item_id}")
+
+
+# --- Handlers -----------------------------------------------------------------
+
+@handler("embed_item")
+async def embed_item(payload: dict) -> None:
+    item_id, sha256 = payload["item_id"], payload["sha256"]
+
+    async with SessionLocal() as db:
+        item = await db.get(Item, item_id)
+        # item удалён или картинку уже заменили — job устарел
+        if item is None or item.image_sha256 != sha256:
+            return
+        version = model_version()
+        if item.embedding_status == EMBEDDING_READY and item.embedding_model == version:
+            return
+        owner_id = item.owner_id
+        closed = item.status == "CLOSED"
+
+        # тот же файл уже посчитан для другого item
+        embedding = await db.scalar(
+            select(Item.embedding)
+            .where(
+                Item.image_sha256 == sha256,
+                Item.embedding_status == EMBEDDING_READY,
+                Item.embedding_model == version,
+                Item.embedding.is_not(None),
+            )
+            .limit(1)
+        )
+        blob_key = await db.scalar(select(MediaBlob.key).where(MediaBlob.sha256 == sha256))
+
+    if embedding is None:
+        if blob_key is None:
+            return
+        async with get_storage().local_path(blob_key) as path:
+            embedding = await run_in_threadpool(embed_image_file, path)
+
+    async with SessionLocal() as db:
+        res = await db.execute(
+            update(Item)
+            .where(Item.id == item_id, Item.image_sha256 == sha256)
+            .values(embedding=embedding, embedding_status=EMBEDDING_READY, embedding_model=version)
+        )
+        if res.rowcount:
+            item_changes.record(db, item_id)
+            await enqueue_match_item(db, item_id)
+        await db.commit()
+    if res.rowcount:
+        if not closed:  # закрытые item в индекс не попадают (см. item_expiry)
+            await vector_store.index_items([(item_id, owner_id, embedding)], version)
+        queue.notify()
+        item_changes.notify()
+
+
+@on_failure("embed_item")
+async def embed_item_failed(payload: dict) -> None:
+    async with SessionLocal() as db:
+        res = await db.execute(
+            update(Item)
+            .where(Item.id == payload["item_id"], Item.image_sha256 == payload["sha256"])
+            .values(embedding_status=EMBEDDING_FAILED)
+        )
+        if res.rowcount:
+            item_changes.record(db, payload["item_id"])
+        await db.commit()
+    item_changes.notify()
+
+
+@handler("build_variants")
+async def build_variants(payload: dict) -> None:
+    await apply_item_variants(payload["item_id"], payload["sha256"])
+
+
+@handler("reindex")
+async def reindex(payload: dict) -> None:
+    """Re-queue embeddings: items without a READY embedding of the current
+    model, or all of them with `force`. Для большой базы быстрее
+    `python -m app.ai.reembed` (батчи вместо job на каждый item).
+    """
+    force = bool(payload.get("force"))
+
+    async with SessionLocal() as db:
+        q = select(Item.id, Item.image_sha256).where(Item.image_sha256.is_not(None))
+        if not force:
+            q = q.where(
+                or_(
+                    Item.embedding_status.is_(None),
+                    Item.embedding_status != EMBEDDING_READY,
+                    Item.embedding.is_(None),
+                    Item.embedding_model.is_(None),
+                    Item.embedding_model != model_version(),
+                )
+            )
+        rows = (await db.execute(q)).all()
+
+        for item_id, sha256 in rows:
+            await enqueue_embed_item(db, item_id, sha256)
+        if rows:
+            await db.execute(
+                update(Item)
+                .where(Item.id.in_([r[0] for r in rows]))
+                .values(embedding_status=EMBEDDING_PENDING)
+            )
+            item_changes.record_many(db, [r[0] for r in rows])
+        await db.commit()
+    queue.notify()
+    item_changes.notify()
+
+
+@handler("match_item")
+async def match_item(payload: dict) -> None:
+    async with SessionLocal() as db:
+        created = await matching.match_item(db, payload["item_id"])
+        await db.commit()
+        await matching.notify(db, created)
+        await db.commit()
+
+
+@periodic("match_sweep", settings.MATCH_SWEEP_SECONDS if settings.MATCH_ENABLED else 0)
+async def match_sweep(payload: dict) -> None:
+    """Drop pairs of closed/deleted items and match items the triggers missed."""
+    async with SessionLocal() as db:
+        await matching.prune(db)
+        for item_id in await matching.unmatched_items(db, limit=int(payload.get("limit", 500))):
+            await enqueue_match_item(db, item_id)
+        await db.commit()
+    queue.notify()
+
+
+@periodic("item_changes_compact", settings.ITEM_CHANGES_COMPACT_SECONDS)
+async def item_changes_compact(payload: dict) -> None:
+    async with SessionLocal() as db:
+        await item_changes.compact(db, timedelta(days=settings.ITEM_CHANGES_RETENTION_DAYS))
+        await db.commit()
+
+
+@periodic("expire_items", settings.ITEM_EXPIRE_SWEEP_SECONDS if settings.ITEM_EXPIRE_DAYS > 0 else 0)
+async def expire_items(payload: dict) -> None:
+    await item_expiry.expire_items()
+
+
+@periodic("archive_threads", settings.CHAT_ARCHIVE_SWEEP_SECONDS if settings.CHAT_ARCHIVE_AFTER_DAYS > 0 else 0)
+async def archive_threads(payload: dict) -> None:
+    await chat_archive.archive_closed()
@@ -0,0 +1,225 @@
+# app/jobs/queue.py
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import gauge
+from app.db.models.job import Job
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+
+QUEUE_DEPTH = gauge("jobs_queue_depth", "Jobs waiting or running", ("kind", "status"))
+
+# будит воркер в этом же процессе сразу после enqueue (иначе — ждёт poll)
+_wakeup = asyncio.Event()
+
+
+def notify() -> None:
+    _wakeup.set()
+
+
+async def wait_for_work(timeout: float) -> None:
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: dict,
+    *,
+    dedupe_key: Optional[str] = None,
+    delay: float = 0.0,
+    max_attempts: Optional[int] = None,
+) -> Job:
+    """Add a job in the caller's transaction (commit делает вызывающий).
+
+    С `dedupe_key` повторная постановка, пока такой job ещё PENDING/RUNNING,
+    возвращает уже существующий.
+    """
+    if dedupe_key is not None:
+        existing = await db.scalar(
+            select(Job)
+            .where(Job.dedupe_key == dedupe_key, Job.status.in_((PENDING, RUNNING)))
+            .limit(1)
+        )
+        if existing is not None:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        status=PENDING,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=_now() + timedelta(seconds=delay),
+        created_at=_now(),
+    )
+    db.add(job)
+    await db.flush()
+    return job
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(Job.status == PENDING, Job.run_after <= now),
+        # воркер умер, не отпустив аренду (попытки ещё остались — иначе reap_expired)
+        and_(Job.status == RUNNING, Job.lease_until < now, Job.attempts < Job.max_attempts),
+    )
+
+
+def _exhausted(now: datetime):
+    return and_(Job.status == RUNNING, Job.lease_until < now, Job.attempts >= Job.max_attempts)
+
+
+async def reap_expired(db: AsyncSession) -> list[Job]:
+    """Fail jobs whose lease expired on their last attempt; returns them.
+
+    Такой job каждый раз убивал свой воркер (например OOM на битой картинке):
+    без этого он забирался бы снова и снова. Вызывающий запускает ON_FAILURE.
+    """
+    now = _now()
+    ids = list(await db.scalars(select(Job.id).where(_exhausted(now))))
+    if not ids:
+        return []
+    res = await db.execute(
+        update(Job)
+        .where(Job.id.in_(ids), _exhausted(now))
+        .values(
+            status=FAILED,
+            lease_until=None,
+            finished_at=now,
+            last_error="lease expired on the last attempt (worker died or hung)",
+        )
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    )
+    reaped = list(res.scalars())
+    await db.commit()
+    return reaped
+
+
+async def claim(
+    db: AsyncSession,
+    worker_id: str,
+    limit: int,
+    kinds: Optional[Iterable[str]] = None,
+) -> list[Job]:
+    """Lease up to `limit` due jobs for this worker.
+
+    Кандидаты выбираются обычным SELECT, а забираются условным UPDATE
+    (WHERE ... AND still claimable): если два воркера выбрали один и тот же
+    job, rowcount=1 получит только один из них. Работает и на SQLite,
+    где нет SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = _now()
+    q = select(Job.id).where(_claimable(now)).order_by(Job.run_after, Job.id).limit(limit * 4)
+    if kinds:
+        q = q.where(Job.kind.in_(list(kinds)))
+    candidates = list((await db.execute(q)).scalars())
+
+    claimed: list[int] = []
+    lease_until = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    for job_id in candidates:
+        res = await db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status=RUNNING,
+                attempts=Job.attempts + 1,
+                lease_until=lease_until,
+                worker_id=worker_id,
+                started_at=now,
+            )
+        )
+        if res.rowcount:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    await db.commit()
+
+    if not claimed:
+        return []
+    res = await db.execute(select(Job).where(Job.id.in_(claimed)).order_by(Job.id))
+    return list(res.scalars())
+
+
+async def extend_lease(db: AsyncSession, job: Job, worker_id: str) -> bool:
+    """Push `lease_until` forward while the handler runs. False — job уже не наш
+    (аренду забрал другой воркер после истечения или job завершён).
+    """
+    res = await db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.worker_id == worker_id, Job.status == RUNNING)
+        .values(lease_until=_now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS))
+    )
+    await db.commit()
+    return bool(res.rowcount)
+
+
+def retry_delay(attempts: int) -> float:
+    base = settings.JOBS_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+    delay = min(base, settings.JOBS_RETRY_MAX_SECONDS)
+    # jitter, чтобы пачка упавших job не просыпалась одновременно
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def complete(db: AsyncSession, job: Job, worker_id: str) -> None:
+    await db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.worker_id == worker_id)
+        .values(status=DONE, lease_until=None, finished_at=_now(), last_error=None)
+    )
+    await db.commit()
+
+
+async def fail(db: AsyncSession, job: Job, worker_id: str, error: str) -> bool:
+    """Record a failed attempt. Returns True if the job will be retried."""
+    retry = job.attempts < job.max_attempts
+    values = {"lease_until": None, "last_error": error[-2000:]}
+    if retry:
+        values.update(status=PENDING, run_after=_now() + timedelta(seconds=retry_delay(job.attempts)))
+    else:
+        values.update(status=FAILED, finished_at=_now())
+
+    await db.execute(
+        update(Job).where(Job.id == job.id, Job.worker_id == worker_id).values(**values)
+    )
+    await db.commit()
+    return retry
+
+
+async def refresh_depth(db: AsyncSession) -> dict:
+    """Update the queue depth gauge; returns {(kind, status): count}."""
+    res = await db.execute(
+        select(Job.kind, Job.status, func.count())
+        .where(Job.status.in_((PENDING, RUNNING)))
+        .group_by(Job.kind, Job.status)
+    )
+    depth = {(kind, st): n for kind, st, n in res.all()}
+
+    # обнуляем ушедшие в ноль пары, иначе gauge застрянет на старом значении
+    for _name, labels, _value in list(QUEUE_DEPTH.samples()):
+        key = (labels["kind"], labels["status"])
+        if key not in depth:
+            QUEUE_DEPTH.set(0, **labels)
+    for (kind, st), n in depth.items():
+        QUEUE_DEPTH.set(n, kind=kind, status=st)
+    return depth
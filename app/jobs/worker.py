@@ -0,0 +1,206 @@
+# app/jobs/worker.py
+"""Background job runner.
+
+Either started inside the API process (JOBS_RUN_IN_APP, see app/main.py) or
+as a separate process:
+
+    python -m app.jobs.worker
+    python -m app.jobs.worker --reindex [--force]   # queue re-embedding and exit
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import traceback
+from typing import Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import counter, histogram
+from app.db.database import SessionLocal
+from app.db.models.job import Job
+from app.jobs import queue
+from app.jobs.handlers import HANDLERS, ON_FAILURE, PERIODIC
+
+logger = logging.getLogger(__name__)
+
+JOBS_FINISHED = counter("jobs_finished_total", "Job attempts by result", ("kind", "result"))
+JOB_WAIT = histogram("job_wait_seconds", "Time from enqueue to first start", ("kind",))
+JOB_RUN = histogram("job_run_seconds", "Handler run time per attempt", ("kind",))
+
+
+class Worker:
+    """Polls the jobs table and runs up to `concurrency` handlers at once."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        self.concurrency = concurrency or settings.JOBS_CONCURRENCY
+        self.poll_interval = poll_interval or settings.JOBS_POLL_SECONDS
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop_task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        queue.notify()
+        if self._loop_task is not None:
+            await self._loop_task
+        if self._running:
+            # недоделанные job вернутся в очередь по истечении аренды
+            await asyncio.wait(self._running, timeout=timeout)
+
+    async def run(self) -> None:
+        logger.info("job worker %s started (concurrency=%s)", self.worker_id, self.concurrency)
+        for kind in PERIODIC:
+            try:
+                await self._schedule(kind)
+            except Exception:
+                logger.exception("scheduling periodic job %s failed", kind)
+        while not self._stopping.is_set():
+            try:
+                free = self.concurrency - len(self._running)
+                jobs = []
+                async with SessionLocal() as db:
+                    reaped = await queue.reap_expired(db)
+                    if free > 0:
+                        jobs = await queue.claim(db, self.worker_id, free, kinds=HANDLERS.keys())
+                    await queue.refresh_depth(db)
+                for job in reaped:
+                    JOBS_FINISHED.inc(kind=job.kind, result="failed")
+                    logger.warning("job %s (%s) failed: lease expired on attempt %s", job.id, job.kind, job.attempts)
+                    await self._on_failure(job)
+                    if job.kind in PERIODIC:
+                        await self._schedule(job.kind)
+                for job in jobs:
+                    task = asyncio.get_running_loop().create_task(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+            except Exception:
+                logger.exception("job worker poll failed")
+                jobs = []
+
+            # все слоты заняты или очередь пуста — ждём enqueue/таймаут
+            if not jobs or len(self._running) >= self.concurrency:
+                await queue.wait_for_work(self.poll_interval)
+
+    async def _schedule(self, kind: str) -> None:
+        # dedupe_key: несколько воркеров/рестарт не плодят копии одного расписания
+        every, payload = PERIODIC[kind]
+        async with SessionLocal() as db:
+            await queue.enqueue(db, kind, payload, dedupe_key=f"periodic:{kind}", delay=every)
+            await db.commit()
+
+    async def _on_failure(self, job: Job) -> None:
+        if job.kind not in ON_FAILURE:
+            return
+        try:
+            await ON_FAILURE[job.kind](job.payload or {})
+        except Exception:
+            logger.exception("on_failure hook for job %s failed", job.id)
+
+    async def _keep_lease(self, job: Job, handler: asyncio.Future) -> None:
+        """Heartbeat: продлевает аренду каждые lease/3, пока работает handler.
+
+        Аренду не продлили (job забрал другой воркер) или БД недоступна дольше,
+        чем осталось аренды, — отменяем handler: иначе job выполнялся бы дважды.
+        """
+        lease = settings.JOBS_LEASE_SECONDS
+        deadline = time.monotonic() + lease
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                async with SessionLocal() as db:
+                    extended = await queue.extend_lease(db, job, self.worker_id)
+            except Exception:
+                logger.exception("extending lease of job %s failed", job.id)
+                if time.monotonic() + lease / 3 < deadline:
+                    continue  # успеем попробовать ещё раз до истечения
+                extended = False
+            if not extended:
+                logger.warning("job %s (%s) lost its lease, cancelling", job.id, job.kind)
+                handler.cancel()
+                return
+            deadline = time.monotonic() + lease
+
+    async def _execute(self, job: Job) -> None:
+        if job.attempts == 1 and job.created_at is not None and job.started_at is not None:
+            JOB_WAIT.observe((job.started_at - job.created_at).total_seconds(), kind=job.kind)
+
+        started = time.perf_counter()
+        handler = asyncio.ensure_future(HANDLERS[job.kind](job.payload or {}))
+        keeper = asyncio.get_running_loop().create_task(self._keep_lease(job, handler))
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not keeper.done() or keeper.cancelled():
+                raise  # отменили сам воркер (shutdown)
+            # job уже не наш: fail/complete не пишем, им займётся новый владелец
+            JOB_RUN.observe(time.perf_counter() - started, kind=job.kind)
+            JOBS_FINISHED.inc(kind=job.kind, result="lease_lost")
+        except Exception:
+            JOB_RUN.observe(time.perf_counter() - started, kind=job.kind)
+            error = traceback.format_exc()
+            async with SessionLocal() as db:
+                retry = await queue.fail(db, job, self.worker_id, error)
+            JOBS_FINISHED.inc(kind=job.kind, result="retry" if retry else "failed")
+            logger.warning("job %s (%s) attempt %s failed", job.id, job.kind, job.attempts)
+
+            if not retry:
+                await self._on_failure(job)
+        else:
+            JOB_RUN.observe(time.perf_counter() - started, kind=job.kind)
+            async with SessionLocal() as db:
+                await queue.complete(db, job, self.worker_id)
+            JOBS_FINISHED.inc(kind=job.kind, result="done")
+        finally:
+            keeper.cancel()
+            # при ретрае job остался PENDING — dedupe_key вернёт его же
+            if job.kind in PERIODIC:
+                try:
+                    await self._schedule(job.kind)
+                except Exception:
+                    logger.exception("re-scheduling periodic job %s failed", job.kind)
+            # освободился слот — пусть цикл сразу заберёт следующий job
+            queue.notify()
+
+
+async def main(argv=None) -> None:
+    from app.db.init_db import init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.jobs.worker")
+    parser.add_argument("--reindex", action="store_true", help="enqueue a reindex job and exit")
+    parser.add_argument("--force", action="store_true", help="with --reindex: re-embed every item")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    await init_db()
+
+    if args.reindex:
+        async with SessionLocal() as db:
+            job = await queue.enqueue(db, "reindex", {"force": args.force}, dedupe_key="reindex")
+            await db.commit()
+        print(f"queued reindex job #{job.id}")
+        return
+
+    worker = Worker()
+    try:
+        await worker.run()
+    finally:
+        await worker.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
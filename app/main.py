@@ -1,21 +1,51 @@
+import asyncio
+import logging
 from pathlib import Path
 
 import socketio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
+from app.ai import vector_store
+from app.ai.embeddings import warmup as warmup_model
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core import metrics
+from app.core.observability import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
 from app.api.v1.routers import items, auth, chat, media, search, status, health
+from app.db.database import SessionLocal
 from app.db.init_db import init_db
-from app.realtime.socketio_server import sio  # <-- добавили
+from app.jobs.worker import Worker
+from app.media.phash import phash_index
+from app.media.serving import MediaFiles
+from app.media.uploads import UploadLimitMiddleware
+from app.realtime.socketio_server import run_items_feed, sio  # <-- добавили
 
 
 # 1) Обычный FastAPI как "внутреннее" приложение
-fastapi_app = FastAPI(title="Campus Lost&Found API", version="0.1.0")
+# orjson для всех ответов-dict'ов; большие списки отдаются готовыми байтами
+# через app/api/responses.py
+fastapi_app = FastAPI(
+    title="Campus Lost&Found API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+)
 
-# Serve uploaded images in dev. In production you likely want MinIO/S3 + CDN.
-fastapi_app.mount("/media", StaticFiles(directory=settings.MEDIA_DIR), name="media")
+# Serve uploaded images. Content-addressed files get immutable caching; in
+# production set MEDIA_SERVE_MODE=x-accel to let nginx send the bytes.
+fastapi_app.mount(
+    "/media",
+    MediaFiles(
+        directory=settings.MEDIA_DIR,
+        mode=settings.MEDIA_SERVE_MODE,
+        accel_prefix=settings.MEDIA_ACCEL_PREFIX,
+        legacy_max_age=settings.MEDIA_LEGACY_MAX_AGE,
+    ),
+    name="media",
+)
 
 default_origins = [
     "http://localhost:5173",
@@ -26,15 +56,42 @@ default_origins = [
 
 origins = settings.CORS_ORIGINS or default_origins
 
+# самый внутренний: 413 на слишком большой multipart до того, как его разберут,
+# ответ проходит через CORS
+fastapi_app.add_middleware(UploadLimitMiddleware)
+
+if settings.COMPRESSION_ENABLED:
+    # картинки из /media и прочие сжатые типы пропускаются по content-type
+    fastapi_app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["set-cookie"],
+    expose_headers=["set-cookie", "X-Next-Cursor", "X-Near-Duplicates", "X-Changes-Seq"],
 )
 
+if settings.PROFILE_SAMPLE_RATE > 0 or settings.PROFILE_TOKEN:
+    fastapi_app.add_middleware(
+        ProfilingMiddleware,
+        out_dir=settings.PROFILE_DIR,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        header_token=settings.PROFILE_TOKEN,
+        interval_ms=settings.PROFILE_INTERVAL_MS,
+    )
+
+if settings.METRICS_ENABLED or settings.SLOW_REQUEST_MS > 0:
+    # последним => самый внешний: в латентность входит и сжатие, и CORS;
+    # он же держит per-request stats для slow-request лога
+    fastapi_app.add_middleware(MetricsMiddleware, slow_request_ms=settings.SLOW_REQUEST_MS)
+
 # Routers
 fastapi_app.include_router(health.router, prefix=settings.API_V1_STR)
 fastapi_app.include_router(auth.router, prefix=settings.API_V1_STR)
@@ -50,9 +107,75 @@ def root():
     return {"message": "Campus Lost&Found API is up", "api": settings.API_V1_STR}
 
 
+job_worker = Worker()
+_background: set = set()
+
+
+async def _warmup_model() -> None:
+    try:
+        await run_in_threadpool(warmup_model)
+    except Exception:
+        logging.getLogger(__name__).exception("model warmup failed")
+        health.set_ready("model", False)
+    else:
+        health.set_ready("model", True)
+
+
+async def _build_vector_store() -> None:
+    # первый старт / новая модель: до окончания поиск сканирует Item.embedding
+    try:
+        count = await vector_store.rebuild_from_db(only_if_missing=True)
+    except Exception:
+        logging.getLogger(__name__).exception("vector store build failed")
+    else:
+        if count:
+            logging.getLogger(__name__).info("vector store built: %d vectors", count)
+
+
+async def _load_phash_index() -> None:
+    # до окончания первый поиск дубликатов подождёт эту же загрузку (общий lock)
+    try:
+        async with SessionLocal() as db:
+            await phash_index.load(db)
+    except Exception:
+        logging.getLogger(__name__).exception("phash index load failed")
+
+
+def _background_task(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+if settings.METRICS_ENABLED:
+    @fastapi_app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @fastapi_app.on_event("startup")
 async def startup():
+    health.set_ready("startup", False)
     await init_db()
+    if settings.JOBS_RUN_IN_APP:
+        job_worker.start()
+    if settings.EMBED_WARMUP:
+        # не блокируем старт: liveness уже отвечает, readiness ждёт модель
+        health.set_ready("model", False)
+        _background_task(_warmup_model())
+    if settings.VECTOR_STORE_ENABLED:
+        _background_task(_build_vector_store())
+    _background_task(_load_phash_index())
+    _background_task(run_items_feed())
+    health.set_ready("startup", True)
+
+
+@fastapi_app.on_event("shutdown")
+async def shutdown():
+    if settings.JOBS_RUN_IN_APP:
+        await job_worker.stop()
+    for task in list(_background):
+        task.cancel()
 
 
 # 2) Оборачиваем FastAPI в Socket.IO ASGI app
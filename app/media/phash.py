@@ -0,0 +1,245 @@
+# app/media/phash.py
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import cache_result
+from app.db.models.item import Item
+from app.db.models.item_change import ItemChange
+from app.services import item_changes
+
+HASH_BITS = 64
+
+
+# --- Hashes -------------------------------------------------------------------
+
+def _gray(img: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    img = ImageOps.exif_transpose(img).convert("L")
+    return np.asarray(img.resize(size, Image.Resampling.LANCZOS), dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in bits.ravel()), 2)
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash (dHash): sign of horizontal gradients on a 9x8 thumbnail.
+
+    Устойчив к пережатию JPEG и ресайзу — ровно тот случай, когда одну и ту же
+    фотографию загружают повторно.
+    """
+    pixels = _gray(img, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def to_hex(h: int) -> str:
+    return f"{h:016x}"
+
+
+def image_phash(path: Union[str, Path]) -> str:
+    """Perceptual hash (dHash) of an image file as 16 hex chars (Item.phash)."""
+    with Image.open(path) as img:
+        img.draft("L", (64, 64))  # JPEG: декодируем сразу в уменьшенном виде
+        return to_hex(dhash(img))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# --- BK-tree ------------------------------------------------------------------
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Поиск в радиусе r обходит только ветки с |d - d(node)| <= r, поэтому при
+    малом радиусе просматривается лишь небольшая часть дерева.
+    """
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self) -> None:
+        # node = [hash, ids(set), children(dict distance -> node)]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, h: int, item_id: int) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = [h, {item_id}, {}]
+            return
+
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].add(item_id)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, {item_id}, {}]
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> List[Tuple[int, int]]:
+        """[(distance, item_id)] within `radius`, closest first."""
+        if self._root is None:
+            return []
+
+        out: List[Tuple[int, int]] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, item_id) for item_id in node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        out.sort()
+        return out
+
+
+def _build(rows: Iterable[Tuple[int, str]]) -> Tuple[BKTree, Dict[int, int]]:
+    tree = BKTree()
+    hashes: Dict[int, int] = {}
+    for item_id, hex_hash in rows:
+        h = int(hex_hash, 16)
+        tree.add(h, item_id)
+        hashes[item_id] = h
+    return tree, hashes
+
+
+class PhashIndex:
+    """Process-local BK-tree of Item.phash, kept current from item_changes.
+
+    Полная загрузка — один раз (в фоне при старте или на первом поиске):
+    дерево строится в threadpool под asyncio.Lock, параллельные промахи ждут
+    одну загрузку. Дальше раз в TTL — дельта: item'ы из item_changes с seq
+    больше последнего увиденного перечитываются по id (удалённые выпадают),
+    так индекс сходится между воркерами без полной перезагрузки. Пока дельта
+    идёт, остальные запросы ищут по текущему дереву.
+
+    BK-tree не умеет дёшево удалять узлы, поэтому источник правды —
+    `_hash_by_id`: узлы удалённых/перезаписанных items остаются в дереве
+    мёртвыми и отфильтровываются при поиске. Когда мёртвых больше живых
+    (или история item_changes сжата дальше нашего seq) — полная перестройка.
+    """
+
+    # дельта больше этого — дешевле перечитать всё
+    MAX_DELTA = 5000
+
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._tree: Optional[BKTree] = None
+        self._hash_by_id: Dict[int, int] = {}
+        self._dead = 0
+        self._seq = 0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self, db: AsyncSession) -> None:
+        """Full (re)load; called at startup so the first upload does not pay for it."""
+        async with self._lock:
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession) -> None:
+        # seq до чтения строк: изменения, попавшие между ними, дельта применит ещё раз
+        seq = await item_changes.latest_seq(db)
+        rows = (await db.execute(
+            select(Item.id, Item.phash).where(Item.phash.is_not(None))
+        )).all()
+        tree, hashes = await run_in_threadpool(_build, rows)
+        self._tree, self._hash_by_id, self._dead, self._seq = tree, hashes, 0, seq
+        self._checked_at = time.monotonic()
+
+    async def _refresh(self, db: AsyncSession) -> None:
+        if self._seq < await item_changes.horizon(db) or self._dead > max(1024, len(self._hash_by_id)):
+            await self._load(db)
+            return
+
+        changes = (await db.execute(
+            select(ItemChange.seq, ItemChange.item_id)
+            .where(ItemChange.seq > self._seq, ItemChange.op != item_changes.HORIZON)
+        )).all()
+        ids = {item_id for _, item_id in changes}
+        if len(ids) > self.MAX_DELTA:
+            await self._load(db)
+            return
+        if ids:
+            current = dict((await db.execute(
+                select(Item.id, Item.phash).where(Item.id.in_(ids))
+            )).all())
+            for item_id in ids:
+                hex_hash = current.get(item_id)
+                if hex_hash is None:
+                    self.discard(item_id)
+                else:
+                    self.add(item_id, hex_hash)
+            self._seq = max(seq for seq, _ in changes)
+        self._checked_at = time.monotonic()
+
+    async def _ensure(self, db: AsyncSession) -> BKTree:
+        stale = time.monotonic() - self._checked_at >= self._ttl
+        if self._tree is not None and (not stale or self._lock.locked()):
+            cache_result("phash_index", True)
+            return self._tree
+        cache_result("phash_index", False)
+
+        async with self._lock:
+            if self._tree is None:
+                await self._load(db)
+            elif time.monotonic() - self._checked_at >= self._ttl:
+                await self._refresh(db)
+        return self._tree
+
+    def add(self, item_id: int, hex_hash: str) -> None:
+        if self._tree is None:
+            return  # загрузится целиком при первом поиске
+        h = int(hex_hash, 16)
+        old = self._hash_by_id.get(item_id)
+        if old != h:
+            self._tree.add(h, item_id)
+            self._hash_by_id[item_id] = h
+            if old is not None:
+                self._dead += 1
+
+    def discard(self, item_id: int) -> None:
+        if self._hash_by_id.pop(item_id, None) is not None:
+            self._dead += 1
+    async def search(
+        self,
+        db: AsyncSession,
+        hex_hash: str,
+        radius: Optional[int] = None,
+        exclude: Iterable[int] = (),
+    ) -> List[Tuple[int, int]]:
+        """[(hamming distance, item_id)] of near-duplicates, closest first."""
+        tree = await self._ensure(db)
+        h = int(hex_hash, 16)
+        skip = set(exclude)
+        radius = settings.PHASH_MAX_DISTANCE if radius is None else radius
+
+        hits = []
+        for d, item_id in tree.search(h, radius):
+            current = self._hash_by_id.get(item_id)
+            # пропускаем исключённые и мёртвые узлы (item удалён или хэш сменился)
+            if item_id in skip or current is None or hamming(current, h) != d:
+                continue
+            hits.append((d, item_id))
+        return hits
+
+
+phash_index = PhashIndex(ttl=settings.PHASH_INDEX_TTL_SECONDS)
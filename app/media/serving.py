@@ -0,0 +1,83 @@
+# app/media/serving.py
+
+import hashlib
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# путь содержит sha256 содержимого (blobs/..., variants/...) -> файл никогда не меняется
+_HASHED_PATH = re.compile(r"(?:^|/)[0-9a-f]{64}(?:[./]|$)")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles with cache headers for content-addressed media.
+
+    mode:
+      - "static"     — отдаём сами (FileResponse: Range, If-None-Match/If-Modified-Since)
+      - "x-accel"    — пустой ответ с X-Accel-Redirect, файл отдаёт nginx (internal location)
+      - "x-sendfile" — то же для Apache/lighttpd через X-Sendfile
+    Условные запросы (304) в любом режиме решаются здесь, без похода к прокси.
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        mode: str = "static",
+        accel_prefix: str = "/_media",
+        legacy_max_age: int = 3600,
+    ) -> None:
+        super().__init__(directory=directory)
+        self.mode = mode
+        self.accel_prefix = accel_prefix.rstrip("/")
+        self.legacy_max_age = legacy_max_age
+
+    def _cache_headers(self, rel_path: str) -> dict:
+        if _HASHED_PATH.search(rel_path):
+            etag = hashlib.md5(rel_path.encode(), usedforsecurity=False).hexdigest()
+            return {"cache-control": IMMUTABLE, "etag": f'"{etag}"'}
+        # старые uuid-файлы (items/<id>/..., misc/...) могут быть перезаписаны
+        return {"cache-control": f"public, max-age={self.legacy_max_age}"}
+
+    def _offload(self, rel_path: str, full_path, stat_result: os.stat_result, headers: dict) -> Response:
+        # ETag/Last-Modified считаем как FileResponse, чтобы 304 работал одинаково
+        probe = FileResponse(full_path, stat_result=stat_result, headers=headers)
+        out = {
+            k: probe.headers[k]
+            for k in ("etag", "last-modified", "cache-control")
+            if k in probe.headers
+        }
+        out["content-type"] = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        if self.mode == "x-accel":
+            out["x-accel-redirect"] = f"{self.accel_prefix}/{rel_path}"
+        else:
+            out["x-sendfile"] = os.fspath(full_path)
+        return Response(status_code=200, headers=out)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        rel_path = self.get_path(scope).replace(os.sep, "/")
+        headers = self._cache_headers(rel_path)
+
+        if self.mode == "static":
+            response = FileResponse(
+                full_path, status_code=status_code, stat_result=stat_result, headers=headers
+            )
+        else:
+            response = self._offload(rel_path, full_path, stat_result, headers)
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
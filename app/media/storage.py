@@ -0,0 +1,153 @@
+# app/media/storage.py
+
+import mimetypes
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+def blob_key(sha256: str, ext: str) -> str:
+    """Content-addressed key: blobs/ab/cd/abcd...<ext>"""
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def variant_key(sha256: str, width: int, ext: str) -> str:
+    return f"variants/{sha256[:2]}/{sha256}/{width}{ext}"
+
+
+class MediaStorage(ABC):
+    """Where media bytes live. Keys are '/'-separated relative paths."""
+
+    @abstractmethod
+    async def put_file(self, key: str, src: Path, move: bool = False) -> None:
+        """Store `src` under `key`; with `move=True` the source may be consumed."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def local_path(self, key: str) -> "AsyncIterator[Path]":
+        """Async context manager yielding a readable local file for `key`."""
+
+
+class LocalStorage(MediaStorage):
+    """Files under MEDIA_DIR, served by the /media mount."""
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    async def put_file(self, key: str, src: Path, move: bool = False) -> None:
+        dest = self._path(key)
+
+        def _put() -> None:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            if move:
+                os.replace(src, dest)
+                return
+            # копия через temp + rename, чтобы читатели не увидели полуфайл
+            fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".part")
+            with os.fdopen(fd, "wb") as out, open(src, "rb") as inp:
+                while chunk := inp.read(1024 * 1024):
+                    out.write(chunk)
+            os.replace(tmp, dest)
+
+        await run_in_threadpool(_put)
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(lambda: self._path(key).unlink(missing_ok=True))
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self._path(key).exists)
+
+    def url(self, key: str) -> str:
+        return f"/media/{key}"
+
+    @asynccontextmanager
+    async def local_path(self, key: str) -> AsyncIterator[Path]:
+        yield self._path(key)
+
+
+class S3Storage(MediaStorage):
+    """S3-compatible object storage (AWS S3, MinIO, ...). Requires `boto3`."""
+
+    def __init__(self) -> None:
+        try:
+            import boto3
+        except ImportError as e:  # optional dependency
+            raise RuntimeError("MEDIA_BACKEND=s3 requires `pip install boto3`") from e
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY or None,
+            aws_secret_access_key=settings.S3_SECRET_KEY or None,
+        )
+        base = settings.S3_PUBLIC_BASE_URL or f"{settings.S3_ENDPOINT_URL}/{self.bucket}"
+        self.public_base = base.rstrip("/")
+
+    async def put_file(self, key: str, src: Path, move: bool = False) -> None:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        await run_in_threadpool(
+            self.client.upload_file, str(src), self.bucket, key,
+            ExtraArgs={
+                "ContentType": content_type,
+                # ключи содержат sha256 — содержимое под ключом никогда не меняется
+                "CacheControl": "public, max-age=31536000, immutable",
+            },
+        )
+        if move:
+            await run_in_threadpool(lambda: Path(src).unlink(missing_ok=True))
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def url(self, key: str) -> str:
+        return f"{self.public_base}/{key}"
+
+    @asynccontextmanager
+    async def local_path(self, key: str) -> AsyncIterator[Path]:
+        fd, tmp = tempfile.mkstemp(suffix=Path(key).suffix)
+        os.close(fd)
+        try:
+            await run_in_threadpool(self.client.download_file, self.bucket, key, tmp)
+            yield Path(tmp)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> MediaStorage:
+    if settings.MEDIA_BACKEND == "s3":
+        return S3Storage()
+    return LocalStorage(settings.MEDIA_DIR)
@@ -0,0 +1,254 @@
+# app/media/uploads.py
+
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:  # python-multipart >= 0.0.13 переименовал модуль
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# multipart-обёртка поверх самого файла (boundary, заголовки части)
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _tmp_dir() -> Path:
+    # temp лежит внутри MEDIA_DIR, чтобы os.replace был атомарным (та же ФС)
+    path = Path(settings.MEDIA_DIR) / ".tmp"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large (max {settings.MAX_UPLOAD_BYTES} bytes)",
+    )
+
+
+def _max_body() -> int:
+    return settings.MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware: cap multipart request bodies before anything parses them.
+
+    FastAPI разбирает form (`await request.form()`, Starlette спулит файл в свой
+    temp) ещё до зависимостей эндпоинта, поэтому лимит ставим на уровне ASGI:
+    Content-Length больше лимита -> 413 сразу, без чтения тела; без него
+    (chunked) или при вранье — считаем байты в `receive` и обрываем на
+    первом чанке сверх лимита. Дальше receive_upload проверяет сам файл.
+    В приложении тело multipart читает только receive_upload (request.stream()).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = _max_body()
+        length = headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit:
+            exc = _too_large()
+            response = ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # HTTPException из request.form() FastAPI пробрасывает как есть -> 413
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+@dataclass
+class TempUpload:
+    """Upload streamed to a temp file under MEDIA_DIR/.tmp."""
+
+    path: Path
+    size: int = 0
+    sha256: str = ""
+    filename: str = ""
+    _moved: bool = field(default=False, repr=False)
+
+    async def store(self, storage, key: str) -> None:
+        """Hand the temp file over to a MediaStorage backend under `key`."""
+        await storage.put_file(key, self.path, move=True)
+        self._moved = True
+
+
+# OpenAPI для эндпоинтов с receive_upload: тело читается мимо FastAPI form,
+# поэтому File(...) в сигнатуре нет и схему описываем сами
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                },
+            },
+        },
+    },
+}
+
+
+class _FilePart:
+    """python-multipart callbacks: the first part named `field` goes into `fh`.
+
+    Байты части копятся в буфере и пишутся в файл пачками не меньше
+    UPLOAD_CHUNK_BYTES (один поход в threadpool на пачку); sha256 и размер
+    считаются по ходу. Остальные части (другие поля формы) пропускаются.
+    """
+
+    def __init__(self, field: str, max_bytes: int) -> None:
+        self.field = field.encode()
+        self.max_bytes = max_bytes
+        self.found = False
+        self.filename = ""
+        self.size = 0
+        self.buffer = bytearray()
+        self._digest = hashlib.sha256()
+        self._active = False
+        self._header = b""
+        self._value = b""
+        self._disposition = b""
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header.lower() == b"content-disposition":
+            self._disposition = self._value
+        self._header = self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._active = not self.found and options.get(b"name") == self.field and b"filename" in options
+        if self._active:
+            self.found = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._active:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise _too_large()
+        self._digest.update(chunk)
+        self.buffer += chunk
+
+    def on_part_end(self) -> None:
+        self._active = False
+
+
+def _write_out(fh, data: bytes, final: bool) -> None:
+    fh.write(data)
+    if final:
+        fh.flush()
+
+
+async def _spool(request: Request, fh, field: str, max_bytes: int) -> _FilePart:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data body")
+
+    part = _FilePart(field, max_bytes)
+    parser = multipart.MultipartParser(params[b"boundary"], part.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        if len(part.buffer) >= settings.UPLOAD_CHUNK_BYTES:
+            data, part.buffer = bytes(part.buffer), bytearray()
+            await run_in_threadpool(_write_out, fh, data, False)
+    parser.finalize()
+    await run_in_threadpool(_write_out, fh, bytes(part.buffer), True)
+    part.buffer = bytearray()
+
+    if not part.found:
+        raise HTTPException(status_code=422, detail=f"Missing file field '{field}'")
+    return part
+
+
+@asynccontextmanager
+async def receive_upload(
+    request: Request,
+    field: str = "file",
+    max_bytes: Optional[int] = None,
+) -> AsyncIterator[TempUpload]:
+    """Stream the multipart file `field` of the request body into a temp file.
+
+    Тело читается прямо из `request.stream()` (без FastAPI form и
+    SpooledTemporaryFile Starlette): байты файла ложатся на диск один раз,
+    пачками, с размером и sha256 по ходу. Эндпоинт не должен объявлять
+    File/Form-параметров, иначе FastAPI прочитает тело раньше.
+    Temp-файл удаляется на выходе, если его не передали в хранилище (`store`).
+    Пустой файл -> 400, больше лимита -> 413, нет поля -> 422.
+    """
+    fd, name = tempfile.mkstemp(dir=_tmp_dir(), suffix=".part")
+    upload = TempUpload(path=Path(name))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            part = await _spool(request, fh, field, max_bytes or settings.MAX_UPLOAD_BYTES)
+        upload.size, upload.sha256, upload.filename = part.size, part.sha256, part.filename
+
+        if not upload.size:
+            raise HTTPException(status_code=400, detail="Empty file")
+
+        yield upload
+    finally:
+        if not upload._moved:
+            await run_in_threadpool(lambda: Path(name).unlink(missing_ok=True))
@@ -0,0 +1,19 @@
+# app/media/variant_urls.py
+"""URL helpers over Item.image_variants / MediaBlob.variants.
+
+Без зависимостей (ни БД, ни Pillow): их импортируют схемы и inbox, а
+app/media/variants.py тянет движок БД и пул потоков рендера.
+"""
+
+from typing import Optional
+
+
+def thumb_url(variants: Optional[dict]) -> Optional[str]:
+    """Smallest WebP variant (used for avatars in thread lists)."""
+    entries = (variants or {}).get("webp") or []
+    return entries[0]["url"] if entries else None
+
+
+def srcset(variants: Optional[dict], fmt: str = "webp") -> Optional[str]:
+    entries = (variants or {}).get(fmt) or []
+    return ", ".join(f"{e['url']} {e['w']}w" for e in entries) or None
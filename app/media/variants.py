@@ -0,0 +1,137 @@
+# app/media/variants.py
+
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.metrics import cache_result
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.media_blob import MediaBlob
+from app.media.storage import get_storage, variant_key
+
+# format -> (PIL format, extension)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", ".webp"),
+    "jpeg": ("JPEG", ".jpg"),
+}
+
+# Pillow отпускает GIL на decode/resize/encode, поэтому потоков достаточно
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix="img-variants"
+)
+
+
+def _load_rgb(src: Path) -> Image.Image:
+    with Image.open(src) as im:
+        # поворот по EXIF Orientation, дальше EXIF не сохраняем вовсе
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ("RGBA", "LA", "P"):
+            im = im.convert("RGBA")
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            return bg
+        return im.convert("RGB")
+
+
+def render_variants(src: Path, out_dir: Path, widths=None) -> dict:
+    """Render resized WebP/JPEG copies of `src` into `out_dir` (CPU bound).
+
+    Returns {"webp": [{"w": 64, "h": ..., "path": Path}, ...], "jpeg": [...]}.
+    Widths above the original width are skipped (no upscaling), except the
+    smallest one.
+    """
+    widths = sorted(widths or settings.IMAGE_VARIANT_WIDTHS)
+    img = _load_rgb(src)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    result: dict = {fmt: [] for fmt in VARIANT_FORMATS}
+    for i, w in enumerate(widths):
+        if w >= img.width and i > 0:
+            break
+        w = min(w, img.width)
+        h = max(1, round(img.height * w / img.width))
+        resized = img.resize((w, h), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        for fmt, (pil_format, ext) in VARIANT_FORMATS.items():
+            dest = out_dir / f"{w}{ext}"
+            if fmt == "webp":
+                resized.save(dest, pil_format, quality=settings.IMAGE_WEBP_QUALITY, method=4)
+            else:
+                resized.save(
+                    dest, pil_format,
+                    quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True,
+                )
+            result[fmt].append({"w": w, "h": h, "path": dest})
+
+    return result
+
+
+async def build_blob_variants(sha256: str) -> Optional[dict]:
+    """Variants of a stored blob; rendered and uploaded once per content hash."""
+    storage = get_storage()
+
+    async with SessionLocal() as db:
+        blob = await db.get(MediaBlob, sha256)
+        if blob is None:
+            return None
+        cache_result("image_variants", bool(blob.variants))
+        if blob.variants:
+            return blob.variants
+        src_key = blob.key
+
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory() as tmp:
+        async with storage.local_path(src_key) as src:
+            rendered = await loop.run_in_executor(_executor, render_variants, src, Path(tmp))
+
+        variants: dict = {}
+        for fmt, entries in rendered.items():
+            variants[fmt] = []
+            for e in entries:
+                key = variant_key(sha256, e["w"], e["path"].suffix)
+                await storage.put_file(key, e["path"], move=True)
+                variants[fmt].append({"w": e["w"], "h": e["h"], "url": storage.url(key), "key": key})
+
+    async with SessionLocal() as db:
+        await db.execute(
+            update(MediaBlob).where(MediaBlob.sha256 == sha256).values(variants=variants)
+        )
+        await db.commit()
+    return variants
+
+
+async def apply_item_variants(item_id: int, sha256: str) -> bool:
+    """Render (or reuse) blob variants and attach them to the item.
+
+    Вызывается из job build_variants; исключения пробрасываются наружу, чтобы
+    воркер повторил попытку с backoff. Returns False if the result is stale.
+    """
+    from app.services import item_changes, thread_inbox
+
+    variants = await build_blob_variants(sha256)
+    if not variants:
+        return False
+
+    async with SessionLocal() as db:
+        # если за это время картинку заменили — результат уже не нужен
+        res = await db.execute(
+            update(Item)
+            .where(Item.id == item_id, Item.image_sha256 == sha256)
+            .values(image_variants=variants)
+            .returning(Item)
+        )
+        item = res.scalar_one_or_none()
+        if item is not None:
+            await thread_inbox.on_item_changed(db, item)
+            item_changes.record(db, item_id)
+        await db.commit()
+    if item is not None:
+        item_changes.notify()
+    return item is not None
@@ -0,0 +1,104 @@
+# app/realtime/limits.py
+
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/sec, up to `capacity` tokens."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def allow(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class RateLimiter:
+    """Keyed token buckets, e.g. one per sid or one per user.
+
+    Бакеты, простоявшие дольше `idle_ttl`, выкидываются ленивым sweep'ом
+    внутри allow(). По умолчанию idle_ttl = время полного восстановления
+    (burst / rate): такой бакет всё равно полон, и удаление ничего не меняет.
+    """
+
+    def __init__(self, rate: float, burst: float, idle_ttl: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl if idle_ttl is not None else burst / rate if rate > 0 else 3600.0
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._next_sweep = time.monotonic() + self.idle_ttl
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.evict_idle(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket.allow(cost, now)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        idle = [k for k, b in self._buckets.items() if now - b.updated >= self.idle_ttl]
+        for key in idle:
+            del self._buckets[key]
+        self._next_sweep = now + self.idle_ttl
+        return len(idle)
+
+    def forget(self, key: Hashable) -> None:
+        self._buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def _pair(rate: float, burst: float) -> Tuple[RateLimiter, RateLimiter]:
+    return RateLimiter(rate, burst), RateLimiter(rate * settings.SIO_USER_RATE_FACTOR,
+                                                 burst * settings.SIO_USER_RATE_FACTOR)
+
+
+# event -> (per-sid limiter, per-user limiter).
+# Лимит на пользователя = лимит на сокет * SIO_USER_RATE_FACTOR: несколько вкладок
+# получают чуть больше, но не N-кратно больше.
+EVENT_LIMITERS: Dict[str, Tuple[RateLimiter, RateLimiter]] = {
+    "chat:message": _pair(settings.SIO_MESSAGE_RATE, settings.SIO_MESSAGE_BURST),
+    "chat:join": _pair(settings.SIO_JOIN_RATE, settings.SIO_JOIN_BURST),
+    "chat:typing": _pair(settings.SIO_TYPING_RATE, settings.SIO_TYPING_BURST),
+}
+
+
+def check(event: str, sid: str, user_id: Optional[int]) -> Optional[str]:
+    """Returns None if allowed, otherwise the scope that throttled ("sid" / "user")."""
+    limiters = EVENT_LIMITERS.get(event)
+    if limiters is None:
+        return None
+
+    per_sid, per_user = limiters
+    if not per_sid.allow(sid):
+        return "sid"
+    if user_id is not None and not per_user.allow(user_id):
+        return "user"
+    return None
+
+
+# per-user бакеты при disconnect не удаляем (иначе переподключение = новый
+# полный burst), они уходят по idle TTL; у нового сокета всегда новый sid
+def forget_sid(sid: str) -> None:
+    for per_sid, _ in EVENT_LIMITERS.values():
+        per_sid.forget(sid)
+
@@ -0,0 +1,156 @@
+# app/realtime/presence.py
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set
+
+
+class PresenceTracker:
+    """In-process presence: user_id -> set of connected sids.
+
+    Пользователь онлайн, пока у него есть хотя бы одно соединение (вкладка).
+    Состояние живёт в памяти процесса, т.е. корректно для одного воркера uvicorn.
+    """
+
+    def __init__(self) -> None:
+        self._sids_by_user: Dict[int, Set[str]] = defaultdict(set)
+        self._user_by_sid: Dict[str, int] = {}
+
+    def connect(self, sid: str, user_id: int) -> bool:
+        """Register a socket. Returns True if the user just came online."""
+        sids = self._sids_by_user[user_id]
+        came_online = not sids
+        sids.add(sid)
+        self._user_by_sid[sid] = user_id
+        return came_online
+
+    def disconnect(self, sid: str) -> Optional[int]:
+        """Forget a socket. Returns user_id if the user just went offline."""
+        user_id = self._user_by_sid.pop(sid, None)
+        if user_id is None:
+            return None
+
+        sids = self._sids_by_user.get(user_id)
+        if sids is None:
+            return None
+        sids.discard(sid)
+        if sids:
+            return None
+
+        del self._sids_by_user[user_id]
+        return user_id
+
+    def user_for_sid(self, sid: str) -> Optional[int]:
+        return self._user_by_sid.get(sid)
+
+    def connection_count(self, user_id: int) -> int:
+        return len(self._sids_by_user.get(user_id, ()))
+
+    def is_online(self, user_id: int) -> bool:
+        return self.connection_count(user_id) > 0
+
+    def online_count(self) -> int:
+        return len(self._sids_by_user)
+
+    def online_many(self, user_ids: Iterable[int]) -> Dict[int, bool]:
+        """Batch lookup, used by list_threads to annotate peers."""
+        return {uid: uid in self._sids_by_user for uid in user_ids}
+
+
+class RoomCoalescer:
+    """Coalesces per-room updates into at most one flush per `interval`.
+
+    `push(room, key, value)` только кладёт значение в буфер комнаты (последнее
+    значение по ключу побеждает). Первая запись в пустой буфер планирует flush
+    через `interval`, все последующие до этого момента просто перезаписывают буфер.
+    Время последнего flush старше `interval` ни на что не влияет — такие записи
+    вычищаются на push не чаще раза в `interval`, комнаты не копятся.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[str, Dict[Hashable, object]], Awaitable[None]],
+        interval: float,
+    ) -> None:
+        self._flush = flush
+        self._interval = interval
+        self._pending: Dict[str, Dict[Hashable, object]] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._next_prune = 0.0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def push(self, room: str, key: Hashable, value: object) -> None:
+        buf = self._pending.get(room)
+        if buf is not None:
+            buf[key] = value
+            return
+
+        self._pending[room] = {key: value}
+
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._prune(now)
+        elapsed = now - self._last_flush.get(room, 0.0)
+        delay = max(0.0, self._interval - elapsed)
+        task = asyncio.get_running_loop().create_task(self._flush_later(room, delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self, room: str, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+
+        buf = self._pending.pop(room, None)
+        self._last_flush[room] = time.monotonic()
+        if buf:
+            await self._flush(room, buf)
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self._interval
+        for room in [r for r, t in self._last_flush.items() if t <= cutoff]:
+            del self._last_flush[room]
+        self._next_prune = now + self._interval
+
+    def forget(self, room: str) -> None:
+        self._last_flush.pop(room, None)
+
+
+class TypingState:
+    """Who is typing in which thread; entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._expires: Dict[int, Dict[int, float]] = defaultdict(dict)
+
+    def set(self, thread_id: int, user_id: int, is_typing: bool) -> None:
+        if is_typing:
+            self._expires[thread_id][user_id] = time.monotonic() + self._ttl
+        else:
+            self._expires.get(thread_id, {}).pop(user_id, None)
+
+    def typing_users(self, thread_id: int) -> list[int]:
+        now = time.monotonic()
+        users = self._expires.get(thread_id)
+        if not users:
+            return []
+
+        for uid in [u for u, exp in users.items() if exp <= now]:
+            del users[uid]
+        if not users:
+            self._expires.pop(thread_id, None)
+            return []
+        return sorted(users)
+
+    def clear_user(self, user_id: int) -> list[int]:
+        """Drop user from all threads. Returns affected thread ids."""
+        affected = []
+        for thread_id, users in list(self._expires.items()):
+            if users.pop(user_id, None) is not None:
+                affected.append(thread_id)
+            if not users:
+                self._expires.pop(thread_id, None)
+        return affected
+
+
+presence = PresenceTracker()
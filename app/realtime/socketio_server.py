@@ -1,7 +1,11 @@
+import asyncio
+import logging
 from datetime import datetime
+from typing import Dict, Hashable, Optional
+
 import socketio
 from jose import jwt, JWTError
-from sqlalchemy import select
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -9,21 +13,206 @@ from app.auth.security import ALGORITHM
 from app.db.database import SessionLocal
 from app.db.models.chat_thread import ChatThread
 from app.db.models.chat_message import ChatMessage
+from app.core import metrics
+from app.realtime import limits
+from app.realtime.presence import RoomCoalescer, TypingState, presence
+from app.api.responses import adapter
+from app.schemas.items import ItemChangesOut
+from app.services import chat_archive, item_changes, thread_inbox
+
+logger = logging.getLogger(__name__)
 
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins=settings.CORS_ORIGINS,
+    # chat:history на polling-транспорте — самый крупный ответ
+    http_compression=settings.SIO_HTTP_COMPRESSION,
+    compression_threshold=settings.SIO_COMPRESSION_THRESHOLD,
+    client_manager=(
+        socketio.AsyncRedisManager(settings.SIO_MESSAGE_QUEUE) if settings.SIO_MESSAGE_QUEUE else None
+    ),
 )
 
 def room_name(thread_id: int) -> str:
     return f"thread:{thread_id}"
 
+
+ITEMS_FEED_ROOM = "items:feed"
+
+
+def user_room(user_id: int) -> str:
+    """Every socket of a user joins it on connect: personal notifications."""
+    return f"user:{user_id}"
+
+
+def _thread_id_from_room(room: str) -> int:
+    return int(room.split(":", 1)[1])
+
+
+def _room_is_active(room: str) -> bool:
+    return bool(sio.manager.rooms.get("/", {}).get(room))
+
+
+# --- Flow control (rate limits / backpressure) -------------------------------
+
+throttled_total = metrics.counter(
+    "sio_events_throttled_total", "Incoming Socket.IO events rejected by rate limits",
+    ("event", "scope"),
+)
+dropped_total = metrics.counter(
+    "sio_events_dropped_total", "Outgoing Socket.IO events dropped for slow consumers",
+    ("event",),
+)
+slow_disconnects_total = metrics.counter(
+    "sio_slow_consumer_disconnects_total", "Connections closed because the outbound queue overflowed",
+)
+# events/sec = rate(sio_events_total[1m])
+events_total = metrics.counter("sio_events_total", "Incoming Socket.IO events", ("event",))
+emits_total = metrics.counter("sio_emits_total", "Outgoing Socket.IO emits (per room/sid)", ("event",))
+connections_gauge = metrics.gauge("sio_connections", "Open engine.io connections")
+rooms_gauge = metrics.gauge("sio_thread_rooms", "Thread rooms with at least one member")
+online_gauge = metrics.gauge("sio_online_users", "Users with at least one connection")
+
+
+@metrics.register_collector
+def _collect_sio() -> None:
+    connections_gauge.set(len(sio.eio.sockets))
+    rooms = sio.manager.rooms.get("/", {})
+    rooms_gauge.set(sum(1 for r, members in rooms.items() if isinstance(r, str) and r.startswith("thread:") and members))
+    online_gauge.set(presence.online_count())
+
+
+def _outbound_depth(eio_sid: Optional[str]) -> int:
+    """Packets waiting in the engine.io queue of this connection."""
+    sock = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    return sock.queue.qsize() if sock is not None else 0
+
+
+async def _congested(sids_eio: list[tuple[str, str]], event: str, droppable: bool) -> list[str]:
+    """Sids that must not receive `event`; overflowing ones are disconnected."""
+    skip = []
+    for sid, eio_sid in sids_eio:
+        depth = _outbound_depth(eio_sid)
+        if depth >= settings.SIO_OUTBOUND_DISCONNECT_AT:
+            skip.append(sid)
+            slow_disconnects_total.inc()
+            await sio.disconnect(sid)
+        elif droppable and depth >= settings.SIO_OUTBOUND_DROP_AT:
+            skip.append(sid)
+            dropped_total.inc(event=event)
+    return skip
+
+
+async def _send(event: str, data, sid: str, droppable: bool = False) -> None:
+    eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+    if await _congested([(sid, eio_sid)], event, droppable):
+        return
+    emits_total.inc(event=event)
+    await sio.emit(event, data, to=sid)
+
+
+async def _broadcast(event: str, data, room: str, droppable: bool = False, local: bool = False) -> None:
+    # пакет кодируется один раз, перегруженные соединения просто пропускаются;
+    # local — мимо SIO_MESSAGE_QUEUE: событие и так рассылает каждый процесс
+    participants = list(sio.manager.get_participants("/", room))
+    if not participants:
+        return
+    skip = await _congested(participants, event, droppable)
+    if len(skip) == len(participants):
+        return
+    emits_total.inc(event=event)
+    await sio.emit(event, data, to=room, skip_sid=skip or None, ignore_queue=local)
+
+
+async def notify_user(user_id: int, event: str, data) -> None:
+    """Push `event` to all sockets of a user, from the API or from a job."""
+    if settings.SIO_MESSAGE_QUEUE:
+        # через шину: получатели могут сидеть в другом процессе, локальных
+        # участников комнаты тут не видно
+        emits_total.inc(event=event)
+        await sio.emit(event, data, to=user_room(user_id))
+        return
+    await _broadcast(event, data, user_room(user_id))
+
+
+async def _throttled(sid: str, event: str) -> bool:
+    scope = limits.check(event, sid, presence.user_for_sid(sid))
+    if scope is None:
+        return False
+
+    throttled_total.inc(event=event, scope=scope)
+    await _send("chat:error", {"event": event, "code": "rate_limited"}, sid, droppable=True)
+    return True
+
+
+# --- Presence / typing (coalesced broadcasts) --------------------------------
+
+typing_state = TypingState(ttl=settings.TYPING_TTL_SECONDS)
+_last_typing: Dict[str, list[int]] = {}
+# один таймер перепроверки на комнату: новый flush переносит его, а не добавляет ещё один
+_typing_timers: Dict[str, asyncio.TimerHandle] = {}
+
+
+async def _flush_presence(room: str, buf: Dict[Hashable, object]) -> None:
+    await _broadcast("presence:update", {
+        "threadId": _thread_id_from_room(room),
+        "users": {str(uid): online for uid, online in buf.items()},
+    }, room, droppable=True)
+
+
+async def _flush_typing(room: str, buf: Dict[Hashable, object]) -> None:
+    thread_id = _thread_id_from_room(room)
+    users = typing_state.typing_users(thread_id)
+
+    # повторно ничего не шлём, если список печатающих не изменился
+    if users != _last_typing.get(room, []):
+        await _broadcast("chat:typing", {"threadId": thread_id, "userIds": users}, room, droppable=True)
+
+    timer = _typing_timers.pop(room, None)
+    if timer is not None:
+        timer.cancel()
+    if users:
+        _last_typing[room] = users
+        # перепроверим после TTL, чтобы погасить "печатает..." у молчащих клиентов
+        _typing_timers[room] = asyncio.get_running_loop().call_later(
+            settings.TYPING_TTL_SECONDS, _recheck_typing, room
+        )
+    else:
+        _last_typing.pop(room, None)
+        typing_coalescer.forget(room)
+
+
+def _recheck_typing(room: str) -> None:
+    _typing_timers.pop(room, None)
+    typing_coalescer.push(room, "expire", True)
+
+
+_coalesce_interval = settings.REALTIME_COALESCE_MS / 1000
+presence_coalescer = RoomCoalescer(_flush_presence, _coalesce_interval)
+typing_coalescer = RoomCoalescer(_flush_typing, _coalesce_interval)
+
+
+async def _broadcast_presence(user_id: int, online: bool) -> None:
+    """Queue a presence change for every active room of the user's threads."""
+    async with SessionLocal() as db:
+        thread_ids = (await db.scalars(
+            select(ChatThread.id).where(
+                or_(ChatThread.user_low_id == user_id, ChatThread.user_high_id == user_id)
+            )
+        )).all()
+
+    for thread_id in thread_ids:
+        room = room_name(thread_id)
+        if _room_is_active(room):
+            presence_coalescer.push(room, user_id, online)
+
 async def _get_db() -> AsyncSession:
     async with SessionLocal() as s:
         yield s
 
 @sio.event
 async def connect(sid, environ, auth):
+    events_total.inc(event="connect")
     token = (auth or {}).get("token")
     if not token:
         return False
@@ -38,18 +227,31 @@ async def connect(sid, environ, auth):
         return False
 
     await sio.save_session(sid, {"user_id": user_id})
+    await sio.enter_room(sid, user_room(user_id))
+    if presence.connect(sid, user_id):
+        await _broadcast_presence(user_id, True)
     return True
 
 @sio.event
 async def disconnect(sid):
-    # ничего не нужно
-    return
+    events_total.inc(event="disconnect")
+    limits.forget_sid(sid)
+    user_id = presence.disconnect(sid)
+    if user_id is None:
+        return
+
+    for thread_id in typing_state.clear_user(user_id):
+        typing_coalescer.push(room_name(thread_id), user_id, False)
+    await _broadcast_presence(user_id, False)
 
 @sio.on("chat:join")
 async def chat_join(sid, data):
+    events_total.inc(event="chat:join")
     thread_id = int((data or {}).get("threadId") or 0)
     if not thread_id:
         return
+    if await _throttled(sid, "chat:join"):
+        return
 
     session = await sio.get_session(sid)
     me_id = int(session["user_id"])
@@ -57,6 +259,7 @@ async def chat_join(sid, data):
     async with SessionLocal() as db:
         thread = await db.scalar(select(ChatThread).where(ChatThread.id == thread_id))
         if not thread:
+            await _send_archived_history(db, sid, me_id, thread_id)
             return
 
         if me_id not in (thread.user_low_id, thread.user_high_id):
@@ -64,6 +267,12 @@ async def chat_join(sid, data):
 
         await sio.enter_room(sid, room_name(thread_id))
 
+        peer_id = thread.user_high_id if thread.user_low_id == me_id else thread.user_low_id
+        await _send("presence:update", {
+            "threadId": thread_id,
+            "users": {str(uid): online for uid, online in presence.online_many([peer_id]).items()},
+        }, sid, droppable=True)
+
         # отправим историю (последние 50)
         rows = (await db.execute(
             select(ChatMessage)
@@ -73,7 +282,7 @@ async def chat_join(sid, data):
         )).scalars().all()
 
         rows = list(reversed(rows))
-        await sio.emit("chat:history", {
+        await _send("chat:history", {
             "threadId": thread_id,
             "messages": [
                 {
@@ -85,16 +294,39 @@ async def chat_join(sid, data):
                     "clientId": m.client_id,
                 } for m in rows
             ]
-        }, to=sid)
+        }, sid)
+
+async def _send_archived_history(db: AsyncSession, sid: str, me_id: int, thread_id: int) -> None:
+    # архивный тред только читается: в комнату не входим, писать в него нельзя
+    archived = await chat_archive.get(db, thread_id)
+    if archived is None or me_id not in (archived.user_low_id, archived.user_high_id):
+        return
+    await _send("chat:history", {
+        "threadId": thread_id,
+        "archived": True,
+        "messages": [
+            {
+                "id": m["id"],
+                "threadId": thread_id,
+                "senderId": m["sender_id"],
+                "text": m["text"],
+                "createdAt": m["created_at"],
+                "clientId": m["client_id"],
+            } for m in chat_archive.unpack(archived)[-50:]
+        ]
+    }, sid)
 
 @sio.on("chat:message")
 async def chat_message(sid, data):
+    events_total.inc(event="chat:message")
     thread_id = int((data or {}).get("threadId") or 0)
     text = str((data or {}).get("text") or "").strip()
     client_id = (data or {}).get("clientId")
 
     if not thread_id or not text:
         return
+    if await _throttled(sid, "chat:message"):
+        return
 
     session = await sio.get_session(sid)
     me_id = int(session["user_id"])
@@ -117,6 +349,7 @@ async def chat_message(sid, data):
 
         thread.last_message_at = msg.created_at
         thread.last_message_text = msg.text
+        await thread_inbox.on_message(db, thread_id, msg.created_at, msg.text)
 
         await db.commit()
         await db.refresh(msg)
@@ -129,4 +362,94 @@ async def chat_message(sid, data):
             "createdAt": msg.created_at.isoformat(),
             "clientId": msg.client_id,
         }
-        await sio.emit("chat:message", payload, to=room_name(thread_id))
+        await _broadcast("chat:message", payload, room_name(thread_id))
+
+        # отправленное сообщение гасит индикатор "печатает..."
+        typing_state.set(thread_id, me_id, False)
+        typing_coalescer.push(room_name(thread_id), me_id, False)
+
+@sio.on("chat:typing")
+async def chat_typing(sid, data):
+    events_total.inc(event="chat:typing")
+    thread_id = int((data or {}).get("threadId") or 0)
+    if not thread_id:
+        return
+
+    # печатать можно только в комнату, в которую сокет вошёл через chat:join
+    room = room_name(thread_id)
+    if room not in sio.rooms(sid):
+        return
+    if await _throttled(sid, "chat:typing"):
+        return
+
+    session = await sio.get_session(sid)
+    me_id = int(session["user_id"])
+
+    typing_state.set(thread_id, me_id, bool((data or {}).get("isTyping", True)))
+    typing_coalescer.push(room, me_id, True)
+
+
+# --- items:feed ---------------------------------------------------------------
+
+@sio.on("items:subscribe")
+async def items_subscribe(sid, data=None):
+    """Join the live item feed; ack carries the current seq.
+
+    Клиент: GET /items/ (или /items/changes) -> subscribe -> применяет
+    `items:changes`. Если `since` в событии не равен его seq (пропустил
+    событие), догоняет через GET /items/changes?since=<его seq>.
+    """
+    events_total.inc(event="items:subscribe")
+    await sio.enter_room(sid, ITEMS_FEED_ROOM)
+    async with SessionLocal() as db:
+        return {"seq": await item_changes.latest_seq(db)}
+
+
+@sio.on("items:unsubscribe")
+async def items_unsubscribe(sid, data=None):
+    events_total.inc(event="items:unsubscribe")
+    await sio.leave_room(sid, ITEMS_FEED_ROOM)
+
+
+async def _publish_items(db: AsyncSession, since: int) -> int:
+    while True:
+        seq, changed, deleted, more = await item_changes.changes_since(db, since, 500)
+        if seq == since:
+            return since
+        ta = adapter(ItemChangesOut)
+        payload = ta.dump_python(ta.validate_python(
+            {"seq": seq, "items": changed, "deleted": deleted}, from_attributes=True,
+        ), mode="json")
+        payload["since"] = since
+        # отставшим сокетам не шлём: по since они сами догонят через REST
+        await _broadcast("items:changes", payload, ITEMS_FEED_ROOM, droppable=True, local=True)
+        since = seq
+        if not more:
+            return since
+
+
+async def run_items_feed() -> None:
+    """Push change-log deltas to items:feed, one query per window for the whole process.
+
+    Сколько бы вкладок ни было подписано, процесс раз в окно читает лог
+    одним запросом и рассылает одну дельту. Изменения из этого процесса
+    будят цикл сразу (item_changes.notify), из других — ловятся poll'ом.
+    """
+    async with SessionLocal() as db:
+        last = await item_changes.latest_seq(db)
+    while True:
+        await item_changes.wait_for_change(settings.ITEMS_FEED_POLL_SECONDS)
+        # окно коалесцирования: правки, пришедшие за это время, уйдут вместе
+        await asyncio.sleep(settings.ITEMS_FEED_COALESCE_MS / 1000)
+        try:
+            async with SessionLocal() as db:
+                if _room_is_active(ITEMS_FEED_ROOM):
+                    last = await _publish_items(db, last)
+                else:
+                    last = await item_changes.latest_seq(db)
+        except item_changes.HistoryCompacted:
+            # сервер стоял дольше retention: подписчики сами перечитают список
+            async with SessionLocal() as db:
+                last = await item_changes.latest_seq(db)
+        except Exception:
+            logger.exception("items feed publish failed")
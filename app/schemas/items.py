@@ -1,6 +1,11 @@
-from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field, computed_field
 from typing import Literal, Optional
 
+from app.core.timeago import time_ago
+from app.media.variant_urls import srcset, thumb_url
+
 ItemType = Literal["lost", "found"]
 StatusType = Literal["OPEN", "IN_PROGRESS", "CLOSED"]
 CategoryType = Literal["electronics", "clothes", "personal", "documents"]
@@ -13,14 +18,14 @@ class ItemBase(BaseModel):
     roomId: str
     roomLabel: str
     floorLabel: str
-    timeAgo: str
     description: str
     image_url: Optional[str] = None
 
 
 class ItemCreate(ItemBase):
     """Client cannot set status; server sets it to OPEN."""
-    pass
+    # устарело: время берётся из created_at, значение игнорируется
+    timeAgo: Optional[str] = None
 
 
 class ItemUpdate(BaseModel):
@@ -32,6 +37,7 @@ class ItemUpdate(BaseModel):
     roomId: Optional[str] = None
     roomLabel: Optional[str] = None
     floorLabel: Optional[str] = None
+    # устарело, игнорируется (см. ItemCreate)
     timeAgo: Optional[str] = None
     description: Optional[str] = None
     image_url: Optional[str] = None
@@ -44,10 +50,63 @@ class Item(ItemBase):
     owner_id: int
     status: StatusType
 
+    image_variants: Optional[dict] = None
+    # PENDING пока embed_item job не отработал; такие item не участвуют в поиске
+    embedding_status: Optional[str] = None
+
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @computed_field
+    @property
+    def timeAgo(self) -> str:
+        return time_ago(self.created_at)
+
+    @computed_field
+    @property
+    def image_srcset(self) -> Optional[str]:
+        return srcset(self.image_variants)
+
+    @computed_field
+    @property
+    def thumb_url(self) -> Optional[str]:
+        return thumb_url(self.image_variants)
+
+
+class ItemSummary(BaseModel):
+    """Lightweight projection for lists that only need a title and a thumbnail."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    type: ItemType
+    status: StatusType
+    image_url: Optional[str] = None
+    # только для thumb_url, в ответ не попадает
+    image_variants: Optional[dict] = Field(None, exclude=True)
+
+    @computed_field
+    @property
+    def thumb_url(self) -> Optional[str]:
+        return thumb_url(self.image_variants)
+
+
+class ItemBatchIn(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=500)  # = items.BATCH_MAX_IDS
+
+
+class ItemBatchOut(BaseModel):
+    # в порядке запроса (повторы схлопнуты); ненайденные id — в missing
+    items: list[ItemSummary]
+    missing: list[int]
+
 
 class SimilarItemMatch(BaseModel):
     item: Item
     similarity: float
+    # найдено по pHash (почти та же картинка), без сравнения эмбеддингов
+    near_duplicate: bool = False
+    hamming_distance: Optional[int] = None
 
 
 class SimilarByImageResponse(BaseModel):
@@ -56,3 +115,24 @@ class SimilarByImageResponse(BaseModel):
 
 class DeduplicateResponse(BaseModel):
     possible_duplicates: list[SimilarItemMatch]
+
+
+class ItemChangesOut(BaseModel):
+    """Delta for GET /items/changes and the `items:changes` feed event.
+
+    `items` — текущее состояние созданных/изменённых item, `deleted` — id
+    удалённых; следующий запрос — с since=seq (сразу же, если `more`).
+    """
+    seq: int
+    items: list[Item]
+    deleted: list[int]
+    more: bool = False
+
+
+class ItemMatchOut(BaseModel):
+    """Automatic lost↔found pair, seen from one of its items (GET /items/{id}/matches)."""
+    item: Item
+    score: float
+    similarity: float
+    location_score: float
+    created_at: datetime
@@ -0,0 +1,142 @@
+# app/services/chat_archive.py
+"""Move threads of long-closed items out of the hot chat tables.
+
+Тред, чей item закрыт дольше CHAT_ARCHIVE_AFTER_DAYS, переезжает в
+chat_thread_archives: поля треда + все сообщения одним zlib-блобом.
+chat_threads/chat_messages (и их индексы) остаются размером с живые
+разговоры. Строки thread_inbox не трогаем — тред остаётся в списке,
+а история читается из архива по запросу (REST и chat:join).
+
+Переносим пачками по CHAT_ARCHIVE_BATCH тредов, пачка — одна транзакция.
+По умолчанию выключено (CHAT_ARCHIVE_AFTER_DAYS = 0); включается в .env,
+например CHAT_ARCHIVE_AFTER_DAYS=30 (см. .env.example).
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.chat_archive import ChatThreadArchive
+from app.db.models.chat_message import ChatMessage
+from app.db.models.chat_thread import ChatThread
+from app.db.models.item import Item
+
+CODEC = "json+zlib"
+
+
+def _ts(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt is not None else None
+
+
+def pack(messages: List[ChatMessage]) -> bytes:
+    # компактные строки вместо объектов: ключи не повторяются в каждом сообщении
+    rows = [[m.id, m.sender_id, m.text, _ts(m.created_at), m.client_id] for m in messages]
+    raw = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, settings.CHAT_ARCHIVE_ZLIB_LEVEL)
+
+
+def unpack(archive: ChatThreadArchive) -> List[dict]:
+    """Messages of an archived thread, oldest first, in MessageOut / chat:history shape."""
+    if archive.codec != CODEC:
+        raise ValueError(f"unknown archive codec {archive.codec!r}")
+    rows = json.loads(zlib.decompress(archive.messages))
+    return [
+        {
+            "id": mid,
+            "thread_id": archive.thread_id,
+            "sender_id": sender_id,
+            "text": text,
+            "created_at": created_at,
+            "client_id": client_id,
+        }
+        for mid, sender_id, text, created_at, client_id in rows
+    ]
+
+
+async def get(db: AsyncSession, thread_id: int) -> Optional[ChatThreadArchive]:
+    return await db.get(ChatThreadArchive, thread_id)
+
+
+async def find(db: AsyncSession, item_id: int, low: Optional[int] = None, high: Optional[int] = None):
+    """Archived thread of the item (для пары low/high, если заданы)."""
+    q = select(ChatThreadArchive).where(ChatThreadArchive.item_id == item_id)
+    if low is not None:
+        q = q.where(ChatThreadArchive.user_low_id == low, ChatThreadArchive.user_high_id == high)
+    return await db.scalar(q.limit(1))
+
+
+async def remove_item(db: AsyncSession, item_id: int) -> None:
+    await db.execute(delete(ChatThreadArchive).where(ChatThreadArchive.item_id == item_id))
+
+
+async def archive_batch(db: AsyncSession, cutoff: datetime, limit: int) -> int:
+    """Archive up to `limit` threads whose item was closed before `cutoff`.
+
+    Commit делает вызывающий. Returns the number of archived threads.
+    """
+    threads = list(await db.scalars(
+        select(ChatThread)
+        .join(Item, Item.id == ChatThread.item_id)
+        .where(Item.status == "CLOSED", Item.closed_at < cutoff)
+        .order_by(ChatThread.id)
+        .limit(limit)
+    ))
+    if not threads:
+        return 0
+    ids = [t.id for t in threads]
+
+    by_thread = {tid: [] for tid in ids}
+    for m in await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.thread_id.in_(ids))
+        .order_by(ChatMessage.thread_id, ChatMessage.created_at, ChatMessage.id)
+    ):
+        by_thread[m.thread_id].append(m)
+
+    now = datetime.utcnow()
+    db.add_all([
+        ChatThreadArchive(
+            thread_id=t.id,
+            item_id=t.item_id,
+            user_low_id=t.user_low_id,
+            user_high_id=t.user_high_id,
+            created_at=t.created_at,
+            last_message_at=t.last_message_at,
+            last_message_text=t.last_message_text,
+            close_low_confirmed=t.close_low_confirmed,
+            close_high_confirmed=t.close_high_confirmed,
+            archived_at=now,
+            message_count=len(by_thread[t.id]),
+            codec=CODEC,
+            messages=pack(by_thread[t.id]),
+        )
+        for t in threads
+    ])
+    await db.flush()
+    await db.execute(delete(ChatMessage).where(ChatMessage.thread_id.in_(ids)))
+    await db.execute(delete(ChatThread).where(ChatThread.id.in_(ids)))
+    return len(threads)
+
+
+async def archive_closed(days: Optional[float] = None, batch: Optional[int] = None) -> int:
+    """Run batches until no eligible thread is left. Returns the number archived."""
+    days = settings.CHAT_ARCHIVE_AFTER_DAYS if days is None else days
+    batch = batch or settings.CHAT_ARCHIVE_BATCH
+    if days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    total = 0
+    while True:
+        async with SessionLocal() as db:
+            n = await archive_batch(db, cutoff, batch)
+            await db.commit()
+        if not n:
+            return total
+        total += n
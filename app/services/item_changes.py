@@ -0,0 +1,145 @@
+# app/services/item_changes.py
+"""Item change log: GET /items/changes?since=<seq> and the items:feed room.
+
+Запись (`record`) идёт в транзакции вызывающего, вместе с самим изменением.
+Читатель получает не историю, а текущее состояние изменившихся item:
+несколько правок одного item между двумя опросами — одна дельта.
+
+Клиент продолжает с последнего увиденного seq, поэтому строка с меньшим
+seq не должна стать видимой позже строки с большим. На SQLite так и есть:
+писатель один, seq выдаётся под блокировкой БД, которая держится до commit.
+На PostgreSQL seq берётся из sequence при INSERT, а видна строка после
+COMMIT — транзакция с seq=9 может закоммититься после seq=10, и клиент,
+уже ушедший на 10, её пропустит. Поэтому там писатели item_changes
+сериализуются transaction-level advisory lock'ом (`_serialize_writers`):
+от первого flush записи до commit/rollback — та же модель, что у SQLite.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import delete, event, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from app.db.models.item import Item
+from app.db.models.item_change import ItemChange
+
+UPSERT = "upsert"
+DELETE = "delete"
+HORIZON = "horizon"
+
+# будит items:feed в этом процессе сразу после commit (иначе — ждёт poll)
+_wakeup = asyncio.Event()
+
+
+class HistoryCompacted(Exception):
+    """`since` is older than the compaction horizon: the client must refetch the list."""
+
+
+# pg_advisory_xact_lock key ("itemchg")
+_PG_LOCK_KEY = 0x6974656D636867
+
+
+@event.listens_for(Session, "before_flush")
+def _serialize_writers(session: Session, flush_context, instances) -> None:
+    if not any(isinstance(obj, ItemChange) for obj in session.new):
+        return
+    conn = session.connection()
+    if conn.dialect.name == "postgresql":
+        # повторный вызов в той же транзакции не ждёт; снимается на commit/rollback
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+
+
+def record(db: AsyncSession, item_id: int, op: str = UPSERT) -> None:
+    db.add(ItemChange(item_id=item_id, op=op, created_at=datetime.utcnow()))
+
+
+def record_many(db: AsyncSession, item_ids, op: str = UPSERT) -> None:
+    now = datetime.utcnow()
+    db.add_all([ItemChange(item_id=i, op=op, created_at=now) for i in item_ids])
+
+
+def notify() -> None:
+    _wakeup.set()
+
+
+async def wait_for_change(timeout: float) -> None:
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+async def latest_seq(db: AsyncSession) -> int:
+    return await db.scalar(select(func.max(ItemChange.seq))) or 0
+
+
+async def horizon(db: AsyncSession) -> int:
+    return await db.scalar(
+        select(func.max(ItemChange.seq)).where(ItemChange.op == HORIZON)
+    ) or 0
+
+
+async def changes_since(db: AsyncSession, since: int, limit: int) -> Tuple[int, List[Item], List[int], bool]:
+    """(seq, changed items, deleted ids, more) for changes after `since`.
+
+    Item попадает в страницу по своему последнему seq, поэтому продолжение
+    с возвращённого seq ничего не теряет и не повторяет. `more` — упёрлись в limit.
+    """
+    if since < await horizon(db):
+        raise HistoryCompacted()
+
+    last = func.max(ItemChange.seq).label("last")
+    rows = (await db.execute(
+        select(ItemChange.item_id, last)
+        .where(ItemChange.seq > since, ItemChange.op != HORIZON)
+        .group_by(ItemChange.item_id)
+        .order_by(last)
+        .limit(limit + 1)
+    )).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return since, [], [], False
+
+    ids = [item_id for item_id, _ in rows]
+    by_id = {it.id: it for it in await db.scalars(select(Item).where(Item.id.in_(ids)))}
+    items = [by_id[i] for i in ids if i in by_id]
+    deleted = [i for i in ids if i not in by_id]
+    return rows[-1][1], items, deleted, more
+
+
+async def compact(db: AsyncSession, retention: timedelta) -> int:
+    """Drop superseded entries and delete records older than `retention`.
+
+    1) по каждому item оставляем только последнюю запись — на ответ
+       changes_since это не влияет;
+    2) удаления старше retention выбрасываем совсем, самое новое из них
+       становится HORIZON: клиенту со since < horizon отвечаем 410.
+    Commit делает вызывающий. Returns the number of removed rows.
+    """
+    newer = aliased(ItemChange)
+    superseded = (
+        select(newer.seq)
+        .where(newer.item_id == ItemChange.item_id, newer.seq > ItemChange.seq, newer.op != HORIZON)
+        .exists()
+    )
+    res = await db.execute(delete(ItemChange).where(ItemChange.op != HORIZON, superseded))
+    removed = res.rowcount or 0
+
+    cutoff = datetime.utcnow() - retention
+    new_horizon = await db.scalar(
+        select(func.max(ItemChange.seq)).where(ItemChange.op == DELETE, ItemChange.created_at < cutoff)
+    )
+    if new_horizon:
+        res = await db.execute(
+            delete(ItemChange).where(
+                ItemChange.op.in_((DELETE, HORIZON)), ItemChange.seq < new_horizon,
+            )
+        )
+        removed += res.rowcount or 0
+        await db.execute(update(ItemChange).where(ItemChange.seq == new_horizon).values(op=HORIZON))
+    return removed
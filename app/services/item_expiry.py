@@ -0,0 +1,62 @@
+# app/services/item_expiry.py
+"""Auto-close stale listings: OPEN items older than ITEM_EXPIRE_DAYS.
+
+Закрытые item уходят из поиска и из mmap-индекса, так что активный набор
+(и стоимость similar-by-image / deduplicate) не растёт вместе с историей.
+Закрываем пачками по ITEM_EXPIRE_BATCH, каждая пачка — своя транзакция:
+база не блокируется надолго, а упавший sweep просто продолжит с того же места.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.services import item_status
+
+OPEN = item_status.OPEN
+
+
+async def expire_batch(db: AsyncSession, cutoff: datetime, limit: int) -> Tuple[int, List[int]]:
+    """Close up to `limit` OPEN items created before `cutoff`.
+
+    Returns (selected, closed ids). Переход через item_status: если владелец
+    успел поменять статус между SELECT и UPDATE, его изменение не перетирается
+    (closed может быть короче selected). Commit делает вызывающий.
+    """
+    # ix_items_status_created
+    ids = list(await db.scalars(
+        select(Item.id)
+        .where(Item.status == OPEN, Item.created_at < cutoff)
+        .order_by(Item.created_at)
+        .limit(limit)
+    ))
+    if not ids:
+        return 0, []
+    return len(ids), await item_status.transition_many(db, ids, item_status.CLOSED, (item_status.OPEN,))
+
+
+async def expire_items(days: float | None = None, batch: int | None = None) -> int:
+    """Run batches until nothing is left to close. Returns the number of closed items."""
+    days = settings.ITEM_EXPIRE_DAYS if days is None else days
+    batch = batch or settings.ITEM_EXPIRE_BATCH
+    if days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    total = 0
+    while True:
+        async with SessionLocal() as db:
+            selected, closed = await expire_batch(db, cutoff, batch)
+            await db.commit()
+        # пачка, целиком проигравшая гонку, — не конец: проигравшие уже не OPEN
+        # и в следующий SELECT не попадут
+        if not selected:
+            break
+        total += len(closed)
+        await item_status.after_commit(item_status.CLOSED, closed)
+    return total
@@ -0,0 +1,113 @@
+# app/services/item_status.py
+"""Item status state machine: OPEN → IN_PROGRESS → CLOSED (+ reopen).
+
+Каждый переход — один условный `UPDATE items ... WHERE status IN (:expected)
+RETURNING id`: если статус успел смениться в параллельном запросе, строка
+не вернётся и переход не применится — без read-modify-write и lost update.
+В той же транзакции вызывающего: closed_at, строки thread_inbox, пары
+matching (для CLOSED) и запись в item_changes. После commit вызывающий
+зовёт `after_commit` — items:feed и mmap-индекс поиска.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai import vector_store
+from app.db.models.item import Item
+from app.db.models.thread_inbox import ThreadInbox
+from app.services import item_changes, matching
+
+OPEN = "OPEN"
+IN_PROGRESS = "IN_PROGRESS"
+CLOSED = "CLOSED"
+
+# текущий статус -> куда можно перейти. IN_PROGRESS = есть чат по item;
+# закрытый item переоткрывается только в OPEN
+TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    OPEN: (IN_PROGRESS, CLOSED),
+    IN_PROGRESS: (OPEN, CLOSED),
+    CLOSED: (OPEN,),
+}
+
+# владелец через PATCH только открывает/закрывает; IN_PROGRESS ставит чат
+OWNER_TARGETS: Tuple[str, ...] = (OPEN, CLOSED)
+
+
+class InvalidTransition(Exception):
+    def __init__(self, current: str, target: str) -> None:
+        super().__init__(f"cannot change status from {current} to {target}")
+        self.current = current
+        self.target = target
+
+
+def sources(target: str) -> Tuple[str, ...]:
+    """Statuses from which `target` is reachable."""
+    return tuple(s for s, targets in TRANSITIONS.items() if target in targets)
+
+
+def check(current: str, target: str) -> None:
+    if target not in TRANSITIONS.get(current, ()):
+        raise InvalidTransition(current, target)
+
+
+async def transition_many(
+    db: AsyncSession,
+    item_ids: Sequence[int],
+    target: str,
+    expected: Optional[Sequence[str]] = None,
+) -> List[int]:
+    """Move items whose status is in `expected` (default: every valid source) to `target`.
+
+    Returns the ids that actually changed. Загруженные в сессию Item
+    получают новые status/closed_at (synchronize_session="fetch" берёт id из
+    того же RETURNING, лишнего SELECT нет). Commit делает вызывающий.
+    """
+    if not item_ids:
+        return []
+    expected = tuple(expected) if expected is not None else sources(target)
+    now = datetime.utcnow()
+    res = await db.execute(
+        update(Item)
+        .where(Item.id.in_(list(item_ids)), Item.status.in_(expected))
+        .values(status=target, closed_at=now if target == CLOSED else None, updated_at=now)
+        .returning(Item.id)
+        .execution_options(synchronize_session="fetch")
+    )
+    changed = list(res.scalars())
+    if not changed:
+        return []
+
+    await db.execute(
+        update(ThreadInbox)
+        .where(ThreadInbox.item_id.in_(changed))
+        .values(item_status=target, is_closed=target == CLOSED)
+    )
+    if target == CLOSED:
+        await matching.remove_items(db, changed)
+    item_changes.record_many(db, changed)
+    return changed
+
+
+async def transition(
+    db: AsyncSession,
+    item_id: int,
+    target: str,
+    expected: Optional[Sequence[str]] = None,
+) -> bool:
+    """Single-item `transition_many`; False if the status was not in `expected`."""
+    return bool(await transition_many(db, [item_id], target, expected))
+
+
+async def after_commit(target: str, item_ids: Sequence[int]) -> None:
+    """Wake items:feed; closed items leave the search index.
+
+    Возврат в индекс при переоткрытии делает вызывающий: нужен эмбеддинг.
+    """
+    if not item_ids:
+        return
+    item_changes.notify()
+    if target == CLOSED:
+        await vector_store.forget_items(list(item_ids))
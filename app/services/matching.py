@@ -0,0 +1,280 @@
+# app/services/matching.py
+"""Automatic lost↔found matching.
+
+Новый (или изменённый) item с READY-эмбеддингом сравнивается с открытыми
+item противоположного типа той же категории; лучшие MATCH_TOP_K пар с
+similarity >= MATCH_MIN_SIMILARITY сохраняются в ItemMatch, владельцам
+обеих сторон уходит `match:new` по Socket.IO.
+
+Запускается job'ом `match_item` (app/jobs/handlers.py) после embed_item,
+attach с переиспользованным эмбеддингом и правок типа/категории/места;
+`match_sweep` периодически чистит устаревшие пары и догоняет пропущенное.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, defer
+
+from app.ai import vector_store
+from app.core.config import settings
+from app.db.models.item import Item
+from app.db.models.item_match import ItemMatch
+
+OPPOSITE = {"lost": "found", "found": "lost"}
+
+OPEN = "OPEN"
+# совпадает с app.jobs.handlers.EMBEDDING_READY (handlers импортируют этот модуль)
+READY = "READY"
+
+NEW_MATCH_EVENT = "match:new"
+
+
+def location_score(a: Item, b: Item) -> float:
+    if a.roomId and a.roomId == b.roomId:
+        return 1.0
+    if a.floorLabel and a.floorLabel == b.floorLabel:
+        return 0.5
+    return 0.0
+
+
+def _matchable(item: Optional[Item]) -> bool:
+    return (
+        item is not None
+        and item.status == OPEN
+        and item.type in OPPOSITE
+        and item.embedding_status == READY
+        and item.embedding is not None
+    )
+
+
+def _pair(item: Item, other: Item) -> Tuple[int, int]:
+    return (item.id, other.id) if item.type == "lost" else (other.id, item.id)
+
+
+def _insert(db: AsyncSession):
+    """INSERT с ON CONFLICT для текущего диалекта (sqlite / postgresql)."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(ItemMatch)
+
+
+async def _candidates(db: AsyncSession, item: Item) -> List[Item]:
+    # ix_items_match_candidates (type, category, status); векторы берутся из
+    # mmap-индекса, JSON-эмбеддинг кандидатов не грузим
+    rows = await db.scalars(
+        select(Item)
+        .options(defer(Item.embedding))
+        .where(
+            Item.type == OPPOSITE[item.type],
+            Item.category == item.category,
+            Item.status == OPEN,
+            Item.embedding_status == READY,
+            Item.embedding_model == item.embedding_model,
+            Item.embedding.is_not(None),
+            Item.owner_id != item.owner_id,
+        )
+    )
+    return list(rows)
+
+
+async def _similarities(db: AsyncSession, item: Item, candidates: List[Item]) -> Dict[int, float]:
+    """candidate id -> cosine to `item`.
+
+    Векторы кандидатов — из vector_store (как в search.py); тех, кого в
+    индексе ещё нет (эмбеддинг готов, index_items не успел) или если индекс
+    выключен, досчитываем по Item.embedding из БД.
+    """
+    if not candidates:
+        return {}
+    query = np.asarray(item.embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+    ids = np.fromiter((c.id for c in candidates), dtype=np.int64, count=len(candidates))
+    sims: Dict[int, float] = {}
+
+    view = vector_store.current_view(item.embedding_model)
+    if view is not None and view.vectors.shape[1] == query.shape[0]:
+        # tombstone'ы отрицательные и в ids не попадут
+        rows = np.flatnonzero(np.isin(view.ids, ids))
+        for row, sim in zip(rows, view.vectors[rows] @ query):
+            sims[int(view.ids[row])] = float(sim)
+
+    missing = [int(i) for i in ids if int(i) not in sims]
+    if missing:
+        res = await db.execute(select(Item.id, Item.embedding).where(Item.id.in_(missing)))
+        for cand_id, embedding in res.all():
+            vec = np.asarray(embedding, dtype=np.float32)
+            if vec.shape != query.shape:
+                continue
+            sims[cand_id] = float(vec @ query / (np.linalg.norm(vec) or 1.0))
+    return sims
+
+
+def _rank(
+    item: Item, candidates: List[Item], sims: Dict[int, float],
+) -> List[Tuple[float, float, float, Item]]:
+    """(score, similarity, location_score, candidate), best first, at most MATCH_TOP_K."""
+    ranked = []
+    for cand in candidates:
+        sim = sims.get(cand.id)
+        if sim is None or sim < settings.MATCH_MIN_SIMILARITY:
+            continue
+        loc = location_score(item, cand)
+        ranked.append((sim + settings.MATCH_LOCATION_WEIGHT * loc, sim, loc, cand))
+    ranked.sort(key=lambda r: r[0], reverse=True)
+    return ranked[: settings.MATCH_TOP_K]
+
+
+async def match_item(db: AsyncSession, item_id: int) -> List[ItemMatch]:
+    """Recompute the pairs of one item; returns the pairs not yet notified.
+
+    Пары пишутся одним INSERT ... ON CONFLICT (uq_item_match_pair) DO UPDATE:
+    параллельный прогон с другой стороны пары не роняет job IntegrityError.
+    Пары этого item, которые больше не проходят (другая категория, порог,
+    вытеснены из top-k), удаляются. Commit делает вызывающий.
+    """
+    item = await db.get(Item, item_id)
+    if not _matchable(item):
+        await remove_item(db, item_id)
+        return []
+
+    candidates = await _candidates(db, item)
+    ranked = _rank(item, candidates, await _similarities(db, item, candidates))
+    side, other_side = (
+        (ItemMatch.lost_item_id, ItemMatch.found_item_id)
+        if item.type == "lost"
+        else (ItemMatch.found_item_id, ItemMatch.lost_item_id)
+    )
+
+    now = datetime.utcnow()
+    # updated_at=Item.updated_at: отметка прогона — не правка item (onupdate не трогаем)
+    await db.execute(
+        update(Item)
+        .where(Item.id == item.id)
+        .values(matched_at=now, updated_at=Item.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(ItemMatch).where(side == item.id, other_side.not_in([c.id for *_, c in ranked]))
+    )
+    if not ranked:
+        return []
+
+    rows = []
+    for score, sim, loc, cand in ranked:
+        lost_id, found_id = _pair(item, cand)
+        rows.append({
+            "lost_item_id": lost_id, "found_item_id": found_id,
+            "score": score, "similarity": sim, "location_score": loc,
+            "created_at": now, "updated_at": now,
+        })
+    stmt = _insert(db)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ItemMatch.lost_item_id, ItemMatch.found_item_id],
+        set_={
+            "score": stmt.excluded.score,
+            "similarity": stmt.excluded.similarity,
+            "location_score": stmt.excluded.location_score,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ).returning(ItemMatch)
+    matches = await db.scalars(stmt, rows, execution_options={"populate_existing": True})
+    # новые пары и те, о которых ещё не успели сообщить (упал между commit и notify)
+    return [m for m in matches if m.notified_at is None]
+
+
+async def remove_item(db: AsyncSession, item_id: int) -> None:
+    """Drop every pair the item takes part in (deleted / closed / re-typed)."""
+    await remove_items(db, [item_id])
+
+
+async def remove_items(db: AsyncSession, item_ids: List[int]) -> None:
+    await db.execute(
+        delete(ItemMatch).where(
+            or_(ItemMatch.lost_item_id.in_(item_ids), ItemMatch.found_item_id.in_(item_ids))
+        )
+    )
+
+
+async def prune(db: AsyncSession) -> int:
+    """Delete pairs where either side is gone, no longer OPEN or lost its embedding."""
+    lost, found = aliased(Item), aliased(Item)
+    live = (
+        select(ItemMatch.id)
+        .join(lost, lost.id == ItemMatch.lost_item_id)
+        .join(found, found.id == ItemMatch.found_item_id)
+        .where(
+            lost.status == OPEN, found.status == OPEN,
+            lost.embedding_status == READY, found.embedding_status == READY,
+            lost.type == "lost", found.type == "found",
+            lost.category == found.category,
+        )
+    )
+    res = await db.execute(delete(ItemMatch).where(ItemMatch.id.not_in(live)))
+    return res.rowcount or 0
+
+
+async def unmatched_items(db: AsyncSession, limit: int) -> List[int]:
+    """Open READY items whose pairs were never computed or predate their last edit.
+
+    Item без пары, но уже прогнанный, повторно не берётся: новый кандидат
+    сам прогоняет match_item, и общая строка пары появляется у обеих сторон.
+    """
+    rows = await db.scalars(
+        select(Item.id)
+        .where(
+            Item.status == OPEN,
+            Item.type.in_(list(OPPOSITE)),
+            Item.embedding_status == READY,
+            or_(Item.matched_at.is_(None), Item.matched_at < Item.updated_at),
+        )
+        .order_by(Item.id.desc())
+        .limit(limit)
+    )
+    return list(rows)
+
+
+async def for_item(db: AsyncSession, item: Item) -> List[Tuple[ItemMatch, Item]]:
+    """Pairs of `item`, best first, with the item on the other side."""
+    if item.type == "lost":
+        side, other_side = ItemMatch.lost_item_id, ItemMatch.found_item_id
+    else:
+        side, other_side = ItemMatch.found_item_id, ItemMatch.lost_item_id
+    rows = await db.execute(
+        select(ItemMatch, Item)
+        .join(Item, Item.id == other_side)
+        .where(side == item.id)
+        .order_by(ItemMatch.score.desc())
+    )
+    return [(m, other) for m, other in rows.all()]
+
+
+async def notify(db: AsyncSession, matches: List[ItemMatch]) -> None:
+    """Push `match:new` to both owners of every new pair and mark it notified."""
+    if not matches:
+        return
+    from app.realtime.socketio_server import notify_user  # тяжёлый импорт, только при push
+
+    ids = {m.lost_item_id for m in matches} | {m.found_item_id for m in matches}
+    owners = dict((await db.execute(select(Item.id, Item.owner_id).where(Item.id.in_(ids)))).all())
+    for m in matches:
+        for mine, theirs in ((m.lost_item_id, m.found_item_id), (m.found_item_id, m.lost_item_id)):
+            owner = owners.get(mine)
+            if owner is None:
+                continue
+            await notify_user(owner, NEW_MATCH_EVENT, {
+                "itemId": mine,
+                "matchedItemId": theirs,
+                "score": round(m.score, 4),
+                "similarity": round(m.similarity, 4),
+            })
+    await db.execute(
+        update(ItemMatch)
+        .where(ItemMatch.id.in_([m.id for m in matches]))
+        .values(notified_at=datetime.utcnow())
+    )
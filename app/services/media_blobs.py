@@ -0,0 +1,129 @@
+# app/services/media_blobs.py
+"""Content-addressed media blobs with reference counting.
+
+Порядок операций закрывает гонку "удалили файл, который только что снова
+загрузили":
+  * acquire сначала пишет строку (refcount+1 / upsert) в транзакции
+    вызывающего, и только потом кладёт файл в хранилище;
+  * release лишь уменьшает refcount — строка с refcount=0 остаётся;
+  * collect после commit вызывающего удаляет строку условным
+    DELETE ... WHERE refcount <= 0 RETURNING и стирает файлы ДО commit
+    своей транзакции. Параллельный acquire того же sha256 либо успел
+    поднять refcount (DELETE ничего не вернёт, файл не трогаем), либо ждёт
+    блокировку строки / БД и после commit вставляет строку и файл заново.
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import cache_result
+from app.db.database import SessionLocal
+from app.db.models.media_blob import MediaBlob
+from app.media.storage import blob_key, get_storage
+from app.media.uploads import TempUpload
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(db: AsyncSession):
+    """INSERT с ON CONFLICT для текущего диалекта (sqlite / postgresql)."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(MediaBlob)
+
+
+async def _incref(db: AsyncSession, sha256: str) -> bool:
+    res = await db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.sha256 == sha256)
+        .values(refcount=MediaBlob.refcount + 1)
+    )
+    return bool(res.rowcount)
+
+
+async def acquire(db: AsyncSession, upload: TempUpload, ext: str) -> MediaBlob:
+    """Store the upload by content hash and take one reference to it.
+
+    Если такой sha256 уже есть — байты второй раз не сохраняются, растёт только
+    refcount. Работает внутри транзакции вызывающего (без commit): если она
+    откатится, откатится и ссылка.
+    """
+    sha = upload.sha256
+    if await _incref(db, sha):
+        cache_result("media_blob", True)
+        return await db.get(MediaBlob, sha, populate_existing=True)
+    cache_result("media_blob", False)
+
+    key = blob_key(sha, ext)
+    # параллельная загрузка того же файла могла вставить строку первой — тогда +1
+    stmt = _insert(db).values(
+        sha256=sha, key=key, size=upload.size, refcount=1, created_at=datetime.utcnow(),
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MediaBlob.sha256],
+            set_={"refcount": MediaBlob.refcount + 1},
+        )
+    )
+    blob = await db.get(MediaBlob, sha, populate_existing=True)
+    # строка уже наша (блокирует collect этого sha), теперь байты; ключ
+    # content-addressed, повторная запись того же содержимого безопасна
+    await upload.store(get_storage(), blob.key)
+    return blob
+
+
+async def release(db: AsyncSession, sha256: str | None) -> List[str]:
+    """Drop one reference. Returns sha256s to pass to `collect` once the caller commits."""
+    if not sha256:
+        return []
+
+    res = await db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.sha256 == sha256)
+        .values(refcount=MediaBlob.refcount - 1)
+        .returning(MediaBlob.refcount)
+    )
+    refcount = res.scalar()
+    if refcount is None or refcount > 0:
+        return []
+    return [sha256]
+
+
+def _keys(key: str, variants: dict | None) -> List[str]:
+    keys = [key]
+    for entries in (variants or {}).values():
+        keys.extend(e["key"] for e in entries if e.get("key"))
+    return keys
+
+
+async def collect(shas: Iterable[str]) -> None:
+    """Delete unreferenced blobs: the row and its files, one transaction per blob.
+
+    Строка удаляется только если refcount всё ещё <= 0 (перепроверка в БД),
+    файлы стираются до commit: при ошибке хранилища транзакция откатывается
+    и строка остаётся (следующий release/collect попробует снова).
+    """
+    storage = get_storage()
+    for sha in shas:
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                delete(MediaBlob)
+                .where(MediaBlob.sha256 == sha, MediaBlob.refcount <= 0)
+                .returning(MediaBlob.key, MediaBlob.variants)
+            )).first()
+            if row is None:
+                continue  # blob снова используется
+            try:
+                for key in _keys(row.key, row.variants):
+                    await storage.delete(key)
+            except Exception:
+                logger.exception("failed to delete media blob %s", sha)
+                await db.rollback()
+                continue
+            await db.commit()
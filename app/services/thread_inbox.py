@@ -0,0 +1,162 @@
+# app/services/thread_inbox.py
+
+import base64
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.chat_thread import ChatThread
+from app.db.models.item import Item
+from app.db.models.thread_inbox import ThreadInbox
+from app.media.variant_urls import thumb_url
+
+
+def _status_value(s):
+    return getattr(s, "value", s)
+
+
+def _item_fields(item: Item) -> dict:
+    status = _status_value(item.status)
+    return {
+        "item_title": item.title,
+        "item_status": status,
+        "item_image_url": item.image_url,
+        "item_thumb_url": thumb_url(item.image_variants),
+        "is_closed": status == "CLOSED",
+    }
+
+
+# --- Maintenance (called inside the caller's transaction, no commit) ----------
+
+async def add_thread(db: AsyncSession, thread: ChatThread, item: Item) -> None:
+    """Insert inbox rows for both participants of a freshly created thread."""
+    sort_ts = thread.last_message_at or thread.created_at
+    for user_id, peer_id in (
+        (thread.user_low_id, thread.user_high_id),
+        (thread.user_high_id, thread.user_low_id),
+    ):
+        db.add(ThreadInbox(
+            user_id=user_id,
+            thread_id=thread.id,
+            peer_id=peer_id,
+            item_id=thread.item_id,
+            sort_ts=sort_ts,
+            last_message_at=thread.last_message_at,
+            last_message_text=thread.last_message_text,
+            **_item_fields(item),
+        ))
+
+
+async def on_message(db: AsyncSession, thread_id: int, at: datetime, text: str) -> None:
+    await db.execute(
+        update(ThreadInbox)
+        .where(ThreadInbox.thread_id == thread_id)
+        .values(last_message_at=at, last_message_text=text, sort_ts=at)
+    )
+
+
+async def on_item_changed(db: AsyncSession, item: Item) -> None:
+    """Refresh cached item columns (title/image/status) in all inbox rows of the item."""
+    await db.execute(
+        update(ThreadInbox)
+        .where(ThreadInbox.item_id == item.id)
+        .values(**_item_fields(item))
+    )
+
+
+async def remove_item(db: AsyncSession, item_id: int) -> None:
+    await db.execute(delete(ThreadInbox).where(ThreadInbox.item_id == item_id))
+
+
+async def backfill(db: AsyncSession) -> int:
+    """Populate an empty inbox from chat_threads (first start after upgrade)."""
+    if await db.scalar(select(ThreadInbox.thread_id).limit(1)) is not None:
+        return 0
+
+    total = 0
+    for me_col, peer_col in (
+        (ChatThread.user_low_id, ChatThread.user_high_id),
+        (ChatThread.user_high_id, ChatThread.user_low_id),
+    ):
+        src = (
+            select(
+                me_col,
+                ChatThread.id,
+                peer_col,
+                ChatThread.item_id,
+                (Item.status == "CLOSED"),
+                func.coalesce(ChatThread.last_message_at, ChatThread.created_at),
+                Item.title,
+                Item.status,
+                Item.image_url,
+                ChatThread.last_message_at,
+                ChatThread.last_message_text,
+            )
+            .join(Item, Item.id == ChatThread.item_id)
+        )
+        res = await db.execute(
+            insert(ThreadInbox).from_select(
+                [
+                    "user_id", "thread_id", "peer_id", "item_id", "is_closed", "sort_ts",
+                    "item_title", "item_status", "item_image_url",
+                    "last_message_at", "last_message_text",
+                ],
+                src,
+            )
+        )
+        total += res.rowcount or 0
+
+    await db.commit()
+    return total
+
+
+# --- Reading ------------------------------------------------------------------
+
+def encode_cursor(row: ThreadInbox) -> str:
+    raw = f"{int(row.is_closed)}|{row.sort_ts.isoformat()}|{row.thread_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[bool, datetime, int]:
+    closed, ts, thread_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return closed == "1", datetime.fromisoformat(ts), int(thread_id)
+
+
+async def list_page(
+    db: AsyncSession,
+    user_id: int,
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+) -> tuple[list[ThreadInbox], Optional[str]]:
+    """Keyset page ordered by (is_closed asc, sort_ts desc, thread_id desc).
+
+    `limit=None` — все строки после курсора, без следующего курсора.
+    """
+    q = select(ThreadInbox).where(ThreadInbox.user_id == user_id)
+
+    if cursor:
+        closed, ts, thread_id = decode_cursor(cursor)
+        q = q.where(or_(
+            ThreadInbox.is_closed > literal(closed),
+            and_(
+                ThreadInbox.is_closed == literal(closed),
+                or_(
+                    ThreadInbox.sort_ts < ts,
+                    and_(ThreadInbox.sort_ts == ts, ThreadInbox.thread_id < thread_id),
+                ),
+            ),
+        ))
+
+    q = q.order_by(
+        ThreadInbox.is_closed.asc(),
+        ThreadInbox.sort_ts.desc(),
+        ThreadInbox.thread_id.desc(),
+    )
+    if limit is None:
+        return list((await db.scalars(q)).all()), None
+
+    rows = list((await db.scalars(q.limit(limit + 1))).all())
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
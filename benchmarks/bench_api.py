@@ -0,0 +1,277 @@
+"""HTTP endpoints under load, in-process (httpx.ASGITransport, no network).
+
+    python -m benchmarks.seed --reset --items 10000
+    python -m benchmarks.bench_api --requests 200 --concurrency 8 --out api.json
+    python -m benchmarks.bench_api --scenarios list_threads,list_messages
+
+Сценарии: login, list_items, items_batch (--batch-size сводок одним
+GET /items:batch), similar_by_image, deduplicate, list_threads,
+list_messages (отправка сообщений идёт через Socket.IO — см. bench_realtime).
+close_thread меняет данные (подтверждение закрытия обеими сторонами →
+item CLOSED), поэтому только явно: --scenarios close_thread, на свежем seed.
+У каждого сценария db_queries_per_request — SQL-запросов на HTTP-запрос
+(http_request_db_queries из MetricsMiddleware).
+Запросы идут под первыми --hot-users пользователями из benchmarks.seed,
+токены выпускаются напрямую (login меряется отдельно: это bcrypt).
+
+similar_by_image / deduplicate по умолчанию идут через mmap-индекс
+(app/ai/vector_store.py, пересобирается перед замером); --no-vector-store —
+старый скан Item.embedding, для сравнения.
+
+similar_by_image без torch (или с --fake-embed) считает запрос фиктивным
+вектором той же размерности: в замер входит загрузка файла, скан
+эмбеддингов и сериализация, но не CLIP (его меряет bench_micro / bench_inference).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import sys
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks import harness
+
+SCENARIOS = (
+    "login", "list_items", "items_batch", "similar_by_image", "deduplicate", "list_threads", "list_messages",
+    "close_thread",
+)
+# меняют БД — не входят в прогон по умолчанию
+MUTATING = ("close_thread",)
+
+
+def _jpeg(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(a).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _ok(r: httpx.Response) -> bool:
+    if r.status_code >= 400:
+        raise RuntimeError(f"HTTP {r.status_code}: {r.text[:200]}")
+    return True
+
+
+def _torch_available() -> bool:
+    try:
+        import torch  # noqa: F401
+        import open_clip  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _fixtures(hot_users: int) -> dict:
+    from sqlalchemy import func, or_, select
+
+    from app.db.database import SessionLocal
+    from app.db.models import ChatThread, Item, User
+
+    async with SessionLocal() as db:
+        user_ids = list((await db.scalars(select(User.id).order_by(User.id).limit(hot_users))).all())
+        if not user_ids:
+            raise SystemExit("no users: run `python -m benchmarks.seed --reset` first")
+        embedded = list((await db.scalars(
+            select(Item.id).where(Item.embedding.is_not(None)).order_by(func.random()).limit(500)
+        )).all())
+        dim = 0
+        if embedded:
+            dim = len(await db.scalar(select(Item.embedding).where(Item.id == embedded[0])))
+        threads = {}
+        for uid in user_ids:
+            threads[uid] = list((await db.scalars(
+                select(ChatThread.id)
+                .where(or_(ChatThread.user_low_id == uid, ChatThread.user_high_id == uid))
+                .limit(50)
+            )).all())
+        items_total = await db.scalar(select(func.count()).select_from(Item))
+        open_threads = (await db.execute(
+            select(ChatThread.id, ChatThread.user_low_id, ChatThread.user_high_id)
+            .join(Item, Item.id == ChatThread.item_id)
+            .where(Item.status != "CLOSED")
+            .order_by(ChatThread.id)
+            .limit(5000)
+        )).all()
+    return {
+        "users": user_ids, "embedded": embedded, "dim": dim, "threads": threads, "items": items_total,
+        "open_threads": [tuple(r) for r in open_threads],
+    }
+
+
+def _db_queries() -> tuple:
+    from app.core.observability import HTTP_DB_QUERIES
+
+    total = count = 0.0
+    for name, _, value in HTTP_DB_QUERIES.samples():
+        if name.endswith("_sum"):
+            total += value
+        elif name.endswith("_count"):
+            count += value
+    return total, count
+
+
+def _fake_embedder(dim: int):
+    def embed(path) -> list:
+        rng = np.random.default_rng(abs(hash(str(path))) % (2 ** 32))
+        v = rng.standard_normal(dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+    return embed
+
+
+async def run(args) -> tuple:
+    with contextlib.redirect_stdout(sys.stderr):  # app.main печатает пути при импорте
+        import app.main
+        import app.api.v1.routers.search as search_router
+    from app.auth.security import create_access_token
+
+    from app.ai import vector_store
+
+    fx = await _fixtures(args.hot_users)
+    store_vectors = None
+    if vector_store.enabled():
+        store_vectors = await vector_store.rebuild_from_db()
+    embedder = "clip"
+    if args.fake_embed or not _torch_available():
+        if not fx["dim"]:
+            raise SystemExit("no embedded items in the database")
+        search_router.embed_image_file = _fake_embedder(fx["dim"])
+        embedder = "fake"
+
+    rng = random.Random(args.seed)
+    users = fx["users"]
+    auth = {uid: {"Authorization": f"Bearer {create_access_token(uid)}"} for uid in users}
+    with_threads = [uid for uid in users if fx["threads"][uid]]
+    images = [_jpeg(i) for i in range(8)]
+
+    async def login(i: int) -> bool:
+        uid = users[i % len(users)]
+        r = await client.post("/api/v1/auth/login",
+                              json={"email": f"bench{uid}@example.com", "password": harness.PASSWORD})
+        return _ok(r)
+
+    async def list_items(i: int) -> bool:
+        r = await client.get("/api/v1/items/")
+        return _ok(r)
+
+    async def items_batch(i: int) -> bool:
+        ids = rng.sample(range(1, fx["items"] + 1), min(args.batch_size, fx["items"]))
+        r = await client.get("/api/v1/items:batch", params={"ids": ",".join(map(str, ids))})
+        return _ok(r)
+
+    async def similar_by_image(i: int) -> bool:
+        uid = users[i % len(users)]
+        r = await client.post(
+            "/api/v1/search/similar-by-image?top_k=10",
+            files={"file": ("q.jpg", images[i % len(images)], "image/jpeg")},
+            headers=auth[uid],
+        )
+        return _ok(r)
+
+    async def deduplicate(i: int) -> bool:
+        uid = users[i % len(users)]
+        item_id = rng.choice(fx["embedded"])
+        r = await client.post(f"/api/v1/search/deduplicate?item_id={item_id}&top_k=10", headers=auth[uid])
+        return _ok(r)
+
+    async def list_threads(i: int) -> bool:
+        uid = with_threads[i % len(with_threads)]
+        r = await client.get("/api/v1/chat/threads?limit=50", headers=auth[uid])
+        return _ok(r)
+
+    async def list_messages(i: int) -> bool:
+        uid = with_threads[i % len(with_threads)]
+        thread_id = rng.choice(fx["threads"][uid])
+        r = await client.get(f"/api/v1/chat/threads/{thread_id}/messages?limit=50", headers=auth[uid])
+        return _ok(r)
+
+    async def close_thread(i: int) -> bool:
+        # чётный запрос — подтверждение первой стороны, нечётный — второй (закрывает item)
+        thread_id, low, high = fx["open_threads"][(i // 2) % len(fx["open_threads"])]
+        uid = low if i % 2 == 0 else high
+        r = await client.post(
+            f"/api/v1/chat/threads/{thread_id}/close",
+            headers={"Authorization": f"Bearer {create_access_token(uid)}"},
+        )
+        return _ok(r)
+
+    calls = {
+        "login": login,
+        "list_items": list_items,
+        "items_batch": items_batch,
+        "similar_by_image": similar_by_image,
+        "deduplicate": deduplicate,
+        "list_threads": list_threads,
+        "list_messages": list_messages,
+        "close_thread": close_thread,
+    }
+    skipped = {}
+    if not fx["items"]:
+        skipped.update(items_batch="no items")
+    if not fx["embedded"]:
+        skipped.update(similar_by_image="no embedded items", deduplicate="no embedded items")
+    if not with_threads:
+        skipped.update(list_threads="no threads", list_messages="no threads")
+    if not fx["open_threads"]:
+        skipped.update(close_thread="no threads of open items")
+
+    results = {}
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name in args.scenarios:
+            if name in skipped:
+                results[name] = {"skipped": skipped[name]}
+                continue
+            requests = args.login_requests if name == "login" else args.requests
+            queries_before = _db_queries()
+            results[name] = await harness.run_load(calls[name], requests, args.concurrency)
+            total, count = (a - b for a, b in zip(_db_queries(), queries_before))
+            results[name]["db_queries_per_request"] = round(total / count, 2) if count else None
+
+    params = {
+        "requests": args.requests,
+        "login_requests": args.login_requests,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "hot_users": len(users),
+        "items_in_db": fx["items"],
+        "embedded_sample": len(fx["embedded"]),
+        "embedder": embedder,
+        "vector_store": store_vectors,
+    }
+    return params, results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    harness.add_common_args(ap)
+    ap.add_argument("--scenarios", default=",".join(s for s in SCENARIOS if s not in MUTATING))
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--login-requests", type=int, default=50, help="bcrypt is slow on purpose")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--hot-users", type=int, default=20)
+    ap.add_argument("--batch-size", type=int, default=50, help="ids per items_batch request")
+    ap.add_argument("--fake-embed", action="store_true", help="skip CLIP even if torch is installed")
+    ap.add_argument("--no-vector-store", action="store_true", help="scan Item.embedding instead")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    harness.configure(
+        harness.database_url(args.database_url),
+        VECTOR_STORE_ENABLED=str(not args.no_vector_store).lower(),
+    )
+    params, results = asyncio.run(run(args))
+    harness.emit("api", params, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Bytes on wire and CPU cost of response compression.
+
+    python -m benchmarks.bench_compression --items 500 --messages 200
+
+Два типичных крупных ответа: GET /items/ (список объявлений) и chat:history
+(список сообщений). Для каждого уровня gzip / brotli печатает размер, степень
+сжатия и время сжатия/распаковки (медиана, мс). Отдельно — сквозной замер
+CompressionMiddleware через httpx.ASGITransport (identity vs gzip vs br).
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.responses import orm_json
+from app.core.compression import CompressionMiddleware, brotli
+from app.schemas.items import Item as ItemSchema
+from benchmarks.bench_json import _items
+
+
+def _history(n: int) -> bytes:
+    start = datetime(2026, 1, 1, 12, 0)
+    msgs = [
+        {
+            "id": i + 1,
+            "thread_id": 1,
+            "sender_id": 1 + i % 2,
+            "text": f"Сообщение {i}: нашёл ваши ключи у аудитории 101, могу передать вечером",
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+            "client_id": f"c-{i:08d}",
+        }
+        for i in range(n)
+    ]
+    return json.dumps({"threadId": 1, "messages": msgs}, ensure_ascii=False).encode()
+
+
+def _timed(fn, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return statistics.median(times)
+
+
+def _codecs():
+    for level in (1, 6, 9):
+        yield f"gzip-{level}", (lambda d, l=level: zlib.compress(d, l, wbits=31)), \
+            (lambda d: zlib.decompress(d, wbits=31))
+    if brotli is not None:
+        for quality in (1, 4, 6, 11):
+            yield f"br-{quality}", (lambda d, q=quality: brotli.compress(d, quality=q)), brotli.decompress
+
+
+def codec_table(payload: bytes, runs: int) -> dict:
+    out = {"raw_bytes": len(payload)}
+    for name, compress, decompress in _codecs():
+        blob = compress(payload)
+        out[name] = {
+            "bytes": len(blob),
+            "ratio": round(len(payload) / len(blob), 2),
+            "compress_ms": _timed(lambda: compress(payload), runs),
+            "decompress_ms": _timed(lambda: decompress(blob), runs),
+        }
+    return out
+
+
+async def middleware_e2e(items: list, runs: int) -> dict:
+    app = FastAPI()
+
+    @app.get("/items")
+    async def list_items():
+        return orm_json(List[ItemSchema], items)
+
+    wrapped = CompressionMiddleware(app, minimum_size=1024, gzip_level=6, brotli_quality=4)
+    report = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://b") as c:
+        encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+        for enc in encodings:
+            headers = {"Accept-Encoding": enc}
+            await c.get("/items", headers=headers)
+            times, wire = [], 0
+            for _ in range(runs):
+                t = time.perf_counter()
+                # stream: httpx иначе распакует тело, а нам нужен размер на проводе
+                async with c.stream("GET", "/items", headers=headers) as r:
+                    wire = sum([len(chunk) async for chunk in r.aiter_raw()])
+                times.append((time.perf_counter() - t) * 1000)
+            report[enc] = {"p50_ms": statistics.median(times), "wire_bytes": wire}
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=500)
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+
+    items = _items(args.items)
+    items_json = orm_json(List[ItemSchema], items).body
+
+    report = {
+        "brotli_available": brotli is not None,
+        "items_list": codec_table(items_json, args.runs),
+        "chat_history": codec_table(_history(args.messages), args.runs),
+        "middleware_items_list": asyncio.run(middleware_e2e(items, args.runs)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
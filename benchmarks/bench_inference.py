@@ -0,0 +1,133 @@
+"""CLIP image-encoder backends: latency, throughput and agreement with fp32.
+
+    python -m benchmarks.bench_inference --images 32 --batch 16
+    python -m benchmarks.bench_inference --backends torch torch-int8 --threads 4
+
+Набор картинок фиксированный (synthetic_photo с постоянными seed), поэтому
+цифры сравнимы между запусками. Для каждого бэкенда печатается JSON:
+  load_s          — загрузка модели (для onnx включая экспорт, если графа ещё нет)
+  single_ms       — p50/p95 одной картинки (как attach/similar-by-image)
+  batch_img_s     — картинок/с при батче --batch (как app.ai.reembed)
+  cosine_vs_fp32  — mean/min косинуса с эталонным torch fp32 на тех же картинках
+  top1_agreement  — доля картинок, у которых ближайший сосед в наборе тот же, что в fp32
+Нужен установленный torch/open_clip (и onnxruntime + onnx для onnx).
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.ai import embeddings
+from app.core.config import settings
+from benchmarks.bench_variants import synthetic_photo
+
+
+def _images(n: int, size: int) -> list:
+    return [
+        Image.open(io.BytesIO(synthetic_photo(size, size * 3 // 4, seed))).convert("RGB")
+        for seed in range(n)
+    ]
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _encode_all(clip, images: list, batch: int) -> np.ndarray:
+    import torch
+
+    out = []
+    for i in range(0, len(images), batch):
+        x = torch.stack([clip.preprocess(im) for im in images[i:i + batch]])
+        out.append(clip.encode(x))
+    return np.concatenate(out)
+
+
+def _nearest(vectors: np.ndarray) -> np.ndarray:
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    return sims.argmax(axis=1)
+
+
+def bench_backend(backend: str, images: list, batch: int, repeats: int) -> tuple:
+    started = time.perf_counter()
+    clip = embeddings._load_clip(backend)
+    load_s = time.perf_counter() - started
+
+    import torch
+
+    # прогрев: первый forward всегда медленнее
+    clip.encode(clip.preprocess(images[0]).unsqueeze(0))
+
+    single = []
+    for _ in range(repeats):
+        for im in images:
+            t = time.perf_counter()
+            clip.encode(clip.preprocess(im).unsqueeze(0))
+            single.append((time.perf_counter() - t) * 1000)
+
+    x = torch.stack([clip.preprocess(im) for im in images[:batch]])
+    t = time.perf_counter()
+    for _ in range(repeats):
+        clip.encode(x)
+    batch_img_s = repeats * len(x) / (time.perf_counter() - t)
+
+    vectors = _encode_all(clip, images, batch)
+    report = {
+        "load_s": load_s,
+        "single_ms": {
+            "p50": statistics.median(single),
+            "p95": _percentile(single, 0.95),
+        },
+        "batch_img_s": batch_img_s,
+    }
+    return report, vectors
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=list(embeddings.BACKENDS), choices=embeddings.BACKENDS)
+    ap.add_argument("--images", type=int, default=32)
+    ap.add_argument("--size", type=int, default=640, help="source image width")
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=None, help="override EMBED_THREADS")
+    args = ap.parse_args()
+
+    if args.threads is not None:
+        settings.EMBED_THREADS = args.threads
+
+    images = _images(args.images, args.size)
+
+    # эталон — fp32 torch, с ним сравниваются остальные бэкенды
+    baseline_report, baseline = bench_backend("torch", images, args.batch, args.repeats)
+    baseline_nn = _nearest(baseline)
+
+    results = {}
+    for backend in args.backends:
+        if backend == "torch":
+            report, vectors = baseline_report, baseline
+        else:
+            report, vectors = bench_backend(backend, images, args.batch, args.repeats)
+        cos = (vectors * baseline).sum(axis=1)
+        report["cosine_vs_fp32"] = {"mean": float(cos.mean()), "min": float(cos.min())}
+        report["top1_agreement"] = float((_nearest(vectors) == baseline_nn).mean())
+        results[backend] = report
+
+    print(json.dumps({
+        "model": embeddings.model_version(),
+        "images": args.images,
+        "batch": args.batch,
+        "threads": settings.EMBED_THREADS or "default",
+        "backends": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Large list responses: FastAPI response_model path vs orjson vs app/api/responses.py.
+
+    python -m benchmarks.bench_json --items 2000 --threads 500 --runs 30
+
+Поднимает маленькое FastAPI-приложение с одинаковыми данными, отдаваемыми
+тремя способами, и гоняет запросы через httpx.ASGITransport (без сети):
+  default   — response_model + JSONResponse (как было)
+  orjson    — response_model + ORJSONResponse (default_response_class)
+  direct    — orm_json / typed_json: одна валидация, dump_json сразу в байты
+Проверяет, что JSON у всех вариантов совпадает, и печатает p50/p95 в мс.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.api.responses import orm_json, typed_json
+from app.api.v1.routers.chat import ThreadOut
+from app.db.models.item import Item
+from app.schemas.items import Item as ItemSchema
+
+
+def _items(n: int) -> list:
+    rows = []
+    for i in range(n):
+        sha = f"{i:064x}"
+        variants = {
+            fmt: [
+                {"w": w, "h": w * 3 // 4, "url": f"/media/variants/{sha[:2]}/{sha}/{w}{ext}",
+                 "key": f"variants/{sha[:2]}/{sha}/{w}{ext}"}
+                for w in (64, 320, 960)
+            ]
+            for fmt, ext in (("webp", ".webp"), ("jpeg", ".jpg"))
+        }
+        rows.append(Item(
+            id=i + 1, title=f"Ключи #{i}", type="lost", category="personal",
+            roomId="r-101", roomLabel="Ауд. 101", floorLabel="1 этаж", timeAgo="только что",
+            description="Связка ключей с брелоком " * 3, status="OPEN", owner_id=i % 50 + 1,
+            image_url=f"/media/blobs/{sha[:2]}/{sha[2:4]}/{sha}.jpg", image_variants=variants,
+            embedding_status="READY",
+        ))
+    return rows
+
+
+def _threads(n: int) -> list:
+    return [
+        ThreadOut(
+            id=i + 1, item_id=i + 1, peer_id=i % 50 + 1, item_title=f"Ключи #{i}",
+            item_status="OPEN", item_image_url="/media/x.jpg", item_thumb_url="/media/x64.webp",
+            last_message_at="2026-01-01T12:00:00+00:00", last_message_text="Добрый день! " * 4,
+            peer_online=bool(i % 2),
+        )
+        for i in range(n)
+    ]
+
+
+def build_app(items: list, threads: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/default", response_model=List[ItemSchema], response_class=JSONResponse)
+    async def items_default():
+        return items
+
+    @app.get("/items/orjson", response_model=List[ItemSchema], response_class=ORJSONResponse)
+    async def items_orjson():
+        return items
+
+    @app.get("/items/direct", response_model=List[ItemSchema])
+    async def items_direct():
+        return orm_json(List[ItemSchema], items)
+
+    @app.get("/threads/default", response_model=List[ThreadOut], response_class=JSONResponse)
+    async def threads_default():
+        return threads
+
+    @app.get("/threads/orjson", response_model=List[ThreadOut], response_class=ORJSONResponse)
+    async def threads_orjson():
+        return threads
+
+    @app.get("/threads/direct", response_model=List[ThreadOut])
+    async def threads_direct():
+        return typed_json(List[ThreadOut], threads)
+
+    return app
+
+
+async def _bench(client: httpx.AsyncClient, path: str, runs: int) -> dict:
+    await client.get(path)  # прогрев (TypeAdapter, схемы)
+    times, size = [], 0
+    for _ in range(runs):
+        t = time.perf_counter()
+        r = await client.get(path)
+        times.append((time.perf_counter() - t) * 1000)
+        size = len(r.content)
+    times.sort()
+    return {
+        "p50_ms": statistics.median(times),
+        "p95_ms": times[min(len(times) - 1, int(0.95 * (len(times) - 1)))],
+        "bytes": size,
+    }
+
+
+async def run(n_items: int, n_threads: int, runs: int) -> dict:
+    app = build_app(_items(n_items), _threads(n_threads))
+    transport = httpx.ASGITransport(app=app)
+    report = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for kind in ("items", "threads"):
+            bodies = {}
+            report[kind] = {}
+            for variant in ("default", "orjson", "direct"):
+                path = f"/{kind}/{variant}"
+                bodies[variant] = json.loads((await client.get(path)).content)
+                report[kind][variant] = await _bench(client, path, runs)
+            report[kind]["same_json"] = bodies["default"] == bodies["orjson"] == bodies["direct"]
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=500)
+    ap.add_argument("--runs", type=int, default=30)
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args.items, args.threads, args.runs))
+    print(json.dumps({"items": args.items, "threads": args.threads, "runs": args.runs, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
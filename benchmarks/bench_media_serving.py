@@ -0,0 +1,120 @@
+"""Throughput of /media serving: plain StaticFiles vs. MediaFiles.
+
+    python -m benchmarks.bench_media_serving --files 20 --size 1048576 --requests 500
+
+Оба варианта гоняются in-process через httpx.ASGITransport (чистая стоимость
+Python-стороны, без сети). Сценарии:
+  - full:        полный GET файла
+  - conditional: повторный GET с If-None-Match (ожидаем 304)
+  - range:       GET первых 64 KiB (Range)
+  - x-accel:     MediaFiles в режиме x-accel (байты отдаёт прокси)
+Плюс "repeat_view": сколько запросов/байт уходит на N повторных просмотров,
+если браузер соблюдает Cache-Control (immutable -> 0 запросов).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from hashlib import sha256
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
+
+from app.media.serving import MediaFiles
+
+
+def make_files(root: Path, count: int, size: int) -> list[str]:
+    paths = []
+    for i in range(count):
+        data = os.urandom(size)
+        digest = sha256(data).hexdigest()
+        rel = f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(data)
+        paths.append(rel)
+    return paths
+
+
+async def run_scenario(app, paths, requests: int, headers_for) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etags = {}
+        for p in paths:
+            r = await client.get(f"/media/{p}")
+            etags[p] = r.headers.get("etag")
+
+        sent = 0
+        statuses: dict = {}
+        t0 = time.perf_counter()
+        for i in range(requests):
+            p = paths[i % len(paths)]
+            r = await client.get(f"/media/{p}", headers=headers_for(etags[p]))
+            sent += len(r.content)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+        elapsed = time.perf_counter() - t0
+
+        cache_control = (await client.get(f"/media/{paths[0]}")).headers.get("cache-control")
+
+    return {
+        "req_per_sec": round(requests / elapsed, 1),
+        "mb_per_sec": round(sent / elapsed / 1e6, 2),
+        "statuses": statuses,
+        "cache_control": cache_control,
+    }
+
+
+def repeat_view_cost(cache_control, size: int, views: int) -> dict:
+    # immutable -> браузер не ходит повторно; иначе каждая повторная загрузка
+    # страницы — ревалидация (304 без тела)
+    if cache_control and "immutable" in cache_control:
+        return {"requests": 1, "bytes": size}
+    return {"requests": views, "bytes": size}
+
+
+async def main_async(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        paths = make_files(root, args.files, args.size)
+
+        apps = {
+            "StaticFiles": Starlette(routes=[Mount("/media", StaticFiles(directory=tmp))]),
+            "MediaFiles": Starlette(routes=[Mount("/media", MediaFiles(directory=tmp))]),
+            "MediaFiles[x-accel]": Starlette(routes=[
+                Mount("/media", MediaFiles(directory=tmp, mode="x-accel"))
+            ]),
+        }
+        scenarios = {
+            "full": lambda etag: {},
+            "conditional": lambda etag: {"if-none-match": etag} if etag else {},
+            "range": lambda etag: {"range": "bytes=0-65535"},
+        }
+
+        report: dict = {"files": args.files, "file_size": args.size, "requests": args.requests}
+        for name, app in apps.items():
+            report[name] = {}
+            for scenario, headers_for in scenarios.items():
+                report[name][scenario] = await run_scenario(app, paths, args.requests, headers_for)
+            report[name]["repeat_view"] = repeat_view_cost(
+                report[name]["full"]["cache_control"], args.size, args.views
+            )
+        return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=20)
+    ap.add_argument("--size", type=int, default=1024 * 1024)
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--views", type=int, default=10, help="repeat page views per image")
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Micro-benchmarks of the hot loops behind search and upload.
+
+    python -m benchmarks.bench_micro --sizes 1000,10000,100000 --out micro.json
+    python -m benchmarks.bench_micro --embed-runs 20      # + CLIP, если установлен torch
+
+Без БД и HTTP, чистая стоимость Python/numpy:
+  cosine_loop    — cosine_similarity по одному вектору за раз + heapq (как в search.py);
+  numpy_matrix   — то же одной матрицей (dot + argpartition): нижняя граница скана;
+  json_decode    — разбор JSON-эмбеддингов, как их отдаёт SQLite (часть стоимости скана);
+  phash_bktree   — поиск в BK-дереве (радиус PHASH_MAX_DISTANCE) против линейного перебора;
+  embed          — embed_image_bytes (одна картинка) и embed_image_files (пачка), только с torch.
+"""
+
+import argparse
+import heapq
+import io
+import json
+import random
+
+import numpy as np
+from PIL import Image
+
+from benchmarks import harness
+
+
+def _vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def bench_vectors(n: int, dim: int, top_k: int, runs: int) -> dict:
+    from app.ai.embeddings import cosine_similarity
+
+    matrix = _vectors(n, dim, seed=n)
+    query = _vectors(1, dim, seed=0)[0]
+    as_lists = matrix.tolist()
+    query_list = query.tolist()
+    as_json = [json.dumps(v) for v in as_lists]
+
+    def cosine_loop():
+        scored = [(cosine_similarity(query_list, v), i) for i, v in enumerate(as_lists)]
+        return heapq.nlargest(top_k, scored)
+
+    def numpy_matrix():
+        sims = matrix @ query
+        idx = np.argpartition(-sims, min(top_k, n - 1))[:top_k]
+        return idx[np.argsort(-sims[idx])]
+
+    def json_decode():
+        return [json.loads(s) for s in as_json]
+
+    # в цикле — не больше ~2 с на прогон, иначе 100k+ считается минутами
+    loop_runs = max(1, min(runs, int(2_000_000 / max(n, 1))))
+    return {
+        "cosine_loop": harness.time_sync(cosine_loop, loop_runs, warmup=1),
+        "numpy_matrix": harness.time_sync(numpy_matrix, runs),
+        "json_decode": harness.time_sync(json_decode, loop_runs, warmup=1),
+    }
+
+
+def bench_phash(n: int, queries: int) -> dict:
+    from app.core.config import settings
+    from app.media.phash import BKTree, hamming
+
+    rng = random.Random(n)
+    hashes = [rng.getrandbits(64) for _ in range(n)]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    probes = [hashes[rng.randrange(n)] ^ (1 << rng.randrange(64)) for _ in range(queries)]
+    radius = settings.PHASH_MAX_DISTANCE
+    it = iter(range(10 ** 9))
+
+    def bktree():
+        tree.search(probes[next(it) % queries], radius)
+
+    def linear():
+        q = probes[next(it) % queries]
+        return [(d, i) for i, h in enumerate(hashes) if (d := hamming(q, h)) <= radius]
+
+    return {
+        "bktree": harness.time_sync(bktree, queries),
+        "linear": harness.time_sync(linear, max(1, min(queries, int(1_000_000 / max(n, 1))))),
+    }
+
+
+def bench_embed(runs: int, batch: int) -> dict:
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        return {"skipped": "torch is not installed"}
+
+    import tempfile
+    from pathlib import Path
+
+    from app.ai.embeddings import embed_image_bytes, embed_image_files, warmup
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(batch):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, "JPEG")
+        images.append(buf.getvalue())
+
+    warmup()
+    out = {"single": harness.time_sync(lambda: embed_image_bytes(images[0]), runs)}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, data in enumerate(images):
+            p = Path(tmp) / f"{i}.jpg"
+            p.write_bytes(data)
+            paths.append(p)
+        out[f"batch_{batch}"] = harness.time_sync(lambda: embed_image_files(paths), max(1, runs // 4))
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=None, help="also write the JSON report to this file")
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--phash-queries", type=int, default=200)
+    ap.add_argument("--embed-runs", type=int, default=0, help="0 = skip CLIP")
+    ap.add_argument("--embed-batch", type=int, default=16)
+    args = ap.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    results = {
+        "vector_scan": {str(n): bench_vectors(n, args.dim, args.top_k, args.runs) for n in sizes},
+        "phash": {str(n): bench_phash(n, args.phash_queries) for n in sizes},
+    }
+    if args.embed_runs:
+        results["embed"] = bench_embed(args.embed_runs, args.embed_batch)
+
+    params = {"sizes": sizes, "dim": args.dim, "top_k": args.top_k, "runs": args.runs}
+    harness.emit("micro", params, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
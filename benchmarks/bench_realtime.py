@@ -0,0 +1,205 @@
+"""Socket.IO chat path with real clients against a real uvicorn server.
+
+    python -m benchmarks.seed --reset --threads 2000
+    python -m benchmarks.bench_realtime --pairs 20 --messages 50 --out realtime.json
+
+uvicorn поднимается в отдельном потоке на свободном порту (127.0.0.1),
+клиенты — python-socketio AsyncClient (websocket, нужен aiohttp) под
+участниками тредов из benchmarks.seed. Замеры:
+  connect   — handshake + auth в connect();
+  join      — chat:join -> chat:history;
+  send      — chat:message -> эхо отправителю (сообщение в БД, инбокс обновлён);
+  delivery  — chat:message -> получение собеседником.
+Пары работают параллельно, внутри пары сообщения идут последовательно.
+Rate limits отключены в harness.configure().
+"""
+
+import argparse
+import asyncio
+import contextlib
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks import harness
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Server:
+    def __init__(self, app, port: int) -> None:
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-uvicorn", daemon=True)
+
+    def __enter__(self) -> "_Server":
+        self.thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def _pairs(n: int) -> list:
+    from sqlalchemy import select
+
+    from app.db.database import engine, SessionLocal
+    from app.db.models import ChatThread
+
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(ChatThread.id, ChatThread.user_low_id, ChatThread.user_high_id)
+            .order_by(ChatThread.id)
+            .limit(n)
+        )).all()
+    # соединения пула привязаны к этому event loop'у, а сервер работает в своём
+    await engine.dispose()
+    return [tuple(r) for r in rows]
+
+
+class _Client:
+    def __init__(self, user_id: int, token: str) -> None:
+        import socketio
+
+        self.user_id = user_id
+        self.token = token
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.messages: dict = {}   # clientId -> Future[perf_counter at receipt]
+        self.history: asyncio.Future | None = None
+        self.sio.on("chat:message", self._on_message)
+        self.sio.on("chat:history", self._on_history)
+
+    async def _on_message(self, data) -> None:
+        fut = self.messages.pop((data or {}).get("clientId"), None)
+        if fut is not None and not fut.done():
+            fut.set_result(time.perf_counter())
+
+    async def _on_history(self, data) -> None:
+        if self.history is not None and not self.history.done():
+            self.history.set_result(time.perf_counter())
+
+    def expect(self, client_id: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self.messages[client_id] = fut
+        return fut
+
+
+async def run(args) -> tuple:
+    with contextlib.redirect_stdout(sys.stderr):  # app.main печатает пути при импорте
+        import app.main
+    from app.auth.security import create_access_token
+
+    pairs = await _pairs(args.pairs)
+    if not pairs:
+        raise SystemExit("no chat threads: run `python -m benchmarks.seed --reset` first")
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    timeout = args.timeout
+    stats = {name: {"lat": [], "errors": 0} for name in ("connect", "join", "send", "delivery")}
+
+    def record(name: str, started: float, finished) -> None:
+        if finished is None:
+            stats[name]["errors"] += 1
+        else:
+            stats[name]["lat"].append(finished - started)
+
+    async def wait(fut):
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    clients = []
+    with _Server(app.main.app, port):
+        wall = {}
+        t = time.perf_counter()
+        for thread_id, low, high in pairs:
+            pair = []
+            for uid in (low, high):
+                c = _Client(uid, create_access_token(uid))
+                started = time.perf_counter()
+                try:
+                    await c.sio.connect(url, auth={"token": c.token}, transports=["websocket"],
+                                        wait_timeout=timeout)
+                    record("connect", started, time.perf_counter())
+                except Exception:
+                    record("connect", started, None)
+                    continue
+                pair.append(c)
+            clients.append((thread_id, pair))
+        wall["connect"] = time.perf_counter() - t
+
+        async def join(thread_id: int, c: _Client) -> None:
+            c.history = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            await c.sio.emit("chat:join", {"threadId": thread_id})
+            record("join", started, await wait(c.history))
+
+        t = time.perf_counter()
+        await asyncio.gather(*(join(tid, c) for tid, pair in clients for c in pair))
+        wall["join"] = time.perf_counter() - t
+
+        async def converse(thread_id: int, pair: list) -> None:
+            if len(pair) < 2:
+                return
+            for k in range(args.messages):
+                sender, peer = pair[k % 2], pair[(k + 1) % 2]
+                client_id = uuid.uuid4().hex
+                echo, delivered = sender.expect(client_id), peer.expect(client_id)
+                started = time.perf_counter()
+                await sender.sio.emit("chat:message", {
+                    "threadId": thread_id, "text": f"bench message {k}", "clientId": client_id,
+                })
+                record("send", started, await wait(echo))
+                record("delivery", started, await wait(delivered))
+
+        t = time.perf_counter()
+        await asyncio.gather(*(converse(tid, pair) for tid, pair in clients))
+        wall["send"] = wall["delivery"] = time.perf_counter() - t
+
+        for _, pair in clients:
+            for c in pair:
+                await c.sio.disconnect()
+
+    results = {
+        name: harness.summarize(s["lat"], wall.get(name, 0.0), s["errors"])
+        for name, s in stats.items()
+    }
+    params = {
+        "pairs": len(pairs),
+        "messages_per_pair": args.messages,
+        "sockets": sum(len(p) for _, p in clients),
+        "transport": "websocket",
+    }
+    return params, results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    harness.add_common_args(ap)
+    ap.add_argument("--pairs", type=int, default=20, help="chat threads, two sockets each")
+    ap.add_argument("--messages", type=int, default=50, help="messages per pair")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    args = ap.parse_args()
+
+    harness.configure(harness.database_url(args.database_url))
+    params, results = asyncio.run(run(args))
+    harness.emit("realtime", params, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Cold-start time and idle RSS of the API process.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 3 --eager --warmup
+
+Каждый замер — отдельный свежий процесс на временной SQLite-базе:
+  import  — время `import app.main` и RSS сразу после него;
+  serve   — uvicorn до первого 200 от /api/v1/health/live и от /health/ready.
+--eager импортирует torch/open_clip заранее (как было до ленивой загрузки),
+--warmup дополнительно меряет warmup() модели (нужен установленный torch).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+if {eager}:
+    import torch, open_clip
+import app.main
+out = {{"import_s": time.perf_counter() - t0}}
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+out["rss_mb"] = rss_mb()
+out["torch_loaded"] = "torch" in sys.modules
+if {warmup}:
+    from app.ai.embeddings import warmup
+    t1 = time.perf_counter()
+    warmup()
+    out["warmup_s"] = time.perf_counter() - t1
+    out["rss_after_warmup_mb"] = rss_mb()
+print("RESULT " + json.dumps(out))
+"""
+
+
+def _env(tmp: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite+aiosqlite:///{tmp}/bench.db",
+        MEDIA_DIR=f"{tmp}/media",
+        JOBS_RUN_IN_APP="false",
+    )
+    return env
+
+
+def measure_import(eager: bool, warmup: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        code = CHILD.format(eager=eager, warmup=warmup)
+        res = subprocess.run(
+            [sys.executable, "-c", code], env=_env(tmp),
+            capture_output=True, text=True, check=True,
+        )
+    line = next(l for l in res.stdout.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_200(url: str, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(url)
+
+
+def measure_serve(timeout: float) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env=_env(tmp), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = t0 + timeout
+            live = _wait_200(f"http://127.0.0.1:{port}/api/v1/health/live", deadline)
+            ready = _wait_200(f"http://127.0.0.1:{port}/api/v1/health/ready", deadline)
+        finally:
+            proc.terminate()
+            proc.wait()
+    return {"live_s": live - t0, "ready_s": ready - t0}
+
+
+def _summary(values: list) -> dict:
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--eager", action="store_true", help="import torch/open_clip up front (old behaviour)")
+    ap.add_argument("--warmup", action="store_true", help="also time model warmup (requires torch)")
+    ap.add_argument("--no-serve", action="store_true", help="skip the uvicorn time-to-first-request runs")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    args = ap.parse_args()
+
+    imports = [measure_import(args.eager, args.warmup) for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "eager": args.eager,
+        "torch_loaded_after_import": imports[0]["torch_loaded"],
+        "import_s": _summary([r["import_s"] for r in imports]),
+        "idle_rss_mb": _summary([r["rss_mb"] for r in imports]),
+    }
+    if args.warmup:
+        report["warmup_s"] = _summary([r["warmup_s"] for r in imports])
+        report["rss_after_warmup_mb"] = _summary([r["rss_after_warmup_mb"] for r in imports])
+
+    if not args.no_serve:
+        serves = [measure_serve(args.timeout) for _ in range(args.runs)]
+        report["first_live_s"] = _summary([r["live_s"] for r in serves])
+        report["first_ready_s"] = _summary([r["ready_s"] for r in serves])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Encode time and bytes saved by image variants vs. serving the original.
+
+    python -m benchmarks.bench_variants --images 5 --size 4032x3024
+
+Генерирует "фотоподобные" JPEG (градиент + шум, как с телефона), прогоняет
+render_variants и печатает JSON со временем и размерами по каждой ширине/формату.
+"""
+
+import argparse
+import io
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.media.variants import VARIANT_FORMATS, render_variants
+
+
+def synthetic_photo(width: int, height: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / (width / 3) + seed),
+        128 + 100 * np.cos(y / (height / 4)),
+        128 + 60 * np.sin((x + y) / (width / 5)),
+    ], axis=-1)
+    noisy = np.clip(base + rng.normal(0, 18, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(noisy, "RGB").save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=5)
+    ap.add_argument("--size", default="4032x3024")
+    ap.add_argument("--widths", default="64,320,960")
+    args = ap.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    widths = [int(w) for w in args.widths.split(",")]
+
+    timings = []
+    original_bytes = []
+    variant_bytes = {fmt: {w: [] for w in widths} for fmt in VARIANT_FORMATS}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for i in range(args.images):
+            src = root / f"img{i}.jpg"
+            src.write_bytes(synthetic_photo(width, height, seed=i))
+            original_bytes.append(src.stat().st_size)
+
+            out_dir = root / f"img{i}"
+            t0 = time.perf_counter()
+            render_variants(src, out_dir, widths)
+            timings.append(time.perf_counter() - t0)
+
+            for fmt, (_, ext) in VARIANT_FORMATS.items():
+                for w in widths:
+                    path = out_dir / f"{w}{ext}"
+                    if path.exists():
+                        variant_bytes[fmt][w].append(path.stat().st_size)
+
+    orig_mean = statistics.mean(original_bytes)
+    report = {
+        "images": args.images,
+        "source_size": args.size,
+        "original_bytes_mean": round(orig_mean),
+        "encode_seconds_per_image": {
+            "mean": round(statistics.mean(timings), 4),
+            "max": round(max(timings), 4),
+        },
+        "variants": {
+            fmt: {
+                str(w): {
+                    "bytes_mean": round(statistics.mean(sizes)),
+                    "saved_vs_original_pct": round(100 * (1 - statistics.mean(sizes) / orig_mean), 2),
+                }
+                for w, sizes in per_w.items() if sizes
+            }
+            for fmt, per_w in variant_bytes.items()
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare two benchmark reports (harness.emit --out) and flag latency regressions.
+
+    python -m benchmarks.compare baseline.json current.json --metric p95_ms --threshold 0.10
+
+Сравниваются все замеры с одинаковым путём (results.list_items, results.vector_scan.10000.cosine_loop, ...).
+Код возврата 1, если хоть один вырос больше чем на --threshold — годится для CI.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _leaves(node, path=()):
+    """Yield (path, stats) for every dict that looks like harness.summarize() output."""
+    if isinstance(node, dict):
+        if "p50_ms" in node:
+            yield ".".join(path), node
+            return
+        for key, value in node.items():
+            yield from _leaves(value, path + (str(key),))
+
+
+def compare(old: dict, new: dict, metric: str, threshold: float) -> tuple:
+    before = dict(_leaves(old.get("results", {})))
+    rows, regressions = [], 0
+    for path, stats in _leaves(new.get("results", {})):
+        if path not in before or metric not in stats:
+            continue
+        a, b = before[path][metric], stats[metric]
+        change = (b - a) / a if a else 0.0
+        flag = "REGRESSION" if change > threshold else ("faster" if change < -threshold else "")
+        regressions += flag == "REGRESSION"
+        rows.append((path, a, b, change, flag))
+    return rows, regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("baseline")
+    ap.add_argument("current")
+    ap.add_argument("--metric", default="p95_ms")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change, 0.10 = 10%%")
+    args = ap.parse_args()
+
+    old = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    rows, regressions = compare(old, new, args.metric, args.threshold)
+
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"{'benchmark':<{width}}  {'before':>10}  {'after':>10}  {'change':>8}")
+    for path, a, b, change, flag in rows:
+        print(f"{path:<{width}}  {a:>10.3f}  {b:>10.3f}  {change:>+8.1%}  {flag}")
+    print(f"{old.get('env', {}).get('commit')} -> {new.get('env', {}).get('commit')}: "
+          f"{regressions} regression(s) in {args.metric} over {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
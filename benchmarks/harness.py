@@ -0,0 +1,173 @@
+"""Shared pieces of the benchmark suite: environment, load loop, percentiles, JSON output.
+
+Порядок важен: `configure()` выставляет переменные окружения ДО первого
+импорта `app.*` (Settings читаются при импорте app.core.config), поэтому
+bench_api / bench_realtime / seed импортируют приложение внутри функций.
+"""
+
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+DEFAULT_DB = Path(tempfile.gettempdir()) / "lostfound-bench.db"
+PASSWORD = "bench-password"
+
+
+def database_url(value: Optional[str]) -> str:
+    """--database-url, else $DATABASE_URL, else a SQLite file in the temp dir."""
+    if value:
+        return value
+    return os.environ.get("DATABASE_URL") or f"sqlite+aiosqlite:///{DEFAULT_DB.as_posix()}"
+
+
+def configure(url: str, **overrides: str) -> None:
+    """Point the app at the benchmark database; quiet logs, no in-app worker, no rate limits."""
+    if "app.core.config" in sys.modules:
+        raise RuntimeError("benchmarks.harness.configure() must run before importing app.*")
+    env = {
+        "DATABASE_URL": url,
+        "MEDIA_DIR": str(Path(tempfile.gettempdir()) / "lostfound-bench-media"),
+        "DATA_DIR": str(Path(tempfile.gettempdir()) / "lostfound-bench-data"),
+        "DB_ECHO": "false",
+        "JOBS_RUN_IN_APP": "false",
+        "SLOW_QUERY_MS": "0",
+        "SLOW_REQUEST_MS": "0",
+        "PROFILE_SAMPLE_RATE": "0",
+        # меряем сервер, а не token bucket
+        "SIO_MESSAGE_RATE": "1000000",
+        "SIO_MESSAGE_BURST": "1000000",
+        "SIO_JOIN_RATE": "1000000",
+        "SIO_JOIN_BURST": "1000000",
+    }
+    env.update(overrides)
+    os.environ.update(env)
+
+
+# --- statistics -------------------------------------------------------------------
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list, wall_seconds: float, errors: int = 0) -> dict:
+    """Latencies in seconds -> p50/p95/p99/mean/max (ms) and throughput."""
+    ms = sorted(x * 1000 for x in latencies)
+    n = len(ms)
+    return {
+        "n": n,
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / n, 3) if n else 0.0,
+        "max_ms": round(ms[-1], 3) if n else 0.0,
+        "throughput_rps": round(n / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+    }
+
+
+async def run_load(
+    call: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int = 1,
+    warmup: int = 3,
+) -> dict:
+    """Run `call(i)` `requests` times over `concurrency` workers.
+
+    call возвращает True при успехе; False или исключение — ошибка (в
+    перцентили не входит, первое исключение попадает в отчёт). Прогрев не учитывается.
+    """
+    for i in range(warmup):
+        try:
+            await call(i)
+        except Exception:
+            pass
+
+    latencies: list = []
+    errors = 0
+    first_error = None
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors, first_error
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception as exc:
+                ok = False
+                first_error = first_error or f"{type(exc).__name__}: {exc}"[:500]
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    report = summarize(latencies, time.perf_counter() - started, errors)
+    if first_error:
+        report["first_error"] = first_error
+    return report
+
+
+def time_sync(fn: Callable[[], object], runs: int, warmup: int = 2) -> dict:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# --- output -----------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def emit(name: str, params: dict, results: dict, out: Optional[str] = None) -> dict:
+    """Print the report as JSON and optionally write it to `out` (for benchmarks.compare)."""
+    report = {"benchmark": name, "env": environment(), "params": params, "results": results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if out:
+        Path(out).write_text(text + "\n", encoding="utf-8")
+    return report
+
+
+def add_common_args(ap) -> None:
+    ap.add_argument("--database-url", default=None,
+                    help="default: $DATABASE_URL or SQLite in the temp dir (see benchmarks.seed)")
+    ap.add_argument("--out", default=None, help="also write the JSON report to this file")
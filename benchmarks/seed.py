@@ -0,0 +1,198 @@
+"""Synthetic data for the benchmark suite: users, items with embeddings, chat threads.
+
+    python -m benchmarks.seed --reset --users 500 --items 10000 --threads 2000 --messages 20
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.seed --reset --items 1000000
+
+Пишет в --database-url / $DATABASE_URL (по умолчанию SQLite во временной
+папке — её же читают bench_api и bench_realtime). Данные детерминированы
+(--seed), вставка пачками через Core executemany, схема — init_db().
+У всех пользователей пароль harness.PASSWORD, e-mail bench{id}@example.com.
+Собеседники в чатах берутся из первых --hot-users пользователей, чтобы у
+аккаунтов, под которыми ходят бенчмарки, были "живые" инбоксы.
+
+На 1M объявлений основной объём — JSON-эмбеддинги (~5 ГБ при dim=512 в SQLite).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks import harness
+
+CATEGORIES = ("personal", "electronics", "documents", "clothes")
+TITLES = ("Ключи", "Студенческий", "Наушники", "Зонт", "Кошелёк", "Ноутбук", "Шарф", "Бутылка")
+EMBED_DIM = 512
+
+
+def unit_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+async def _insert(conn, table, rows: list, chunk: int) -> None:
+    from sqlalchemy import insert
+
+    for i in range(0, len(rows), chunk):
+        await conn.execute(insert(table), rows[i:i + chunk])
+
+
+async def seed(args) -> dict:
+    from sqlalchemy import func, select
+
+    from app.ai.embeddings import model_version
+    from app.auth.passwords import hash_password
+    from app.db.database import Base, SessionLocal, engine
+    from app.db.init_db import init_db
+    from app.db.models import ChatMessage, ChatThread, Item, User
+    from app.services import thread_inbox
+
+    if args.reset:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+
+    async with SessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(User)):
+            raise SystemExit("database is not empty; rerun with --reset")
+
+    rng = random.Random(args.seed)
+    nrng = np.random.default_rng(args.seed)
+    timings = {}
+    start = datetime(2026, 1, 1, 9, 0)
+    now = datetime.utcnow()  # возраст item считается от запуска, иначе фильтры/expire бессмысленны
+    hashed = hash_password(harness.PASSWORD)  # bcrypt один раз, не на каждого
+
+    t = time.perf_counter()
+    users = [
+        {"id": i, "email": f"bench{i}@example.com", "hashed_password": hashed,
+         "name": f"User{i}", "surname": "Bench"}
+        for i in range(1, args.users + 1)
+    ]
+    async with engine.begin() as conn:
+        await _insert(conn, User.__table__, users, args.chunk)
+    timings["users_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    version = model_version()
+    owners = {}
+    for lo in range(0, args.items, args.chunk):
+        n = min(args.chunk, args.items - lo)
+        vectors = unit_vectors(nrng, n, args.dim)
+        with_images, without = [], []
+        for j in range(n):
+            item_id = lo + j + 1
+            owner = rng.randint(1, args.users)
+            owners[item_id] = owner
+            with_image = rng.random() < args.embedded
+            created_at = now - timedelta(minutes=rng.randint(0, int(args.item_days * 24 * 60)))
+            sha = f"{rng.getrandbits(256):064x}"
+            row = {
+                "id": item_id,
+                "title": f"{rng.choice(TITLES)} #{item_id}",
+                "type": rng.choice(("lost", "found")),
+                "status": "CLOSED" if rng.random() < 0.1 else "OPEN",
+                "category": rng.choice(CATEGORIES),
+                "roomId": f"r-{rng.randint(100, 499)}",
+                "roomLabel": f"Ауд. {rng.randint(100, 499)}",
+                "floorLabel": f"{rng.randint(1, 4)} этаж",
+                "description": "Синтетическое объявление для бенчмарка " * 2,
+                "owner_id": owner,
+                # возраст объявлений — равномерно за --item-days (фильтры по времени, expire)
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+            if with_image:
+                row.update(
+                    image_url=f"/media/blobs/{sha[:2]}/{sha[2:4]}/{sha}.jpg",
+                    image_sha256=sha,
+                    phash=f"{rng.getrandbits(64):016x}",
+                    embedding=vectors[j].tolist(),
+                    embedding_status="READY",
+                    embedding_model=version,
+                )
+                with_images.append(row)
+            else:
+                without.append(row)
+        # разные наборы ключей: None в JSON-колонке записался бы как 'null', а не SQL NULL
+        async with engine.begin() as conn:
+            await _insert(conn, Item.__table__, with_images, args.chunk)
+            await _insert(conn, Item.__table__, without, args.chunk)
+    timings["items_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    hot = max(2, min(args.hot_users, args.users))
+    pairs = set()
+    threads, messages = [], []
+    attempts = 0
+    while len(threads) < args.threads and attempts < args.threads * 10 and args.items:
+        attempts += 1
+        item_id = rng.randint(1, args.items)
+        owner = owners[item_id]
+        peer = rng.randint(1, hot)
+        if peer == owner:
+            continue
+        low, high = min(owner, peer), max(owner, peer)
+        if (item_id, low, high) in pairs:
+            continue
+        pairs.add((item_id, low, high))
+        thread_id = len(threads) + 1
+        created = start + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        at, text = None, None
+        for k in range(args.messages):
+            at = created + timedelta(seconds=30 * (k + 1))
+            text = f"Сообщение {k}: это моя вещь, могу забрать сегодня"
+            messages.append({
+                "thread_id": thread_id, "sender_id": (low, high)[k % 2], "text": text,
+                "created_at": at, "client_id": f"seed-{thread_id}-{k}",
+            })
+        threads.append({
+            "id": thread_id, "item_id": item_id, "user_low_id": low, "user_high_id": high,
+            "created_at": created, "last_message_at": at, "last_message_text": text,
+            "close_low_confirmed": False, "close_high_confirmed": False,
+        })
+    async with engine.begin() as conn:
+        await _insert(conn, ChatThread.__table__, threads, args.chunk)
+        await _insert(conn, ChatMessage.__table__, messages, args.chunk)
+    async with SessionLocal() as db:
+        await thread_inbox.backfill(db)
+    timings["chat_s"] = time.perf_counter() - t
+
+    return {
+        "users": len(users),
+        "items": args.items,
+        "threads": len(threads),
+        "messages": len(messages),
+        "embedding_dim": args.dim,
+        "seconds": {k: round(v, 2) for k, v in timings.items()},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--database-url", default=None)
+    ap.add_argument("--reset", action="store_true", help="drop all tables first")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--items", type=int, default=10_000)
+    ap.add_argument("--threads", type=int, default=2_000)
+    ap.add_argument("--messages", type=int, default=20, help="messages per thread")
+    ap.add_argument("--embedded", type=float, default=0.8, help="share of items with image + embedding")
+    ap.add_argument("--dim", type=int, default=EMBED_DIM)
+    ap.add_argument("--item-days", type=float, default=60, help="items are spread over this many days")
+    ap.add_argument("--hot-users", type=int, default=20)
+    ap.add_argument("--chunk", type=int, default=5_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    url = harness.database_url(args.database_url)
+    harness.configure(url)
+    report = asyncio.run(seed(args))
+    print(json.dumps({"database_url": url, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
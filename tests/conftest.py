@@ -0,0 +1,45 @@
+"""Shared test setup: throwaway SQLite DB / media / data dirs, no in-app job worker.
+
+Переменные окружения выставляются до первого импорта app.*: settings и
+движок БД создаются при импорте.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+_TMP = Path(tempfile.mkdtemp(prefix="lostfound-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{(_TMP / 'test.db').as_posix()}"
+os.environ["MEDIA_DIR"] = str(_TMP / "media")
+os.environ["DATA_DIR"] = str(_TMP / "data")
+os.environ["JOBS_RUN_IN_APP"] = "false"
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+def run(coro):
+    """Run a coroutine on a fresh loop; pooled aiosqlite connections are bound to it."""
+    from app.db.database import engine
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    from app.db.init_db import init_db
+
+    run(init_db())
@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.database import Base
+from app.db.init_db import _autoincrement_chat_threads
+from app.db.models.chat_thread import ChatThread
+
+
+def _legacy_db(path):
+    """Schema as created before chat_threads got AUTOINCREMENT."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        ddl = conn.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'chat_threads'"))
+        conn.execute(text("DROP TABLE chat_threads"))
+        conn.execute(text(ddl.replace("AUTOINCREMENT", "")))
+        for index in ChatThread.__table__.indexes:
+            index.create(conn)
+    return engine
+
+
+def test_legacy_chat_threads_is_rebuilt_and_never_reuses_archived_ids(tmp_path):
+    engine = _legacy_db(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO chat_threads (id, item_id, user_low_id, user_high_id, created_at, "
+            "close_low_confirmed, close_high_confirmed) VALUES (5, 1, 1, 2, '2024-01-01', 0, 0)"
+        ))
+        # тред 9 уже в архиве и удалён из chat_threads
+        conn.execute(text(
+            "INSERT INTO chat_thread_archives (thread_id, item_id, user_low_id, user_high_id, "
+            "close_low_confirmed, close_high_confirmed, archived_at, message_count, codec, messages) "
+            "VALUES (9, 1, 1, 3, 1, 1, '2024-01-01', 0, 'json+zlib', x'')"
+        ))
+
+        _autoincrement_chat_threads(conn)
+        _autoincrement_chat_threads(conn)  # повторный запуск ничего не ломает
+
+        ddl = conn.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'chat_threads'"))
+        assert "AUTOINCREMENT" in ddl.upper()
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("chat_threads")}
+        assert {ix.name for ix in ChatThread.__table__.indexes} <= indexes
+        assert conn.scalar(text("SELECT item_id FROM chat_threads WHERE id = 5")) == 1
+
+        conn.execute(text("DELETE FROM chat_threads WHERE id = 5"))
+        conn.execute(text(
+            "INSERT INTO chat_threads (item_id, user_low_id, user_high_id, created_at, "
+            "close_low_confirmed, close_high_confirmed) VALUES (2, 1, 2, '2024-01-02', 0, 0)"
+        ))
+        assert conn.scalar(text("SELECT max(id) FROM chat_threads")) == 10
+    engine.dispose()
+
+
+def test_legacy_chat_threads_is_left_alone_while_archiving_is_off(tmp_path, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 0)
+    engine = _legacy_db(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        _autoincrement_chat_threads(conn)
+        ddl = conn.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'chat_threads'"))
+        assert "AUTOINCREMENT" not in ddl.upper()
+
+        monkeypatch.setattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 30)
+        _autoincrement_chat_threads(conn)
+        ddl = conn.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'chat_threads'"))
+        assert "AUTOINCREMENT" in ddl.upper()
+    engine.dispose()
@@ -0,0 +1,39 @@
+import uuid
+
+import httpx
+
+from conftest import run
+
+
+async def _login(c: httpx.AsyncClient) -> tuple[dict, int]:
+    creds = {"email": f"{uuid.uuid4().hex}@example.com", "password": "secret"}
+    r = await c.post("/api/v1/auth/register", json={**creds, "name": "T", "surname": "T"})
+    token = (await c.post("/api/v1/auth/login", json=creds)).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, r.json()["id"]
+
+
+def test_list_threads_returns_everything_unless_paging_is_requested():
+    from app.main import app
+
+    async def body():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            owner, _ = await _login(c)
+            for n in range(3):
+                _, peer_id = await _login(c)
+                r = await c.post("/api/v1/items/", headers=owner, json={
+                    "title": f"item {n}", "type": "lost", "category": "personal", "roomId": "r1",
+                    "roomLabel": "R1", "floorLabel": "1", "description": "d",
+                })
+                await c.post("/api/v1/chat/thread", headers=owner, json={"item_id": r.json()["id"], "peer_id": peer_id})
+
+            everything = await c.get("/api/v1/chat/threads", headers=owner)
+            first = await c.get("/api/v1/chat/threads?limit=2", headers=owner)
+            cursor = first.headers["X-Next-Cursor"]
+            rest = await c.get("/api/v1/chat/threads", params={"cursor": cursor}, headers=owner)
+
+        assert len(everything.json()) == 3 and "X-Next-Cursor" not in everything.headers
+        assert [t["id"] for t in first.json() + rest.json()] == [t["id"] for t in everything.json()]
+        assert "X-Next-Cursor" not in rest.headers
+
+    run(body())
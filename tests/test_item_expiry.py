@@ -0,0 +1,62 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.user import User
+from app.services import item_expiry, item_status
+
+from conftest import run
+
+
+async def _old_items(n: int) -> list[int]:
+    async with SessionLocal() as db:
+        user = User(email=f"{uuid.uuid4().hex}@test", hashed_password="x", name="T", surname="T")
+        db.add(user)
+        await db.flush()
+        created = datetime.utcnow() - timedelta(days=400)
+        items = [
+            Item(
+                title="old", type="lost", status="OPEN", category="personal", roomId="r",
+                roomLabel="r", floorLabel="1", description="", owner_id=user.id, created_at=created,
+            )
+            for _ in range(n)
+        ]
+        db.add_all(items)
+        await db.commit()
+        return [it.id for it in items]
+
+
+def test_expiry_is_off_by_default():
+    assert settings.ITEM_EXPIRE_DAYS == 0
+    assert run(item_expiry.expire_items()) == 0
+
+
+def test_expiry_continues_after_a_batch_lost_to_a_race(monkeypatch):
+    ids = run(_old_items(5))
+    real = item_status.transition_many
+    calls = []
+
+    async def first_batch_races(db, item_ids, target, expected=None):
+        calls.append(list(item_ids))
+        if len(calls) == 1:
+            # владелец успел закрыть эти item сам: условный UPDATE ничего не меняет
+            await real(db, item_ids, target, expected)
+            return []
+        return await real(db, item_ids, target, expected)
+
+    monkeypatch.setattr(item_status, "transition_many", first_batch_races)
+
+    async def body():
+        closed = await item_expiry.expire_items(days=365, batch=2)
+        async with SessionLocal() as db:
+            statuses = list(await db.scalars(select(Item.status).where(Item.id.in_(ids))))
+        return closed, statuses
+
+    closed, statuses = run(body())
+    assert len(calls) >= 3
+    assert statuses == ["CLOSED"] * 5
+    assert closed >= 3
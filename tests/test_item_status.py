@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app.db.database import SessionLocal
+from app.db.models.chat_thread import ChatThread
+from app.db.models.item import Item
+from app.db.models.item_change import ItemChange
+from app.db.models.thread_inbox import ThreadInbox
+
+from conftest import run
+
+
+def _client() -> httpx.AsyncClient:
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _login(c: httpx.AsyncClient) -> tuple[dict, int]:
+    creds = {"email": f"{uuid.uuid4().hex}@example.com", "password": "secret"}
+    r = await c.post("/api/v1/auth/register", json={**creds, "name": "T", "surname": "T"})
+    token = (await c.post("/api/v1/auth/login", json=creds)).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, r.json()["id"]
+
+
+async def _item_with_thread(c: httpx.AsyncClient):
+    """Owner's item taken IN_PROGRESS by a chat with a finder."""
+    owner, _ = await _login(c)
+    finder, finder_id = await _login(c)
+    r = await c.post("/api/v1/items/", headers=owner, json={
+        "title": "keys", "type": "lost", "category": "personal", "roomId": "r1",
+        "roomLabel": "R1", "floorLabel": "1", "description": "d",
+    })
+    item_id = r.json()["id"]
+    r = await c.post("/api/v1/chat/thread", headers=owner, json={"item_id": item_id, "peer_id": finder_id})
+    assert r.json()["item_status"] == "IN_PROGRESS"
+    return owner, finder, item_id, r.json()["id"]
+
+
+async def _changes(item_id: int) -> int:
+    async with SessionLocal() as db:
+        return await db.scalar(select(func.count()).where(ItemChange.item_id == item_id))
+
+
+def test_owner_cannot_set_in_progress():
+    async def body():
+        async with _client() as c:
+            owner, _ = await _login(c)
+            r = await c.post("/api/v1/items/", headers=owner, json={
+                "title": "bag", "type": "found", "category": "clothes", "roomId": "r2",
+                "roomLabel": "R2", "floorLabel": "2", "description": "d",
+            })
+            r = await c.patch(f"/api/v1/items/{r.json()['id']}", headers=owner, json={"status": "IN_PROGRESS"})
+        assert r.status_code == 422
+
+    run(body())
+
+
+def test_status_and_fields_in_one_patch_record_one_change():
+    async def body():
+        async with _client() as c:
+            owner, _, item_id, _ = await _item_with_thread(c)
+            before = await _changes(item_id)
+            r = await c.patch(f"/api/v1/items/{item_id}", headers=owner, json={"status": "OPEN", "title": "red keys"})
+        assert r.status_code == 200 and r.json()["status"] == "OPEN"
+        assert await _changes(item_id) == before + 1
+
+    run(body())
+
+
+@pytest.mark.parametrize("patch_status", ["CLOSED", "OPEN"])
+def test_concurrent_close_confirmations_and_owner_patch(patch_status):
+    async def body():
+        async with _client() as c:
+            owner, finder, item_id, thread_id = await _item_with_thread(c)
+            before = await _changes(item_id)
+            close = f"/api/v1/chat/threads/{thread_id}/close"
+            r_owner, r_finder, r_patch = await asyncio.gather(
+                c.post(close, headers=owner),
+                c.post(close, headers=finder),
+                c.patch(f"/api/v1/items/{item_id}", headers=owner, json={"status": patch_status}),
+            )
+        assert r_owner.status_code == r_finder.status_code == 200
+        assert r_patch.status_code in (200, 409)
+
+        async with SessionLocal() as db:
+            thread = await db.get(ChatThread, thread_id)
+            item = await db.get(Item, item_id)
+            inbox = list(await db.scalars(select(ThreadInbox).where(ThreadInbox.item_id == item_id)))
+            changes = await _changes(item_id)
+
+        assert thread.close_low_confirmed and thread.close_high_confirmed
+        if patch_status == "CLOSED" or r_patch.status_code == 409:
+            # PATCH либо закрыл сам, либо проиграл закрытию тредом
+            assert item.status == "CLOSED"
+        assert (item.closed_at is not None) == (item.status == "CLOSED")
+        assert inbox and all(row.item_status == item.status for row in inbox)
+        assert all(row.is_closed == (item.status == "CLOSED") for row in inbox)
+        # по одной записи item_changes на применённый переход: CLOSED ставится
+        # ровно один раз, OPEN от владельца (200) — ещё один переход
+        expected = 1 if patch_status == "CLOSED" else 1 + (r_patch.status_code == 200)
+        assert changes - before == expected
+
+    run(body())
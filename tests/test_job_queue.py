@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.job import Job
+from app.jobs import queue
+
+from conftest import run
+
+
+async def _expired_job(kind: str, attempts: int, max_attempts: int) -> int:
+    async with SessionLocal() as db:
+        job = await queue.enqueue(db, kind, {}, max_attempts=max_attempts)
+        await db.execute(
+            update(Job)
+            .where(Job.id == job.id)
+            .values(
+                status=queue.RUNNING,
+                attempts=attempts,
+                worker_id="dead",
+                lease_until=datetime.utcnow() - timedelta(seconds=1),
+            )
+        )
+        await db.commit()
+        return job.id
+
+
+def test_expired_lease_is_reclaimed_while_attempts_remain():
+    async def body():
+        job_id = await _expired_job("test-retry", attempts=1, max_attempts=3)
+        async with SessionLocal() as db:
+            assert await queue.reap_expired(db) == []
+            claimed = await queue.claim(db, "w1", 5, kinds=["test-retry"])
+        assert [j.id for j in claimed] == [job_id]
+        assert claimed[0].attempts == 2
+
+    run(body())
+
+
+def test_exhausted_expired_lease_is_failed_not_reclaimed():
+    async def body():
+        job_id = await _expired_job("test-exhausted", attempts=3, max_attempts=3)
+        async with SessionLocal() as db:
+            assert await queue.claim(db, "w1", 5, kinds=["test-exhausted"]) == []
+            reaped = await queue.reap_expired(db)
+            assert [j.id for j in reaped] == [job_id]
+            assert await queue.reap_expired(db) == []
+            job = await db.get(Job, job_id)
+        assert job.status == queue.FAILED
+        assert job.lease_until is None and job.finished_at is not None
+        assert "lease expired" in job.last_error
+
+    run(body())
+
+
+def _slow_job(kind: str, seconds: float, log: list):
+    from app.jobs.handlers import HANDLERS
+
+    async def handler(payload: dict) -> None:
+        try:
+            await asyncio.sleep(seconds)
+            log.append("done")
+        except asyncio.CancelledError:
+            log.append("cancelled")
+            raise
+
+    HANDLERS[kind] = handler
+
+
+def test_heartbeat_keeps_a_long_job_leased(monkeypatch):
+    from app.jobs.handlers import HANDLERS
+    from app.jobs.worker import Worker
+
+    monkeypatch.setattr(settings, "JOBS_LEASE_SECONDS", 1)
+    log: list = []
+    _slow_job("test-slow", 1.6, log)
+    worker = Worker(worker_id="w-slow")
+
+    async def body():
+        async with SessionLocal() as db:
+            job = await queue.enqueue(db, "test-slow", {})
+            await db.commit()
+            (job,) = await queue.claim(db, worker.worker_id, 1, kinds=["test-slow"])
+        run_ = asyncio.ensure_future(worker._execute(job))
+        await asyncio.sleep(1.2)  # исходная аренда уже истекла бы
+        async with SessionLocal() as db:
+            stolen = await queue.claim(db, "w-other", 1, kinds=["test-slow"])
+        await run_
+        async with SessionLocal() as db:
+            return stolen, await db.get(Job, job.id)
+
+    try:
+        stolen, job = run(body())
+    finally:
+        HANDLERS.pop("test-slow")
+    assert stolen == [] and log == ["done"]
+    assert job.status == queue.DONE
+
+
+def test_handler_is_cancelled_when_the_lease_is_lost(monkeypatch):
+    from app.jobs.handlers import HANDLERS
+    from app.jobs.worker import Worker
+
+    monkeypatch.setattr(settings, "JOBS_LEASE_SECONDS", 1)
+    log: list = []
+    _slow_job("test-stolen", 5, log)
+    worker = Worker(worker_id="w-stolen")
+
+    async def body():
+        async with SessionLocal() as db:
+            job = await queue.enqueue(db, "test-stolen", {})
+            await db.commit()
+            (job,) = await queue.claim(db, worker.worker_id, 1, kinds=["test-stolen"])
+            # аренду перехватил другой воркер (например, после паузы процесса)
+            await db.execute(update(Job).where(Job.id == job.id).values(worker_id="w-other"))
+            await db.commit()
+        await asyncio.wait_for(worker._execute(job), 3)
+        async with SessionLocal() as db:
+            return await db.get(Job, job.id)
+
+    try:
+        job = run(body())
+    finally:
+        HANDLERS.pop("test-stolen")
+    assert log == ["cancelled"]
+    assert job.status == queue.RUNNING and job.worker_id == "w-other"
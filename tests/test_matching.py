@@ -0,0 +1,103 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app.ai import vector_store
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.item_match import ItemMatch
+from app.db.models.user import User
+from app.services import matching
+
+from conftest import run
+
+MODEL = "test/matching"
+
+
+async def _user(db) -> int:
+    user = User(email=f"{uuid.uuid4().hex}@test", hashed_password="x", name="T", surname="T")
+    db.add(user)
+    await db.flush()
+    return user.id
+
+
+async def _item(db, owner_id: int, type_: str, category: str, embedding) -> Item:
+    item = Item(
+        title=type_, type=type_, status="OPEN", category=category,
+        roomId="101", roomLabel="101", floorLabel="1", description="",
+        embedding=embedding, embedding_status="READY", embedding_model=MODEL,
+        owner_id=owner_id,
+    )
+    db.add(item)
+    await db.flush()
+    return item
+
+
+def _setup(category: str, indexed: bool):
+    async def body():
+        async with SessionLocal() as db:
+            lost = await _item(db, await _user(db), "lost", category, [1.0, 0.0, 0.1])
+            found = await _item(db, await _user(db), "found", category, [1.0, 0.05, 0.0])
+            await db.commit()
+            ids = lost.id, found.id
+            rows = [(lost.id, lost.owner_id, lost.embedding), (found.id, found.owner_id, found.embedding)]
+        if indexed:
+            await vector_store.index_items(rows, MODEL)
+        return ids
+
+    return body()
+
+
+def test_match_pair_from_both_sides_upserts_one_row():
+    lost_id, found_id = run(_setup("keys", indexed=True))
+
+    assert vector_store.current_view(MODEL) is not None
+
+    async def body():
+        async with SessionLocal() as db:
+            created = await matching.match_item(db, lost_id)
+            # вторая сторона в той же транзакции: тот же uq_item_match_pair
+            again = await matching.match_item(db, found_id)
+            await db.commit()
+            pairs = list(await db.scalars(select(ItemMatch).where(ItemMatch.lost_item_id == lost_id)))
+        assert [(m.lost_item_id, m.found_item_id) for m in created] == [(lost_id, found_id)]
+        assert [m.id for m in again] == [created[0].id]
+        assert len(pairs) == 1 and pairs[0].similarity > 0.99
+
+    run(body())
+
+
+def test_candidates_missing_from_the_index_are_scored_from_the_db():
+    lost_id, found_id = run(_setup("wallets", indexed=False))
+
+    async def body():
+        async with SessionLocal() as db:
+            created = await matching.match_item(db, lost_id)
+            await db.commit()
+        assert [m.found_item_id for m in created] == [found_id]
+
+    run(body())
+
+
+def test_sweep_skips_matched_items_until_they_change():
+    lost_id, found_id = run(_setup("umbrellas", indexed=True))
+
+    async def body():
+        async with SessionLocal() as db:
+            assert {lost_id, found_id} <= set(await matching.unmatched_items(db, 10_000))
+            await matching.match_item(db, lost_id)
+            await matching.match_item(db, found_id)
+            await db.commit()
+            assert not {lost_id, found_id} & set(await matching.unmatched_items(db, 10_000))
+
+            await db.execute(
+                update(Item)
+                .where(Item.id == found_id)
+                .values(updated_at=datetime.utcnow() + timedelta(seconds=1))
+            )
+            await db.commit()
+            pending = set(await matching.unmatched_items(db, 10_000))
+        assert found_id in pending and lost_id not in pending
+
+    run(body())
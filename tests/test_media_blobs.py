@@ -0,0 +1,140 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.media_blob import MediaBlob
+from app.media import storage as storage_mod
+from app.media.uploads import TempUpload
+from app.services import media_blobs
+
+from conftest import run
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+BUCKET = "lostfound-test"
+
+
+def _upload(data: bytes) -> TempUpload:
+    fd, name = tempfile.mkstemp(suffix=".part")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    return TempUpload(path=Path(name), size=len(data), sha256=hashlib.sha256(data).hexdigest())
+
+
+def _use_backend(monkeypatch, name: str):
+    monkeypatch.setattr(settings, "MEDIA_BACKEND", name)
+    monkeypatch.setattr(settings, "S3_BUCKET", BUCKET)
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    storage_mod.get_storage.cache_clear()
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    _use_backend(monkeypatch, "s3")
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield storage_mod.get_storage()
+    storage_mod.get_storage.cache_clear()
+
+
+@pytest.fixture(params=["local", "s3"])
+def backend(request, monkeypatch):
+    if request.param == "s3":
+        yield request.getfixturevalue("s3")
+        return
+    _use_backend(monkeypatch, "local")
+    yield storage_mod.get_storage()
+    storage_mod.get_storage.cache_clear()
+
+
+async def _row(sha: str):
+    async with SessionLocal() as db:
+        return await db.scalar(select(MediaBlob).where(MediaBlob.sha256 == sha))
+
+
+def test_s3_storage_roundtrip(s3):
+    async def scenario():
+        up = _upload(b"s3 bytes")
+        await s3.put_file("blobs/x/y.jpg", up.path, move=True)
+        assert not up.path.exists()
+        assert await s3.exists("blobs/x/y.jpg")
+        async with s3.local_path("blobs/x/y.jpg") as path:
+            assert path.read_bytes() == b"s3 bytes"
+        await s3.delete("blobs/x/y.jpg")
+        assert not await s3.exists("blobs/x/y.jpg")
+        assert s3.url("k").endswith(f"/{BUCKET}/k")
+
+    run(scenario())
+
+
+def test_acquire_dedupes_and_collect_deletes_last_reference(backend):
+    data = os.urandom(64)
+    sha = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        async with SessionLocal() as db:
+            first = await media_blobs.acquire(db, _upload(data), ".jpg")
+            second = await media_blobs.acquire(db, _upload(data), ".jpg")
+            await db.commit()
+        assert first.key == second.key
+        assert (await _row(sha)).refcount == 2
+        assert await backend.exists(first.key)
+
+        async with SessionLocal() as db:
+            assert await media_blobs.release(db, sha) == []
+            await db.commit()
+        async with SessionLocal() as db:
+            garbage = await media_blobs.release(db, sha)
+            await db.commit()
+        assert garbage == [sha]
+
+        await media_blobs.collect(garbage)
+        assert await _row(sha) is None
+        assert not await backend.exists(first.key)
+
+    run(scenario())
+
+
+def test_collect_keeps_blob_reacquired_after_release(backend):
+    data = os.urandom(64)
+    sha = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        async with SessionLocal() as db:
+            blob = await media_blobs.acquire(db, _upload(data), ".png")
+            await db.commit()
+        async with SessionLocal() as db:
+            garbage = await media_blobs.release(db, sha)
+            await db.commit()
+
+        # тот же файл загрузили снова между commit release и collect
+        async with SessionLocal() as db:
+            await media_blobs.acquire(db, _upload(data), ".png")
+            await db.commit()
+
+        await media_blobs.collect(garbage)
+        assert (await _row(sha)).refcount == 1
+        assert await backend.exists(blob.key)
+
+    run(scenario())
+
+
+def test_acquire_rolls_back_with_the_caller(backend):
+    data = os.urandom(64)
+    sha = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        async with SessionLocal() as db:
+            await db.scalar(select(MediaBlob).limit(1))
+            await media_blobs.acquire(db, _upload(data), ".jpg")
+            await db.rollback()
+        assert await _row(sha) is None
+
+    run(scenario())
@@ -0,0 +1,56 @@
+import uuid
+
+from sqlalchemy import delete, update
+
+from app.db.database import SessionLocal
+from app.db.models.item import Item
+from app.db.models.user import User
+from app.media.phash import PhashIndex, to_hex
+from app.services import item_changes
+
+from conftest import run
+
+BASE = 0x0F0F_0F0F_0F0F_0F0F
+
+
+async def _items(db, hashes):
+    user = User(email=f"{uuid.uuid4().hex}@test", hashed_password="x", name="T", surname="T")
+    db.add(user)
+    await db.flush()
+    items = [
+        Item(
+            title="x", type="found", status="OPEN", category="personal", roomId="r",
+            roomLabel="r", floorLabel="1", description="", owner_id=user.id, phash=to_hex(h),
+        )
+        for h in hashes
+    ]
+    db.add_all(items)
+    await db.flush()
+    item_changes.record_many(db, [it.id for it in items])
+    await db.commit()
+    return [it.id for it in items]
+
+
+def test_index_follows_other_workers_through_item_changes():
+    index = PhashIndex(ttl=0)
+
+    async def body():
+        async with SessionLocal() as db:
+            a, b = await _items(db, [BASE, BASE ^ 0b1])
+            await index.load(db)
+            found = {i for _, i in await index.search(db, to_hex(BASE))}
+            assert {a, b} <= found
+
+            # другой воркер: b сменил картинку, a удалён, добавлен c
+            await db.execute(update(Item).where(Item.id == b).values(phash=to_hex(~BASE & (2**64 - 1))))
+            item_changes.record(db, b)
+            await db.execute(delete(Item).where(Item.id == a))
+            item_changes.record(db, a, item_changes.DELETE)
+            await db.commit()
+            (c,) = await _items(db, [BASE ^ 0b11])
+
+            found = {i for _, i in await index.search(db, to_hex(BASE))}
+        assert c in found and a not in found and b not in found
+        assert index._dead == 2
+
+    run(body())
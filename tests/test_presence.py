@@ -0,0 +1,25 @@
+import asyncio
+
+from app.realtime.presence import RoomCoalescer
+
+
+def test_coalescer_drops_rooms_idle_for_longer_than_the_interval():
+    flushed = []
+
+    async def flush(room, buf):
+        flushed.append((room, dict(buf)))
+
+    async def body():
+        coalescer = RoomCoalescer(flush, interval=0.05)
+        for n in range(20):
+            coalescer.push(f"thread:{n}", "typing", n)
+        await asyncio.sleep(0.01)
+        assert len(coalescer._last_flush) == 20
+
+        await asyncio.sleep(0.1)
+        coalescer.push("thread:new", "typing", 1)
+        await asyncio.sleep(0.01)
+        assert set(coalescer._last_flush) == {"thread:new"}
+
+    asyncio.run(body())
+    assert len(flushed) == 21
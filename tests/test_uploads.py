@@ -0,0 +1,39 @@
+import hashlib
+import os
+from pathlib import Path
+
+import httpx
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.media_blob import MediaBlob
+
+from conftest import run
+
+
+def _client() -> httpx.AsyncClient:
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_upload_streams_the_file_part_once_and_hashes_it():
+    data = os.urandom(3 * settings.UPLOAD_CHUNK_BYTES + 123)
+
+    async def body():
+        async with _client() as c:
+            r = await c.post("/api/v1/media/upload", files={
+                "note": ("n.txt", b"not the file", "text/plain"),
+                "file": ("photo.PNG", data, "image/png"),
+            })
+            missing = await c.post("/api/v1/media/upload", files={"other": ("a.jpg", data, "image/jpeg")})
+        async with SessionLocal() as db:
+            blob = await db.get(MediaBlob, hashlib.sha256(data).hexdigest())
+        return r, missing, blob
+
+    r, missing, blob = run(body())
+    assert r.status_code == 200 and r.json()["filename"] == "photo.PNG"
+    assert blob is not None and blob.size == len(data) and blob.key.endswith(".png")
+    assert (Path(settings.MEDIA_DIR) / blob.key).read_bytes() == data
+    assert missing.status_code == 422
+    assert not list((Path(settings.MEDIA_DIR) / ".tmp").iterdir())
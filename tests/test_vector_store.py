@@ -0,0 +1,22 @@
+import numpy as np
+
+from app.ai.vector_store import VectorView
+
+
+def _view() -> VectorView:
+    vectors = np.asarray([[1, 0], [0.8, 0.6], [0, 1], [0.6, 0.8]], dtype=np.float32)
+    ids = np.asarray([1, 2, -3, 4], dtype=np.int64)  # -3: tombstone
+    return VectorView(7, vectors, ids, np.asarray([10, 10, 20, 20], dtype=np.int64))
+
+
+def test_score_ranks_only_requested_live_ids_against_the_query():
+    view = _view()
+    hits = view.score([0, 2], [1, 2, 3, 4])
+    assert [item_id for _, item_id in hits] == [4, 2, 1]
+    assert np.allclose([sim for sim, _ in hits], [0.8, 0.6, 0.0])
+
+
+def test_score_matches_top_k():
+    view = _view()
+    query = [0.3, 0.7]
+    assert view.score(query, [1, 2, 4]) == view.top_k(query, 10)